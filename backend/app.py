@@ -10,6 +10,10 @@ from routes.usage   import usage_bp
 from routes.billing import billing_bp 
 from routes.admin   import admin_bp 
 from routes.tasks   import tasks_bp 
+from services.metering_service import usage_meter
+from services.cache_service import response_cache
+from services.search_service import init_search_index
+from services.leaderboard_service import leaderboards
 
 def create_app():
     app = Flask(__name__)
@@ -20,6 +24,9 @@ def create_app():
     db.init_app(app)
     JWTManager(app)
     bcrypt.init_app(app)
+    usage_meter.init_app(app)
+    response_cache.init_app(app)
+    leaderboards.init_app(app)
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(objects_bp)
@@ -30,6 +37,7 @@ def create_app():
 
     with app.app_context():
         db.create_all()
+        init_search_index()
         print("Database tables created!")
 
     @app.route("/")
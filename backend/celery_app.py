@@ -52,6 +52,27 @@ def make_celery(app=None):
                 "task":     "tasks.take_usage_snapshot",
                 "schedule": crontab(minute=0),    
             },
+
+            "daily-storage-reconcile": {
+                "task":     "tasks.reconcile_storage_totals",
+                "schedule": crontab(hour=3, minute=30),
+            },
+
+            "hourly-pending-upload-sweep": {
+                "task":     "tasks.expire_pending_uploads",
+                "schedule": crontab(minute=15),
+            },
+
+            "daily-blob-gc": {
+                "task":     "tasks.collect_blob_garbage",
+                "schedule": crontab(hour=3, minute=0),
+            },
+
+            # After the reconcile, so storage scores use corrected totals
+            "daily-leaderboard-rebuild": {
+                "task":     "tasks.rebuild_leaderboards",
+                "schedule": crontab(hour=4, minute=0),
+            },
         }
     )
 
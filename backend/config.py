@@ -16,14 +16,78 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Object storage engine: "minio" or "local" (files under LOCAL_STORAGE_ROOT)
+    STORAGE_BACKEND    = os.environ.get("STORAGE_BACKEND", "minio")
+    LOCAL_STORAGE_ROOT = os.environ.get("LOCAL_STORAGE_ROOT", "storage")
+
     MINIO_ENDPOINT   = os.environ.get("MINIO_ENDPOINT",   "localhost:9000")
     MINIO_ACCESS_KEY = os.environ.get("MINIO_ACCESS_KEY", "minioadmin")
     MINIO_SECRET_KEY = os.environ.get("MINIO_SECRET_KEY", "minioadmin123")
     MINIO_SECURE     = os.environ.get("MINIO_SECURE",     "false").lower() == "true"
+    MINIO_REGION     = os.environ.get("MINIO_REGION",     "us-east-1")
+
+    # Host browsers use to reach MinIO (presigned URLs are signed for it)
+    MINIO_PUBLIC_ENDPOINT = os.environ.get("MINIO_PUBLIC_ENDPOINT", MINIO_ENDPOINT)
+    MINIO_PUBLIC_SECURE   = os.environ.get("MINIO_PUBLIC_SECURE", str(MINIO_SECURE)).lower() == "true"
+    PRESIGNED_URL_EXPIRY  = int(os.environ.get("PRESIGNED_URL_EXPIRY", "300"))  # seconds
+    # Presigned uploads land here until /presign/complete moves them
+    UPLOAD_BUCKET         = os.environ.get("UPLOAD_BUCKET", "pending-uploads")
+
+    # How long a bucket seen to exist is remembered in the shared cache
+    BUCKET_CACHE_TTL = int(os.environ.get("BUCKET_CACHE_TTL", str(24 * 3600)))
+
+    REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+    # API-call metering buffer: "memory" (single worker) or "redis" (shared)
+    # A flush still unfinished after METER_FLUSH_STALE_AFTER seconds is
+    # taken to be from a dead or stalled worker and is retried; a flush
+    # token already recorded in meter_flushes is never applied twice.
+    METER_BACKEND           = os.environ.get("METER_BACKEND", "memory")
+    METER_FLUSH_INTERVAL    = int(os.environ.get("METER_FLUSH_INTERVAL", "5"))       # seconds
+    METER_FLUSH_THRESHOLD   = int(os.environ.get("METER_FLUSH_THRESHOLD", "500"))    # (user, day) counters
+    METER_FLUSH_STALE_AFTER = int(os.environ.get("METER_FLUSH_STALE_AFTER", "300"))  # seconds
+
+    # Response cache: "memory" (single worker) or "redis" (shared)
+    CACHE_BACKEND      = os.environ.get("CACHE_BACKEND", "memory")
+    ESTIMATE_CACHE_TTL = int(os.environ.get("ESTIMATE_CACHE_TTL", "60"))   # seconds
+    ADMIN_OVERVIEW_CACHE_TTL = int(os.environ.get("ADMIN_OVERVIEW_CACHE_TTL", "30"))  # seconds
+
+    # Platform snapshot retention (monthly points are kept forever)
+    SNAPSHOT_HOURLY_RETENTION_DAYS = int(os.environ.get("SNAPSHOT_HOURLY_RETENTION_DAYS", "7"))
+    SNAPSHOT_DAILY_RETENTION_DAYS  = int(os.environ.get("SNAPSHOT_DAILY_RETENTION_DAYS", "400"))
 
 
     MAX_FILE_SIZE_BYTES = 10 * 1024 * 1024
 
+    # Part size for streamed uploads of unknown length (S3 minimum is 5 MB)
+    UPLOAD_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE", str(5 * 1024 * 1024)))
+
+    # Most files one batch-upload / batch-delete request may name
+    BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", "1000"))
+
+    # Content-addressed deduplication: identical uploads share one blob
+    # in BLOB_BUCKET (billing still counts every copy)
+    DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() == "true"
+    BLOB_BUCKET   = os.environ.get("BLOB_BUCKET", "cas-blobs")
+
+    # "user": a blob is only shared between one user's own files.
+    # "global" (opt-in) also shares it across users: saves more, but an
+    # upload's timing can tell a user someone else already has the file
+    DEDUP_SCOPE   = os.environ.get("DEDUP_SCOPE", "user").lower()
+
+    # Transparent compression at rest (opt-in): extension -> codec.
+    # Kept only when raw / compressed >= COMPRESSION_MIN_RATIO; uploads
+    # are spooled to memory, then disk past COMPRESSION_SPOOL_BYTES.
+    COMPRESSION_ENABLED    = os.environ.get("COMPRESSION_ENABLED", "false").lower() == "true"
+    COMPRESSION_CODECS     = {".txt": "zstd", ".csv": "zstd", ".json": "gzip", ".xml": "gzip"}
+    COMPRESSION_MIN_RATIO  = float(os.environ.get("COMPRESSION_MIN_RATIO", "1.5"))
+    COMPRESSION_LEVEL_ZSTD = int(os.environ.get("COMPRESSION_LEVEL_ZSTD", "10"))
+    COMPRESSION_LEVEL_GZIP = int(os.environ.get("COMPRESSION_LEVEL_GZIP", "6"))
+    COMPRESSION_SPOOL_BYTES = int(os.environ.get("COMPRESSION_SPOOL_BYTES", str(1024 * 1024)))
+
+    # Chunk size for streamed downloads
+    DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+
     STORAGE_QUOTA_BYTES = 50 * 1024 * 1024
 
     BLOCKED_EXTENSIONS = {
@@ -39,6 +103,12 @@ class Config:
         ".mp4", ".mp3", ".zip", ".tar", ".gz"       # media/archives
     }
 
+    # Users per shard in the parallel monthly invoice run
+    INVOICE_SHARD_SIZE = int(os.environ.get("INVOICE_SHARD_SIZE", "1000"))
+
+    # Users per checkpointed batch inside a shard
+    BILLING_BATCH_SIZE = int(os.environ.get("BILLING_BATCH_SIZE", "200"))
+
     PRICE_STORAGE_PER_GB_DAY = 0.25
 
     PRICE_API_PER_CALL = 0.001
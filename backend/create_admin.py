@@ -1,6 +1,7 @@
 from app import create_app
 from models import db, User
 from flask_bcrypt import Bcrypt
+from services.search_service import index_user
 
 bcrypt = Bcrypt()
 
@@ -13,6 +14,7 @@ def create_admin_user(username, email, password):
         if existing:
             if existing.role != "admin":
                 existing.role = "admin"
+                index_user(existing)
                 db.session.commit()
                 print(f"User '{username}' promoted to admin!")
             else:
@@ -27,6 +29,8 @@ def create_admin_user(username, email, password):
             role="admin"
         )
         db.session.add(admin)
+        db.session.flush()
+        index_user(admin)
         db.session.commit()
         print(f"Admin user '{username}' created successfully!")
 
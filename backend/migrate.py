@@ -0,0 +1,345 @@
+from app import create_app
+from models import db
+from sqlalchemy import text, inspect, bindparam
+from datetime import datetime
+
+
+# usage_logs: one row per (user_id, date)
+def merge_duplicate_usage_logs():
+    """
+    Older databases could end up with several usage_logs rows for the
+    same user and day (concurrent read-then-write). Merges them into the
+    oldest row before the unique index is created:
+    - api_calls are summed
+    - storage_used keeps the highest snapshot of the day
+    """
+    merged = db.session.execute(text("""
+        UPDATE usage_logs
+        SET api_calls = (
+                SELECT SUM(d.api_calls) FROM usage_logs d
+                WHERE d.user_id = usage_logs.user_id AND d.date = usage_logs.date
+            ),
+            storage_used = (
+                SELECT MAX(d.storage_used) FROM usage_logs d
+                WHERE d.user_id = usage_logs.user_id AND d.date = usage_logs.date
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM usage_logs
+            GROUP BY user_id, date
+            HAVING COUNT(*) > 1
+        )
+    """)).rowcount
+
+    deleted = db.session.execute(text("""
+        DELETE FROM usage_logs
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM usage_logs
+                GROUP BY user_id, date
+            ) AS keep
+        )
+    """)).rowcount
+
+    db.session.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_usage_logs_user_date
+        ON usage_logs (user_id, date)
+    """))
+
+    print(f"   merged {merged} day(s), removed {deleted} duplicate row(s)")
+
+
+# users.storage_bytes: running storage total
+def add_user_storage_bytes():
+    """
+    Adds the users.storage_bytes column and fills it from the
+    objects table, which is what upload/delete keep it in step with.
+    """
+    columns = {c["name"] for c in inspect(db.engine).get_columns("users")}
+    if "storage_bytes" not in columns:
+        db.session.execute(text(
+            "ALTER TABLE users ADD COLUMN storage_bytes BIGINT NOT NULL DEFAULT 0"
+        ))
+
+    updated = db.session.execute(text("""
+        UPDATE users
+        SET storage_bytes = COALESCE((
+            SELECT SUM(o.file_size) FROM objects o WHERE o.user_id = users.id
+        ), 0)
+    """)).rowcount
+
+    print(f"   backfilled storage totals for {updated} user(s)")
+
+
+# invoices: one invoice per (user_id, month)
+def add_invoice_unique_user_month():
+    """
+    generate_invoice() checked for an existing invoice before inserting,
+    but two concurrent calls could both pass the check. For each user
+    and month keeps the paid invoice (else the newest one), copies the
+    others into invoices_archive before deleting them, then creates the
+    unique index that the bulk invoice run relies on.
+    """
+    rows = db.session.execute(text("""
+        SELECT i.id, i.user_id, i.month, i.status
+        FROM invoices i
+        JOIN (
+            SELECT user_id, month FROM invoices
+            GROUP BY user_id, month
+            HAVING COUNT(*) > 1
+        ) AS dup ON dup.user_id = i.user_id AND dup.month = i.month
+        ORDER BY i.user_id, i.month,
+                 CASE WHEN i.status = 'paid' THEN 0 ELSE 1 END,
+                 i.generated_at DESC, i.id DESC
+    """)).all()
+
+    keep, dropped = {}, {}
+    for row in rows:
+        group = (row.user_id, row.month)
+        if group not in keep:
+            keep[group] = row.id
+            continue
+        dropped[row.id] = keep[group]
+        if row.status == "paid":
+            print(f"   ⚠️ user {row.user_id}, {row.month}: several paid invoices, "
+                  f"kept #{keep[group]}, archived #{row.id} — check manually")
+
+    if dropped:
+        archive_invoices(list(dropped))
+
+        # Run checkpoints pointing at an archived invoice follow the kept one
+        if inspect(db.session.connection()).has_table("billing_run_items"):
+            for dropped_id, kept_id in dropped.items():
+                db.session.execute(text(
+                    "UPDATE billing_run_items SET invoice_id = :kept WHERE invoice_id = :dropped"
+                ), {"kept": kept_id, "dropped": dropped_id})
+
+        db.session.execute(
+            text("DELETE FROM invoices WHERE id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(dropped)}
+        )
+
+    db.session.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_invoices_user_month
+        ON invoices (user_id, month)
+    """))
+
+    print(f"   archived and removed {len(dropped)} duplicate invoice(s)")
+
+
+def archive_invoices(ids):
+    """
+    Copies invoices into invoices_archive (same columns plus
+    archived_at), creating the table the first time it is needed.
+    Inspects through the session's connection, which already holds
+    this transaction's writes.
+    """
+    db.session.execute(text("""
+        CREATE TABLE IF NOT EXISTS invoices_archive AS
+        SELECT * FROM invoices WHERE 1 = 0
+    """))
+    archive_columns = {c["name"] for c in inspect(db.session.connection()).get_columns("invoices_archive")}
+    if "archived_at" not in archive_columns:
+        db.session.execute(text(
+            "ALTER TABLE invoices_archive ADD COLUMN archived_at TIMESTAMP"
+        ))
+
+    # Columns both tables have, in case invoices grew some since
+    columns = ", ".join(
+        c["name"] for c in inspect(db.session.connection()).get_columns("invoices")
+        if c["name"] in archive_columns
+    )
+    db.session.execute(
+        text(f"""
+            INSERT INTO invoices_archive ({columns}, archived_at)
+            SELECT {columns}, :now FROM invoices WHERE id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids, "now": datetime.utcnow()}
+    )
+
+
+# usage_monthly: backfill the monthly aggregates
+def backfill_usage_monthly():
+    """
+    db.create_all() creates the usage_monthly table empty.
+    Fills it from the usage_logs history.
+    """
+    from services.usage_service import rebuild_monthly_usage
+
+    months = rebuild_monthly_usage()
+    print(f"   rebuilt {len(months)} month(s)")
+
+
+# storage_ledger: seed from the objects table
+def backfill_storage_ledger():
+    """
+    db.create_all() creates the storage_ledger table empty.
+    Replays each current object as an upload at its uploaded_at time, for
+    users that have no ledger events yet. Objects deleted before this
+    migration left no trace, so earlier history is approximate.
+    """
+    from models import StorageLedger, StorageObject
+    from services.usage_service import record_storage_change
+
+    seeded_users = {uid for (uid,) in db.session.query(StorageLedger.user_id).distinct()}
+
+    # Only the columns this step needs, so it still runs on a database
+    # that later migrations have not added columns to yet
+    objects = db.session.query(
+        StorageObject.user_id, StorageObject.file_size, StorageObject.uploaded_at
+    ).order_by(
+        StorageObject.user_id, StorageObject.uploaded_at, StorageObject.id
+    ).all()
+
+    events = 0
+    for obj in objects:
+        if obj.user_id in seeded_users:
+            continue
+        record_storage_change(obj.user_id, obj.file_size or 0, at=obj.uploaded_at)
+        db.session.flush()
+        events += 1
+
+    print(f"   replayed {events} upload event(s)")
+
+
+# users / objects: indexes for the admin user list
+def add_admin_list_indexes():
+    """
+    Keyset pagination walks users by (created_at, id), and the per-user
+    file stats group objects by user_id.
+    """
+    db.session.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_users_created_at_id
+        ON users (created_at, id)
+    """))
+    db.session.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_objects_user_id
+        ON objects (user_id)
+    """))
+
+
+# invoices: index for the admin invoice list
+def add_invoice_listing_index():
+    """
+    The admin invoice list pages newest-first by (generated_at, id).
+    """
+    db.session.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_invoices_generated_at_id
+        ON invoices (generated_at, id)
+    """))
+
+
+# platform_snapshots: daily points from usage history
+def backfill_platform_snapshots():
+    """
+    db.create_all() creates the platform_snapshots table empty.
+    Writes a daily point for every past day in usage_logs, so the admin
+    charts have history before the first hourly snapshot.
+    """
+    from services.platform_service import backfill_daily_snapshots
+
+    days = backfill_daily_snapshots()
+    print(f"   wrote {days} daily point(s)")
+
+
+# users: search index
+def rebuild_user_search_index():
+    """
+    (Re)builds the user search index: FTS5 on SQLite, pg_trgm GIN
+    indexes on PostgreSQL.
+    """
+    from services.search_service import init_search_index
+
+    if init_search_index(rebuild=True):
+        print("   user search index ready")
+    else:
+        print("   no search index for this database — search uses ILIKE")
+
+
+# objects.checksum: content hash
+def add_object_checksum():
+    """
+    Adds objects.checksum (SHA-256, hex). Stays NULL for files uploaded
+    before streaming uploads computed it.
+    """
+    columns = {c["name"] for c in inspect(db.engine).get_columns("objects")}
+    if "checksum" not in columns:
+        db.session.execute(text(
+            "ALTER TABLE objects ADD COLUMN checksum VARCHAR(64)"
+        ))
+
+
+# objects.blob_id: deduplicated content
+def add_object_blob_id():
+    """
+    db.create_all() creates the blobs table. Existing objects keep
+    blob_id NULL and stay in their user's bucket.
+    """
+    columns = {c["name"] for c in inspect(db.engine).get_columns("objects")}
+    if "blob_id" not in columns:
+        db.session.execute(text(
+            "ALTER TABLE objects ADD COLUMN blob_id INTEGER REFERENCES blobs(id)"
+        ))
+
+
+# objects.stored_size / content_encoding: compression at rest
+def add_object_compression():
+    """
+    Adds objects.stored_size and content_encoding, and blobs.content_encoding.
+    Existing files were stored as uploaded: stored_size = file_size.
+    """
+    columns = {c["name"] for c in inspect(db.engine).get_columns("objects")}
+    if "stored_size" not in columns:
+        db.session.execute(text(
+            "ALTER TABLE objects ADD COLUMN stored_size BIGINT"
+        ))
+    if "content_encoding" not in columns:
+        db.session.execute(text(
+            "ALTER TABLE objects ADD COLUMN content_encoding VARCHAR(16)"
+        ))
+
+    columns = {c["name"] for c in inspect(db.engine).get_columns("blobs")}
+    if "content_encoding" not in columns:
+        db.session.execute(text(
+            "ALTER TABLE blobs ADD COLUMN content_encoding VARCHAR(16)"
+        ))
+
+    db.session.execute(text(
+        "UPDATE objects SET stored_size = file_size WHERE stored_size IS NULL"
+    ))
+
+
+# Every step must be safe to run more than once
+MIGRATIONS = [
+    ("0001_usage_logs_unique_user_date", merge_duplicate_usage_logs),
+    ("0002_users_storage_bytes",         add_user_storage_bytes),
+    ("0003_invoices_unique_user_month",  add_invoice_unique_user_month),
+    ("0004_usage_monthly_backfill",      backfill_usage_monthly),
+    ("0005_storage_ledger_backfill",     backfill_storage_ledger),
+    ("0006_admin_list_indexes",          add_admin_list_indexes),
+    ("0007_invoices_generated_at_index", add_invoice_listing_index),
+    ("0008_platform_snapshots_backfill", backfill_platform_snapshots),
+    ("0009_users_search_index",          rebuild_user_search_index),
+    ("0010_objects_checksum",            add_object_checksum),
+    ("0011_objects_blob_id",             add_object_blob_id),
+    ("0012_objects_compression",         add_object_compression),
+]
+
+
+def run_migrations():
+    """
+    Brings an existing database up to date with models.py.
+    db.create_all() (run by create_app) only creates missing tables,
+    so new indexes and columns on existing tables are added here.
+    """
+    app = create_app()
+    with app.app_context():
+        for name, step in MIGRATIONS:
+            print(f"▶ {name}")
+            step()
+            db.session.commit()
+        print("✅ Migrations complete")
+
+
+if __name__ == "__main__":
+    run_migrations()
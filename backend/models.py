@@ -8,6 +8,10 @@ db = SQLAlchemy()
 class User(db.Model):
     __tablename__ = "users"
 
+    # Keyset pagination of the admin user list (newest first)
+    __table_args__ = (
+        db.Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id         = db.Column(db.Integer, primary_key=True)
     username   = db.Column(db.String(80), unique=True, nullable=False)
@@ -16,6 +20,9 @@ class User(db.Model):
     role       = db.Column(db.String(20), default="user")   
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Running total of StorageObject.file_size, kept in step on upload/delete
+    storage_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+
     objects    = db.relationship("StorageObject", backref="owner", lazy=True)
     usage_logs = db.relationship("UsageLog", backref="user", lazy=True)
     invoices   = db.relationship("Invoice", backref="user", lazy=True)
@@ -35,6 +42,11 @@ class User(db.Model):
 class StorageObject(db.Model):
     __tablename__ = "objects"
 
+    # Per-user file listings and file count / size aggregates
+    __table_args__ = (
+        db.Index("ix_objects_user_id", "user_id"),
+    )
+
     id          = db.Column(db.Integer, primary_key=True)
     user_id     = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     filename    = db.Column(db.String(256), nullable=False)
@@ -42,21 +54,101 @@ class StorageObject(db.Model):
     file_size   = db.Column(db.BigInteger, default=0)          
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # SHA-256 of the content, computed while the upload streams through
+    checksum    = db.Column(db.String(64), nullable=True)
+
+    # Shared content blob holding the bytes; NULL = object lives in the
+    # user's own bucket (uploads from before deduplication, presigned PUTs)
+    blob_id     = db.Column(db.Integer, db.ForeignKey("blobs.id"), nullable=True)
+    blob        = db.relationship("Blob")
+
+    # Bytes actually stored and how they are encoded ("zstd", "gzip",
+    # NULL = as uploaded). file_size stays the logical size users pay for.
+    stored_size      = db.Column(db.BigInteger, nullable=True)
+    content_encoding = db.Column(db.String(16), nullable=True)
+
     def to_dict(self):
         return {
             "id": self.id,
             "filename": self.filename,
             "file_size": self.file_size,
             "file_size_kb": round(self.file_size / 1024, 2),
+            "stored_size": self.stored_size,
+            "content_encoding": self.content_encoding,
+            "checksum": self.checksum,
             "uploaded_at": self.uploaded_at.isoformat()
         }
+
+
+# Content-addressed blobs (one per distinct file content)
+class Blob(db.Model):
+    __tablename__ = "blobs"
+
+    # Garbage collection looks for unreferenced blobs
+    __table_args__ = (
+        db.Index("ix_blobs_ref_count", "ref_count"),
+    )
+
+    id          = db.Column(db.Integer,    primary_key=True)
+    sha256      = db.Column(db.String(64), unique=True, nullable=False)
+    size        = db.Column(db.BigInteger, nullable=False)             # physical bytes, stored once
+    storage_key = db.Column(db.String(160), nullable=False)            # key in the blob area
+    ref_count   = db.Column(db.Integer,    nullable=False, default=0)  # objects pointing here
+    created_at  = db.Column(db.DateTime,   default=datetime.utcnow)
+    content_encoding = db.Column(db.String(16), nullable=True)         # as on StorageObject
     
 
+# Presigned uploads waiting for /presign/complete
+class PendingUpload(db.Model):
+    __tablename__ = "pending_uploads"
+
+    # One reservation per (user, filename); the sweep finds expired ones
+    __table_args__ = (
+        db.Index("ix_pending_uploads_user_filename", "user_id", "filename", unique=True),
+        db.Index("ix_pending_uploads_expires_at", "expires_at"),
+    )
+
+    id            = db.Column(db.Integer,     primary_key=True)
+    user_id       = db.Column(db.Integer,     db.ForeignKey("users.id"), nullable=False)
+    upload_key    = db.Column(db.String(64),  unique=True, nullable=False)   # key in UPLOAD_BUCKET
+    filename      = db.Column(db.String(256), nullable=False)                # reserved in the user's bucket
+    original_name = db.Column(db.String(256), nullable=False)
+    max_bytes     = db.Column(db.BigInteger,  nullable=False)
+    status        = db.Column(db.String(16),  nullable=False, default="pending")   # pending | completing
+    created_at    = db.Column(db.DateTime,    default=datetime.utcnow)
+    expires_at    = db.Column(db.DateTime,    nullable=False)                # end of the upload window
+
+
+
+# Storage Ledger (append-only size-change events)
+class StorageLedger(db.Model):
+    __tablename__ = "storage_ledger"
+
+    # "Latest event at or before t" is one index seek
+    __table_args__ = (
+        db.Index("ix_storage_ledger_user_time", "user_id", "occurred_at", "id"),
+    )
+
+    id               = db.Column(db.Integer, primary_key=True)
+    user_id          = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    occurred_at      = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    delta_bytes      = db.Column(db.BigInteger, nullable=False)   # +n upload, -n delete
+    balance_bytes    = db.Column(db.BigInteger, nullable=False)   # stored bytes after this event
+
+    # Prefix sum: integral of stored bytes over time, up to occurred_at
+    cum_byte_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+
+
 
 # Usage Logs
 class UsageLog(db.Model):
     __tablename__ = "usage_logs"
 
+    # One row per user per day — lets writers upsert with ON CONFLICT
+    __table_args__ = (
+        db.Index("ix_usage_logs_user_date", "user_id", "date", unique=True),
+    )
+
     id           = db.Column(db.Integer, primary_key=True)
     user_id      = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     date         = db.Column(db.Date, default=datetime.utcnow)
@@ -69,13 +161,57 @@ class UsageLog(db.Model):
             "storage_used_mb": round(self.storage_used / (1024 * 1024), 4),
             "api_calls": self.api_calls
         }
-    
+
+
+
+# Metering flushes already written to usage_logs (one row per drain token)
+class MeterFlush(db.Model):
+    __tablename__ = "meter_flushes"
+
+    # Old rows are pruned by applied_at
+    __table_args__ = (
+        db.Index("ix_meter_flushes_applied_at", "applied_at"),
+    )
+
+    id         = db.Column(db.Integer,    primary_key=True)
+    token      = db.Column(db.String(64), unique=True, nullable=False)
+    applied_at = db.Column(db.DateTime,   default=datetime.utcnow, nullable=False)
+
+
+
+# Monthly usage aggregates (kept in step with usage_logs)
+class UsageMonthly(db.Model):
+    __tablename__ = "usage_monthly"
+
+    # One row per user per month
+    __table_args__ = (
+        db.Index("ix_usage_monthly_user_month", "user_id", "month", unique=True),
+    )
+
+    id              = db.Column(db.Integer, primary_key=True)
+    user_id         = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    month           = db.Column(db.String(7), nullable=False)   # "2026-02"
+    year            = db.Column(db.Integer,   nullable=False)
+    month_number    = db.Column(db.Integer,   nullable=False)
+
+    total_storage   = db.Column(db.BigInteger, default=0)   # sum of daily storage_used
+    peak_storage    = db.Column(db.BigInteger, default=0)
+    total_api_calls = db.Column(db.BigInteger, default=0)
+    days_active     = db.Column(db.Integer,    default=0)   # days with a usage_logs row
+    updated_at      = db.Column(db.DateTime,   default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 
 # Invoice
 class Invoice(db.Model):
     __tablename__ = "invoices"
 
+    # At most one invoice per user per month
+    __table_args__ = (
+        db.Index("ix_invoices_user_month", "user_id", "month", unique=True),
+        db.Index("ix_invoices_generated_at_id", "generated_at", "id"),
+    )
+
     id               = db.Column(db.Integer,  primary_key=True)
     user_id          = db.Column(db.Integer,  db.ForeignKey("users.id"), nullable=False)
     month            = db.Column(db.String(7),  nullable=False)   # "2026-02"
@@ -124,4 +260,133 @@ class Invoice(db.Model):
             },
             "status":        self.status,
             "generated_at":  self.generated_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+
+# Billing Runs (checkpointed monthly invoice runs)
+class BillingRun(db.Model):
+    __tablename__ = "billing_runs"
+
+    id           = db.Column(db.Integer,   primary_key=True)
+    month        = db.Column(db.String(7), unique=True, nullable=False)   # "2026-02"
+    year         = db.Column(db.Integer,   nullable=False)
+    month_number = db.Column(db.Integer,   nullable=False)
+    status       = db.Column(db.String(20), default="running")   # running / completed / failed
+    total_users  = db.Column(db.Integer,   default=0)
+    started_at   = db.Column(db.DateTime,  default=datetime.utcnow)
+    finished_at  = db.Column(db.DateTime,  nullable=True)
+
+    shards = db.relationship("BillingRunShard", backref="run", lazy=True,
+                             order_by="BillingRunShard.id")
+
+    def to_dict(self):
+        return {
+            "id":           self.id,
+            "month":        self.month,
+            "status":       self.status,
+            "total_users":  self.total_users,
+            "started_at":   self.started_at.isoformat(),
+            "finished_at":  self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class BillingRunShard(db.Model):
+    __tablename__ = "billing_run_shards"
+
+    id        = db.Column(db.Integer, primary_key=True)
+    run_id    = db.Column(db.Integer, db.ForeignKey("billing_runs.id"), nullable=False)
+
+    # Users with lo <= id < hi (None = unbounded)
+    lo        = db.Column(db.Integer, nullable=True)
+    hi        = db.Column(db.Integer, nullable=True)
+
+    # Checkpoint: every user with id <= cursor in this shard is done
+    cursor    = db.Column(db.Integer, nullable=True)
+
+    status    = db.Column(db.String(20), default="pending")   # pending / running / completed / failed
+    generated = db.Column(db.Integer, default=0)
+    skipped   = db.Column(db.Integer, default=0)
+    failed    = db.Column(db.Integer, default=0)
+    error     = db.Column(db.String(512), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id":         self.id,
+            "lo":         self.lo,
+            "hi":         self.hi,
+            "cursor":     self.cursor,
+            "status":     self.status,
+            "generated":  self.generated,
+            "skipped":    self.skipped,
+            "failed":     self.failed,
+            "error":      self.error,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class BillingRunItem(db.Model):
+    __tablename__ = "billing_run_items"
+
+    # One checkpoint row per user per run
+    __table_args__ = (
+        db.Index("ix_billing_run_items_run_user", "run_id", "user_id", unique=True),
+    )
+
+    id         = db.Column(db.Integer, primary_key=True)
+    run_id     = db.Column(db.Integer, db.ForeignKey("billing_runs.id"),       nullable=False)
+    shard_id   = db.Column(db.Integer, db.ForeignKey("billing_run_shards.id"), nullable=False)
+    user_id    = db.Column(db.Integer, db.ForeignKey("users.id"),              nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id"),           nullable=True)
+
+    # priced → persisted → emailed, or skipped (invoice existed before the run)
+    status     = db.Column(db.String(20), default="priced")
+    error      = db.Column(db.String(512), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+
+# Platform-wide totals over time (hourly, rolled up to daily and monthly)
+class PlatformSnapshot(db.Model):
+    __tablename__ = "platform_snapshots"
+
+    # One point per resolution per bucket
+    __table_args__ = (
+        db.Index("ix_platform_snapshots_res_bucket", "resolution", "bucket_start", unique=True),
+    )
+
+    id               = db.Column(db.Integer,   primary_key=True)
+    resolution       = db.Column(db.String(8), nullable=False)   # hour / day / month
+    bucket_start     = db.Column(db.DateTime,  nullable=False)
+    taken_at         = db.Column(db.DateTime,  default=datetime.utcnow)
+
+    # Users
+    total_users      = db.Column(db.Integer,   default=0)
+    admin_users      = db.Column(db.Integer,   default=0)
+    new_this_month   = db.Column(db.Integer,   default=0)
+    active_users     = db.Column(db.Integer,   default=0)   # distinct users with a usage row that day
+
+    # Storage and traffic
+    total_files      = db.Column(db.Integer,    default=0)
+    total_bytes      = db.Column(db.BigInteger, default=0)
+    api_calls        = db.Column(db.BigInteger, default=0)  # calls so far in the day / month
+
+    # Billing
+    total_invoices   = db.Column(db.Integer, default=0)
+    pending_invoices = db.Column(db.Integer, default=0)
+    paid_revenue     = db.Column(db.Float,   default=0.0)
+    total_billed     = db.Column(db.Float,   default=0.0)
+
+    def to_dict(self):
+        return {
+            "resolution":   self.resolution,
+            "bucket_start": self.bucket_start.isoformat(),
+            "taken_at":     self.taken_at.isoformat() if self.taken_at else None,
+            "total_users":  self.total_users,
+            "active_users": self.active_users,
+            "total_files":  self.total_files,
+            "total_bytes":  self.total_bytes,
+            "total_mb":     round((self.total_bytes or 0) / (1024 * 1024), 2),
+            "api_calls":    self.api_calls,
+            "total_billed": round(self.total_billed or 0, 4)
+        }
@@ -0,0 +1,25 @@
+from app import create_app
+from services.usage_service import rebuild_monthly_usage
+import sys
+
+
+def rebuild(month_label=None):
+    """
+    Rebuilds the usage_monthly aggregates from usage_logs.
+
+    python rebuild_usage_monthly.py           → every month
+    python rebuild_usage_monthly.py 2026-02   → only February 2026
+    """
+    app = create_app()
+    with app.app_context():
+        if month_label:
+            year, month = (int(part) for part in month_label.split("-"))
+            months = rebuild_monthly_usage(year, month)
+        else:
+            months = rebuild_monthly_usage()
+
+        print(f"✅ Rebuilt usage_monthly for {len(months)} month(s): {', '.join(months)}")
+
+
+if __name__ == "__main__":
+    rebuild(sys.argv[1] if len(sys.argv) > 1 else None)
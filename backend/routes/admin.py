@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, StorageObject, UsageLog, Invoice
+from models import db, User, StorageObject, UsageMonthly, Invoice, BillingRun
 from services.usage_service import get_monthly_summary, get_alltime_stats
 from services.billing_service import calculate_bill, generate_invoice
+from services.simulation_service import simulate_pricing, MAX_SCENARIOS, MAX_CROSSING_IDS
 from services.minio_service import get_total_storage_used
-from sqlalchemy import func
+from services.cache_service import response_cache
+from services.platform_service import get_latest_snapshot, get_snapshot_series
+from services.search_service import user_search_filter, index_user
+from services.leaderboard_service import BOARDS, top_users
+from services.dedup_service import dedup_report
+from utils.pagination import parse_limit, encode_cursor, decode_cursor
+from sqlalchemy import func, select, tuple_, case
 from datetime import date, datetime
 
 admin_bp = Blueprint("admin", __name__)
@@ -32,133 +39,217 @@ def require_admin():
 
 
 # admin home stats
-@admin_bp.route("/api/admin/overview", methods=["GET"])
-@jwt_required()
-def overview():
-    admin, err = require_admin()
-    if err: return err
-
-    total_users  = User.query.filter_by(role="user").count()
-    admin_users  = User.query.filter_by(role="admin").count()
-
-    total_files  = StorageObject.query.count()
-    storage_result = db.session.query(
-        func.sum(StorageObject.file_size)
-    ).scalar() or 0
-
-    today = date.today()
-    active_today = db.session.query(
-        func.count(func.distinct(UsageLog.user_id))
-    ).filter(UsageLog.date == today).scalar() or 0
-
-    paid_revenue = db.session.query(
-        func.sum(Invoice.total_amount)
-    ).filter_by(status="paid").scalar() or 0
-
-    total_billed = db.session.query(
-        func.sum(Invoice.total_amount)
-    ).scalar() or 0
-
-    total_invoices  = Invoice.query.count()
-    pending_invoices = Invoice.query.filter_by(status="generated").count()
+OVERVIEW_CACHE_KEY = "admin:overview"
 
-    this_month_start = date.today().replace(day=1)
-    new_this_month = User.query.filter(
-        User.created_at >= this_month_start
-    ).count()
 
-    return jsonify({
+def snapshot_to_overview(snap):
+    total_bytes = snap.total_bytes or 0
+    return {
+        "as_of": snap.taken_at.isoformat() if snap.taken_at else None,
         "users": {
-            "total":         total_users,
-            "admins":        admin_users,
-            "new_this_month": new_this_month,
-            "active_today":  active_today
+            "total":         snap.total_users,
+            "admins":        snap.admin_users,
+            "new_this_month": snap.new_this_month,
+            "active_today":  snap.active_users
         },
         "storage": {
-            "total_files":       total_files,
-            "total_bytes":       storage_result,
-            "total_mb":          round(storage_result / (1024 * 1024), 2),
-            "total_gb":          round(storage_result / (1024 ** 3),   4),
+            "total_files":       snap.total_files,
+            "total_bytes":       total_bytes,
+            "total_mb":          round(total_bytes / (1024 * 1024), 2),
+            "total_gb":          round(total_bytes / (1024 ** 3),   4),
         },
         "billing": {
-            "total_invoices":   total_invoices,
-            "pending_invoices": pending_invoices,
-            "paid_revenue":     round(paid_revenue, 4),
-            "total_billed":     round(total_billed, 4),
+            "total_invoices":   snap.total_invoices,
+            "pending_invoices": snap.pending_invoices,
+            "paid_revenue":     round(snap.paid_revenue or 0, 4),
+            "total_billed":     round(snap.total_billed or 0, 4),
         }
-    }), 200
+    }
+
+
+@admin_bp.route("/api/admin/overview", methods=["GET"])
+@jwt_required()
+def overview():
+    """
+    Reads the latest hourly platform snapshot ("as_of" says when it was
+    taken), served from the shared response cache for
+    ADMIN_OVERVIEW_CACHE_TTL seconds.
+    """
+    admin, err = require_admin()
+    if err: return err
+
+    body = response_cache.get(OVERVIEW_CACHE_KEY)
+    hit  = body is not None
+    if not hit:
+        body = current_app.json.dumps(snapshot_to_overview(get_latest_snapshot()))
+        response_cache.set(
+            OVERVIEW_CACHE_KEY, body, current_app.config["ADMIN_OVERVIEW_CACHE_TTL"]
+        )
+
+    response = current_app.response_class(body, status=200, mimetype="application/json")
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return response
 
 
 # LIST ALL USERS
+# sort -> direction for keyset pagination; ties broken by id
+USER_SORTS = {
+    "created_at": "desc",
+    "username":   "asc",
+    "files":      "desc",
+    "relevance":  "asc",    # used whenever ?search= is given
+}
+
+# sort -> types of the values in its cursor (sort key(s), then id)
+USER_CURSORS = {
+    "created_at": (datetime, int),
+    "username":   (str, int),
+    "files":      (int, int),
+    "relevance":  (int, str, int),
+}
+
+
 @admin_bp.route("/api/admin/users", methods=["GET"])
 @jwt_required()
 def list_users():
+    """
+    One page of users with their stats.
+
+    ?search=&role=all|user|admin&sort=created_at|username|files
+    ?limit=50&after=<next_cursor from the previous page>
+
+    With ?search= the results come from the user search index, ranked:
+    username prefix, then email prefix, then substring matches.
+
+    The page is picked first (keyset on the sort columns + id), then the
+    per-user stats come from grouped subqueries restricted to that page,
+    all in one statement.
+    """
     admin, err = require_admin()
     if err: return err
 
-    search   = request.args.get("search",  "").lower()
+    search      = request.args.get("search",  "").strip().lower()
     role_filter = request.args.get("role", "all")
-    sort_by  = request.args.get("sort",   "created_at")
-
-    query = User.query
-
+    sort_by     = request.args.get("sort",   "created_at")
     if search:
-        query = query.filter(
-            db.or_(
-                User.username.ilike(f"%{search}%"),
-                User.email.ilike(f"%{search}%")
-            )
-        )
-
-    if role_filter != "all":
-        query = query.filter_by(role=role_filter)
-
-    if sort_by == "username":
-        query = query.order_by(User.username.asc())
-    elif sort_by == "files":
-        query = query.outerjoin(StorageObject).group_by(User.id)\
-                     .order_by(func.count(StorageObject.id).desc())
+        sort_by = "relevance"
+    elif sort_by not in USER_SORTS or sort_by == "relevance":
+        sort_by = "created_at"
+
+    try:
+        limit  = parse_limit(request.args.get("limit"))
+        after  = request.args.get("after")
+        cursor = decode_cursor(after, USER_CURSORS[sort_by]) if after else None
+    except ValueError:
+        return jsonify({"error": "limit must be a number and after a valid cursor"}), 400
+
+    # 1. The page: ids in keyset order
+    if sort_by == "files":
+        all_files = db.session.query(
+            StorageObject.user_id,
+            func.count(StorageObject.id).label("file_count")
+        ).group_by(StorageObject.user_id).subquery()
+        sort_cols = [func.coalesce(all_files.c.file_count, 0)]
+    elif sort_by == "relevance":
+        match, rank = user_search_filter(search)
+        sort_cols   = [rank, User.username]
+    elif sort_by == "username":
+        sort_cols = [User.username]
     else:
-        query = query.order_by(User.created_at.desc())
+        sort_cols = [User.created_at]
 
-    users = query.all()
+    page_q = db.session.query(
+        User.id, *[col.label(f"sort_{i}") for i, col in enumerate(sort_cols)]
+    )
+    if sort_by == "files":
+        page_q = page_q.outerjoin(all_files, all_files.c.user_id == User.id)
+    if sort_by == "relevance":
+        page_q = page_q.filter(match)
 
-    users_data = []
-    for user in users:
-        file_count = StorageObject.query.filter_by(user_id=user.id).count()
-        storage_bytes = db.session.query(
-            func.sum(StorageObject.file_size)
-        ).filter_by(user_id=user.id).scalar() or 0
-
-        this_month = date.today().replace(day=1)
-        api_calls_month = db.session.query(
-            func.sum(UsageLog.api_calls)
-        ).filter(
-            UsageLog.user_id == user.id,
-            UsageLog.date    >= this_month
-        ).scalar() or 0
-
-        invoice_count = Invoice.query.filter_by(user_id=user.id).count()
-        total_billed  = db.session.query(
-            func.sum(Invoice.total_amount)
-        ).filter_by(user_id=user.id).scalar() or 0
+    if role_filter != "all":
+        page_q = page_q.filter(User.role == role_filter)
+
+    descending = USER_SORTS[sort_by] == "desc"
+    if cursor:
+        key = tuple_(*sort_cols, User.id)
+        page_q = page_q.filter(key < tuple(cursor) if descending else key > tuple(cursor))
+
+    page_q = page_q.order_by(*[
+        col.desc() if descending else col.asc() for col in (*sort_cols, User.id)
+    ])
+
+    page     = page_q.limit(limit + 1).subquery("page")
+    page_ids = select(page.c.id)
+
+    # 2. Stats for the page only, one grouped subquery per table
+    files = db.session.query(
+        StorageObject.user_id,
+        func.count(StorageObject.id).label("file_count"),
+        func.sum(StorageObject.file_size).label("storage_bytes")
+    ).filter(StorageObject.user_id.in_(page_ids))\
+     .group_by(StorageObject.user_id).subquery()
+
+    invoices = db.session.query(
+        Invoice.user_id,
+        func.count(Invoice.id).label("invoice_count"),
+        func.sum(Invoice.total_amount).label("total_billed")
+    ).filter(Invoice.user_id.in_(page_ids))\
+     .group_by(Invoice.user_id).subquery()
+
+    this_month = date.today().strftime("%Y-%m")
+
+    page_sort = [page.c[f"sort_{i}"] for i in range(len(sort_cols))]
+
+    rows = db.session.query(
+        User,
+        *page_sort,
+        func.coalesce(files.c.file_count,              0).label("file_count"),
+        func.coalesce(files.c.storage_bytes,           0).label("storage_bytes"),
+        func.coalesce(UsageMonthly.total_api_calls,    0).label("api_calls_month"),
+        func.coalesce(invoices.c.invoice_count,        0).label("invoice_count"),
+        func.coalesce(invoices.c.total_billed,         0).label("total_billed")
+    ).join(page, page.c.id == User.id)\
+     .outerjoin(files,    files.c.user_id    == User.id)\
+     .outerjoin(invoices, invoices.c.user_id == User.id)\
+     .outerjoin(UsageMonthly, db.and_(
+         UsageMonthly.user_id == User.id,
+         UsageMonthly.month   == this_month
+     ))\
+     .order_by(*[
+         col.desc() if descending else col.asc() for col in (*page_sort, User.id)
+     ]).all()
+
+    has_more = len(rows) > limit
+    rows     = rows[:limit]
 
+    users_data = []
+    for row in rows:
+        storage_bytes = int(row.storage_bytes)
         users_data.append({
-            **user.to_dict(),
+            **row.User.to_dict(),
             "stats": {
-                "file_count":      file_count,
+                "file_count":      int(row.file_count),
                 "storage_bytes":   storage_bytes,
                 "storage_mb":      round(storage_bytes / (1024 * 1024), 2),
-                "api_calls_month": int(api_calls_month),
-                "invoice_count":   invoice_count,
-                "total_billed":    round(total_billed, 4)
+                "api_calls_month": int(row.api_calls_month),
+                "invoice_count":   int(row.invoice_count),
+                "total_billed":    round(float(row.total_billed), 4)
             }
         })
 
+    last = rows[-1] if rows else None
+
     return jsonify({
-        "total":  len(users_data),
-        "search": search,
-        "users":  users_data
+        "total":       len(users_data),
+        "search":      search,
+        "sort":        sort_by,
+        "limit":       limit,
+        "has_more":    has_more,
+        "next_cursor": encode_cursor(
+                           *[getattr(last, f"sort_{i}") for i in range(len(sort_cols))],
+                           last.User.id
+                       ) if has_more else None,
+        "users":       users_data
     }), 200
 
 
@@ -209,6 +300,7 @@ def update_role(user_id):
         return jsonify({"error": "Role must be 'user' or 'admin'"}), 400
 
     user.role = new_role
+    index_user(user)
     db.session.commit()
 
     return jsonify({
@@ -221,6 +313,15 @@ def update_role(user_id):
 @admin_bp.route("/api/admin/invoices", methods=["GET"])
 @jwt_required()
 def all_invoices():
+    """
+    One page of invoices, newest first, with revenue totals.
+
+    ?status=all|generated|paid&user_id=&month=YYYY-MM
+    ?limit=50&after=<next_cursor from the previous page>
+
+    Pages are keyset on (generated_at, id); usernames come from a join.
+    The totals cover every matching invoice and are one SQL aggregate.
+    """
     admin, err = require_admin()
     if err: return err
 
@@ -228,36 +329,58 @@ def all_invoices():
     user_filter   = request.args.get("user_id", None)
     month_filter  = request.args.get("month",  None)
 
-    query = Invoice.query
+    try:
+        limit  = parse_limit(request.args.get("limit"))
+        after  = request.args.get("after")
+        cursor = decode_cursor(after, (datetime, int)) if after else None
+        user_filter = int(user_filter) if user_filter else None
+    except ValueError:
+        return jsonify({"error": "limit and user_id must be numbers and after a valid cursor"}), 400
 
+    filters = []
     if status_filter != "all":
-        query = query.filter_by(status=status_filter)
-
+        filters.append(Invoice.status == status_filter)
     if user_filter:
-        query = query.filter_by(user_id=int(user_filter))
-
+        filters.append(Invoice.user_id == user_filter)
     if month_filter:
-        query = query.filter_by(month=month_filter)
+        filters.append(Invoice.month == month_filter)
 
-    invoices = query.order_by(Invoice.generated_at.desc()).all()
+    # Page
+    query = db.session.query(
+        Invoice, func.coalesce(User.username, "deleted").label("username")
+    ).outerjoin(User, User.id == Invoice.user_id).filter(*filters)
 
-    result = []
-    for inv in invoices:
-        user = User.query.get(inv.user_id)
-        inv_dict = inv.to_dict()
-        inv_dict["username"] = user.username if user else "deleted"
-        result.append(inv_dict)
+    if cursor:
+        query = query.filter(tuple_(Invoice.generated_at, Invoice.id) < tuple(cursor))
 
-    total_revenue = sum(inv.total_amount for inv in invoices)
-    paid_revenue  = sum(
-        inv.total_amount for inv in invoices if inv.status == "paid"
-    )
+    rows = query.order_by(Invoice.generated_at.desc(), Invoice.id.desc())\
+                .limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows     = rows[:limit]
+
+    result = [{**inv.to_dict(), "username": username} for inv, username in rows]
+
+    # Totals over all matching invoices
+    totals = db.session.query(
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.total_amount), 0),
+        func.coalesce(func.sum(
+            case((Invoice.status == "paid", Invoice.total_amount), else_=0)
+        ), 0)
+    ).filter(*filters).one()
+
+    total_invoices, total_revenue, paid_revenue = totals
+    last = rows[-1][0] if rows else None
 
     return jsonify({
-        "total_invoices": len(result),
-        "total_revenue":  round(total_revenue, 4),
-        "paid_revenue":   round(paid_revenue,  4),
-        "pending_amount": round(total_revenue - paid_revenue, 4),
+        "total_invoices": int(total_invoices),
+        "total_revenue":  round(float(total_revenue), 4),
+        "paid_revenue":   round(float(paid_revenue),  4),
+        "pending_amount": round(float(total_revenue) - float(paid_revenue), 4),
+        "limit":          limit,
+        "has_more":       has_more,
+        "next_cursor":    encode_cursor(last.generated_at, last.id) if has_more else None,
         "invoices":       result
     }), 200
 
@@ -308,10 +431,128 @@ def admin_pay_invoice(invoice_id):
     }), 200
 
 
+# BILLING RUNS — list
+@admin_bp.route("/api/admin/billing-runs", methods=["GET"])
+@jwt_required()
+def list_billing_runs():
+    admin, err = require_admin()
+    if err: return err
+
+    runs = BillingRun.query.order_by(BillingRun.started_at.desc()).limit(24).all()
+
+    return jsonify({
+        "runs": [run.to_dict() for run in runs]
+    }), 200
+
+
+# BILLING RUN — progress and throughput
+@admin_bp.route("/api/admin/billing-runs/<int:run_id>", methods=["GET"])
+@jwt_required()
+def billing_run_progress(run_id):
+    admin, err = require_admin()
+    if err: return err
+
+    from services.billing_run_service import get_run_progress
+
+    run = BillingRun.query.get(run_id)
+    if not run:
+        return jsonify({"error": "Billing run not found"}), 404
+
+    return jsonify(get_run_progress(run)), 200
+
+
+# BILLING RUN — resume from last checkpoint
+@admin_bp.route("/api/admin/billing-runs/<int:run_id>/resume", methods=["POST"])
+@jwt_required()
+def resume_billing_run(run_id):
+    admin, err = require_admin()
+    if err: return err
+
+    run = BillingRun.query.get(run_id)
+    if not run:
+        return jsonify({"error": "Billing run not found"}), 404
+
+    from tasks import resume_billing_run as resume_task
+    task = resume_task.delay(run.id)
+
+    return jsonify({
+        "message": f"Billing run #{run.id} ({run.month}) resume queued!",
+        "task_id": task.id,
+        "status":  "queued"
+    }), 202
+
+
+# WHAT-IF PRICING
+@admin_bp.route("/api/admin/pricing/simulate", methods=["POST"])
+@jwt_required()
+def simulate_pricing_route():
+    """
+    Revenue for one month under candidate rate sets.
+
+    Body:
+    {
+      "year": 2026, "month": 9,          (default: current month)
+      "top_n": 20,                       (largest bills listed per scenario)
+      "crossing_limit": 1000,            (ids of users over the free tier
+      "crossing_after": 1234,             listed per scenario, after this id)
+      "scenarios": [
+        {"name": "cheaper storage", "PRICE_STORAGE_PER_GB_DAY": 0.2},
+        {"FREE_API_CALLS": 500, "PRICE_API_PER_CALL": 0.002}
+      ]
+    }
+    Omitted rate keys use the live values. A "current" scenario is
+    always included first as the baseline.
+    """
+    admin, err = require_admin()
+    if err: return err
+
+    data  = request.get_json() or {}
+    today = date.today()
+
+    try:
+        year  = int(data.get("year",  today.year))
+        month = int(data.get("month", today.month))
+        top_n = int(data.get("top_n", 20))
+        crossing_limit = int(data.get("crossing_limit", 1000))
+        crossing_after = data.get("crossing_after")
+        crossing_after = int(crossing_after) if crossing_after is not None else None
+    except (TypeError, ValueError):
+        return jsonify({
+            "error": "year, month, top_n, crossing_limit and crossing_after must be valid numbers"
+        }), 400
+
+    if month < 1 or month > 12:
+        return jsonify({"error": "month must be between 1 and 12"}), 400
+
+    scenarios = data.get("scenarios")
+    if not isinstance(scenarios, list) or not scenarios:
+        return jsonify({"error": "scenarios must be a non-empty list"}), 400
+    if len(scenarios) > MAX_SCENARIOS:
+        return jsonify({"error": f"At most {MAX_SCENARIOS} scenarios per request"}), 400
+    if not all(isinstance(s, dict) for s in scenarios):
+        return jsonify({"error": "each scenario must be an object"}), 400
+
+    try:
+        result = simulate_pricing(
+            year, month, scenarios,
+            top_n=max(0, min(top_n, 100)),
+            crossing_limit=max(0, min(crossing_limit, MAX_CROSSING_IDS)),
+            crossing_after=crossing_after
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(result), 200
+
+
 # PLATFORM USAGE STATS 
 @admin_bp.route("/api/admin/platform-stats", methods=["GET"])
 @jwt_required()
 def platform_stats():
+    """
+    Last 14 days from the daily platform snapshots (today's point is
+    refreshed every hour), plus the current top users by storage.
+    """
     admin, err = require_admin()
     if err: return err
 
@@ -319,46 +560,122 @@ def platform_stats():
     end   = date.today()
     start = end - timedelta(days=13)
 
-    daily = db.session.query(
-        UsageLog.date,
-        func.sum(UsageLog.api_calls).label("total_api"),
-        func.sum(UsageLog.storage_used).label("total_storage"),
-        func.count(func.distinct(UsageLog.user_id)).label("active_users")
-    ).filter(
-        UsageLog.date >= start,
-        UsageLog.date <= end
-    ).group_by(UsageLog.date).all()
-
-    daily_map = {str(row.date): row for row in daily}
+    daily_map = get_snapshot_series(
+        "day",
+        datetime.combine(start, datetime.min.time()),
+        datetime.combine(end,   datetime.min.time())
+    )
     history   = []
     current   = start
     while current <= end:
-        ds  = str(current)
-        row = daily_map.get(ds)
+        snap = daily_map.get(datetime.combine(current, datetime.min.time()))
         history.append({
-            "date":         ds,
+            "date":         str(current),
             "label":        current.strftime("%d %b"),
-            "api_calls":    int(row.total_api)    if row else 0,
-            "storage_mb":   round((row.total_storage or 0) / (1024*1024), 2) if row else 0,
-            "active_users": int(row.active_users) if row else 0
+            "api_calls":    int(snap.api_calls)    if snap else 0,
+            "storage_mb":   round((snap.total_bytes or 0) / (1024*1024), 2) if snap else 0,
+            "active_users": int(snap.active_users) if snap else 0
         })
         current += timedelta(days=1)
 
-    top_storage = db.session.query(
-        User.username,
-        func.sum(StorageObject.file_size).label("total_bytes")
-    ).join(StorageObject, User.id == StorageObject.user_id)\
-     .group_by(User.id)\
-     .order_by(func.sum(StorageObject.file_size).desc())\
-     .limit(5).all()
+    _, top_storage, _ = top_users("storage", 5)
+    usernames = dict(
+        db.session.query(User.id, User.username)
+                  .filter(User.id.in_([uid for uid, _ in top_storage]))
+                  .all()
+    ) if top_storage else {}
 
     return jsonify({
         "daily_history": history,
         "top_users_by_storage": [
             {
-                "username":   row.username,
-                "storage_mb": round((row.total_bytes or 0) / (1024*1024), 2)
+                "username":   usernames.get(uid, "deleted"),
+                "storage_mb": round(score / (1024*1024), 2)
+            }
+            for uid, score in top_storage
+        ]
+    }), 200
+
+
+# LEADERBOARDS — top K users
+@admin_bp.route("/api/admin/leaderboards/<board>", methods=["GET"])
+@jwt_required()
+def leaderboard(board):
+    """
+    Top users by storage, api_calls (per month) or billed.
+
+    ?limit=10&offset=0
+    ?month=2026-09   (api_calls only, default: current month)
+    """
+    admin, err = require_admin()
+    if err: return err
+
+    if board not in BOARDS:
+        return jsonify({
+            "error": f"Unknown leaderboard '{board}'",
+            "boards": list(BOARDS)
+        }), 404
+
+    try:
+        limit  = parse_limit(request.args.get("limit"), default=10)
+        offset = max(0, int(request.args.get("offset", 0)))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be valid numbers"}), 400
+
+    month = request.args.get("month") if board == "api_calls" else None
+    if month:
+        try:
+            datetime.strptime(month, "%Y-%m")
+        except ValueError:
+            return jsonify({"error": "month must be YYYY-MM"}), 400
+
+    total, entries, source = top_users(board, limit, offset, month)
+
+    usernames = dict(
+        db.session.query(User.id, User.username)
+                  .filter(User.id.in_([uid for uid, _ in entries]))
+                  .all()
+    ) if entries else {}
+
+    return jsonify({
+        "board":       board,
+        "description": BOARDS[board],
+        "month":       month or (date.today().strftime("%Y-%m") if board == "api_calls" else None),
+        "total":       total,
+        "limit":       limit,
+        "offset":      offset,
+        "has_more":    offset + len(entries) < total,
+        "source":      source,
+        "entries": [
+            {
+                "rank":     offset + i + 1,
+                "user_id":  uid,
+                "username": usernames.get(uid, "deleted"),
+                "score":    round(score, 4) if board == "billed" else int(score)
             }
-            for row in top_storage
+            for i, (uid, score) in enumerate(entries)
         ]
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+# Deduplication savings
+@admin_bp.route("/api/admin/storage/dedup", methods=["GET"])
+@jwt_required()
+def storage_dedup():
+    """
+    Physical vs logical storage: what users are billed for against what
+    is actually stored once identical files share a blob.
+    """
+    admin, err = require_admin()
+    if err: return err
+
+    try:
+        top = parse_limit(request.args.get("top"), default=10)
+    except ValueError:
+        return jsonify({"error": "top must be a valid number"}), 400
+
+    report = dedup_report(top)
+    for field in ("logical_bytes", "physical_bytes", "saved_bytes", "garbage_bytes"):
+        report[field.replace("_bytes", "_mb")] = round(report[field] / (1024 * 1024), 2)
+
+    return jsonify(report), 200
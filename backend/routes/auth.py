@@ -3,7 +3,8 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from flask_bcrypt import Bcrypt
 from models import db, User
 from datetime import timedelta
-from services.minio_service import create_user_bucket
+from services.storage_service import storage
+from services.search_service import index_user
 
 auth_bp = Blueprint("auth", __name__)
 bcrypt = Bcrypt()
@@ -31,9 +32,11 @@ def register():
     new_user = User(username=username, email=email, password=hashed_password)
 
     db.session.add(new_user)
+    db.session.flush()
+    index_user(new_user)
     db.session.commit()
 
-    create_user_bucket(username)
+    storage.create_user_bucket(username)
 
     return jsonify({"message": f"User '{username}' registered successfully!"}), 201
 
@@ -1,10 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User
 from services.billing_service import (
     calculate_bill,
+    calculate_bill_for_period,
     generate_invoice,
-    get_current_estimate,
+    get_current_estimate_json,
     get_user_invoices,
     mark_invoice_paid
 )
@@ -26,17 +27,17 @@ def estimate():
     Live estimate of what this month's bill will be.
     Includes a forecast for the full month.
     Frontend shows this as 'Estimated Bill This Month'.
+    Served from cache until the user's usage changes.
     """
     user = get_current_user()
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    data = get_current_estimate(user.id)
+    body, hit = get_current_estimate_json(user.id, user.username)
 
-    return jsonify({
-        "username": user.username,
-        "estimate": data
-    }), 200
+    response = current_app.response_class(body, status=200, mimetype="application/json")
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return response
 
 
 # CALCULATE — preview bill (month)
@@ -48,11 +49,27 @@ def calculate():
     Use this to preview before generating a real invoice.
 
     ?year=2026&month=2
+    ?start=2026-02-10&end=2026-02-20   (any range, time-weighted storage)
     """
     user = get_current_user()
     if not user:
         return jsonify({"error": "User not found"}), 404
 
+    if "start" in request.args or "end" in request.args:
+        try:
+            start = date.fromisoformat(request.args["start"])
+            end   = date.fromisoformat(request.args["end"])
+        except (KeyError, ValueError):
+            return jsonify({"error": "start and end must both be YYYY-MM-DD dates"}), 400
+
+        if start > end:
+            return jsonify({"error": "start must be on or before end"}), 400
+
+        return jsonify({
+            "username": user.username,
+            "bill":     calculate_bill_for_period(user.id, start, end)
+        }), 200
+
     today = date.today()
     try:
         year  = int(request.args.get("year",  today.year))
@@ -1,15 +1,29 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, StorageObject, UsageLog
-from services.usage_service import log_api_call, update_storage_snapshot
-from services.minio_service import (
-    upload_file, download_file, delete_file,
-    list_files, get_total_storage_used,get_storage_summary
+from models import db, User, StorageObject
+from services.usage_service import (
+    log_api_call, update_storage_snapshot,
+    adjust_storage_used, get_storage_summary
 )
-from utils.validators import validate_file, sanitize_filename, format_bytes
+from services.storage_service import storage
+from services.dedup_service import (
+    store_blob, drop_bucket_copies, release_blobs, collect_garbage,
+    object_stat, object_stream, object_local_path, object_download_url
+)
+from services.presign_service import (
+    reserve_upload, is_reserved, claim_upload, release_upload, drop_upload
+)
+from utils.validators import (
+    validate_file, validate_filename, validate_size, upload_byte_limit,
+    sanitize_filename, format_bytes
+)
+from utils.streams import MeteredReader, UploadLimitExceeded
+from utils.compression import codec_for, spool_compressed, decompress_range
 from config import Config
-from datetime import datetime, date
-import io
+from werkzeug.datastructures import ContentRange
+from datetime import datetime
+from collections import namedtuple
+import os
 
 objects_bp = Blueprint("objects", __name__)
 
@@ -19,91 +33,141 @@ def get_current_user():
     return User.query.get(int(user_id))
 
 
-# def log_api_call(user_id):
-#     today = date.today()
-#     log = UsageLog.query.filter_by(user_id=user_id, date=today).first()
-#     if log:
-#         log.api_calls += 1
-#     else:
-#         log = UsageLog(user_id=user_id, date=today, api_calls=1, storage_used=0)
-#         db.session.add(log)
-#     db.session.commit()
+# Upload helpers
+def unique_filename(user_id, safe_filename, taken=()):
+    """
+    Appends a timestamp when the user already has a file with this name,
+    a presigned upload has reserved it, or (in a batch) an earlier file
+    of the batch took it.
+    """
+    existing = StorageObject.query.filter_by(
+        user_id=user_id, filename=safe_filename
+    ).first()
 
+    if existing or safe_filename in taken or is_reserved(user_id, safe_filename):
+        name, ext = os.path.splitext(safe_filename)
+        timestamp  = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        safe_filename = f"{name}_{timestamp}{ext}"
+        n = 1
+        while safe_filename in taken:
+            n += 1
+            safe_filename = f"{name}_{timestamp}_{n}{ext}"
+    return safe_filename
 
-# def update_storage_log(user_id, username):
-#     today = date.today()
-#     total_bytes = get_total_storage_used(username)
-#     log = UsageLog.query.filter_by(user_id=user_id, date=today).first()
-#     if log:
-#         log.storage_used = total_bytes
-#     else:
-#         log = UsageLog(user_id=user_id, date=today, storage_used=total_bytes, api_calls=0)
-#         db.session.add(log)
-#     db.session.commit()
 
+# What stream_to_storage() stored: logical size and hash of the file,
+# and the bytes actually written (smaller if it was compressed)
+StoredUpload = namedtuple("StoredUpload", "size sha256 stored_size content_encoding")
 
-# UPLOAD file
-@objects_bp.route("/api/objects/upload", methods=["POST"])
-@jwt_required()
-def upload():
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
-    if "file" not in request.files:
-        return jsonify({
-            "error": "No file found in request",
-            "hint": "In Postman: Body → form-data → key='file', type=File"
-        }), 400
-
-    file = request.files["file"]
-
-    current_storage = get_total_storage_used(user.username)
 
-    is_valid, error_msg = validate_file(file, current_storage)
-    if not is_valid:
-        return jsonify({"error": error_msg}), 400
-    
-    original_name  = file.filename
-    safe_filename  = sanitize_filename(original_name)
-    content_type   = file.content_type or "application/octet-stream"
-    file_data      = file.read()
-    file_size      = len(file_data)
+def stream_to_storage(user, stream, safe_filename, content_type, length=-1,
+                      current_storage=None):
+    """
+    Pipes an upload into MinIO through a MeteredReader, which enforces
+    the per-file limit and the remaining quota while the bytes flow and
+    hashes them on the way. The file is never held in memory as a whole.
 
-    existing = StorageObject.query.filter_by(
-        user_id=user.id, filename=safe_filename
-    ).first()
+    Types listed in COMPRESSION_CODECS (when COMPRESSION_ENABLED) are
+    compressed first and stored compressed only if that pays off.
 
-    if existing:
-        import os
-        name, ext = os.path.splitext(safe_filename)
-        timestamp  = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        safe_filename = f"{name}_{timestamp}{ext}"
+    current_storage defaults to the user's recorded total; batch uploads
+    pass the total including the files stored earlier in the batch.
 
-    success = upload_file(
-        user.username, file_data,
-        safe_filename, content_type, file_size
-    )
+    Returns (upload, error, status); error is a JSON body, None on success.
+    """
+    if current_storage is None:
+        current_storage = user.storage_bytes
+    reader = MeteredReader(stream, upload_byte_limit(current_storage))
+
+    body, body_length, encoding = reader, length, None
+    try:
+        codec = codec_for(safe_filename)
+        if codec:
+            body, body_length, encoding = spool_compressed(reader, codec)
+            if reader.bytes_read == 0:
+                body.close()
+                _, error_msg = validate_size(0, current_storage)
+                return None, {"error": error_msg}, 400
+
+        success = storage.upload_stream(
+            user.username, body, safe_filename, content_type, body_length
+        )
+    except UploadLimitExceeded as e:
+        # Raised while reading the upload: by spool_compressed before
+        # storage was called, or mid-upload, after which the backend has
+        # already dropped the partial object (MinIO aborts the multipart
+        # upload, local disk removes its temp file)
+        _, error_msg = validate_size(e.bytes_read, current_storage, at_least=True)
+        return None, {"error": error_msg}, 413
+    finally:
+        if body is not reader:
+            body.close()
 
     if not success:
-        return jsonify({
+        return None, {
             "error": "Upload to storage failed",
             "hint": "Make sure MinIO is running: docker ps"
-        }), 500
-    
+        }, 500
+
+    if reader.bytes_read == 0:
+        storage.delete_file(user.username, safe_filename)
+        _, error_msg = validate_size(0, current_storage)
+        return None, {"error": error_msg}, 400
+
+    stored_size = body_length if encoding else reader.bytes_read
+    return StoredUpload(reader.bytes_read, reader.sha256, stored_size, encoding), None, 201
+
+
+def new_storage_object(user, safe_filename, file_size, checksum=None,
+                       stored_size=None, content_encoding=None):
+    """
+    The StorageObject for an upload now in the user's bucket, after
+    handing its bytes to deduplication. Not added to the session.
+    A blob reused from an earlier upload brings its own stored size
+    and encoding.
+    """
+    if stored_size is None:
+        stored_size = file_size
+
+    blob, _ = store_blob(
+        user, safe_filename, stored_size, checksum, content_encoding
+    )
+    if blob:
+        stored_size, content_encoding = blob.size, blob.content_encoding
+
     new_object = StorageObject(
         user_id=user.id,
         filename=safe_filename,
         object_key=f"{user.username}/{safe_filename}",
-        file_size=file_size
+        file_size=file_size,
+        stored_size=stored_size,
+        content_encoding=content_encoding,
+        checksum=checksum,
+        blob_id=blob.id if blob else None
+    )
+    return new_object
+
+
+def finish_upload(user, original_name, safe_filename, file_size, checksum=None,
+                  stored_size=None, content_encoding=None):
+    """
+    Records a stored upload: DB row, storage counters, usage, and the
+    response body shared by every upload endpoint.
+    Content seen before is deduplicated and some types are stored
+    compressed; the user is still charged for file_size (logical bytes).
+    """
+    new_object = new_storage_object(
+        user, safe_filename, file_size, checksum, stored_size, content_encoding
     )
     db.session.add(new_object)
+    adjust_storage_used(user.id, file_size)
     db.session.commit()
-    
+    drop_bucket_copies(user.username, [new_object])
+
     log_api_call(user.id)
-    update_storage_snapshot(user.id, user.username)
+    update_storage_snapshot(user.id)
 
-    summary = get_storage_summary(user.username)
+    summary = get_storage_summary(user.id)
 
     response = {
         "message": "File uploaded successfully!",
@@ -122,17 +186,267 @@ def upload():
             f"You have used {summary['percent_used']}% of your storage quota. "
             f"Only {summary['remaining_readable']} remaining."
         )
+    return jsonify(response), 201
+
+
+# UPLOAD file
+@objects_bp.route("/api/objects/upload", methods=["POST"])
+@jwt_required()
+def upload():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    if "file" not in request.files:
+        return jsonify({
+            "error": "No file found in request",
+            "hint": "In Postman: Body → form-data → key='file', type=File"
+        }), 400
+
+    file = request.files["file"]
+
+    current_storage = user.storage_bytes
+
+    is_valid, error_msg = validate_file(file, current_storage)
+    if not is_valid:
+        return jsonify({"error": error_msg}), 400
+    
+    original_name  = file.filename
+    safe_filename  = unique_filename(user.id, sanitize_filename(original_name))
+    content_type   = file.content_type or "application/octet-stream"
+
+    # validate_file measured the part; send it with its length so small
+    # files go up in a single PUT
+    stream    = file.stream
+    stream.seek(0, os.SEEK_END)
+    file_size = stream.tell()
+    stream.seek(0)
+
+    upload, error, status = stream_to_storage(
+        user, stream, safe_filename, content_type, file_size
+    )
+    if error:
+        return jsonify(error), status
+
+    return finish_upload(
+        user, original_name, safe_filename, upload.size, upload.sha256,
+        upload.stored_size, upload.content_encoding
+    )
+
+
+# UPLOAD raw request body
+@objects_bp.route("/api/objects/stream/<filename>", methods=["PUT"])
+@jwt_required()
+def upload_raw(filename):
+    """
+    Upload with the file as the request body instead of a form:
+        PUT /api/objects/stream/report.pdf
+        Content-Type: application/pdf
+
+    The body goes straight to MinIO as it arrives. A declared
+    Content-Length is checked up front; chunked bodies are cut off as
+    soon as they pass the limit.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    is_valid, error_msg = validate_filename(filename)
+    if not is_valid:
+        return jsonify({"error": error_msg}), 400
+
+    length = request.content_length
+    if length is not None:
+        is_valid, error_msg = validate_size(length, user.storage_bytes)
+        if not is_valid:
+            return jsonify({"error": error_msg}), 413 if length else 400
+
+    safe_filename = unique_filename(user.id, sanitize_filename(filename))
+    content_type  = request.mimetype or "application/octet-stream"
+
+    upload, error, status = stream_to_storage(
+        user, request.stream, safe_filename, content_type,
+        length if length is not None else -1
+    )
+    if error:
+        return jsonify(error), status
+
+    return finish_upload(
+        user, filename, safe_filename, upload.size, upload.sha256,
+        upload.stored_size, upload.content_encoding
+    )
+
+
+def presign_unavailable():
     return jsonify({
-    "message": "File uploaded successfully!",
-    "file": {
-        **new_object.to_dict(),
-        "original_name": original_name,
-        "saved_as": safe_filename,
-        "size_readable": format_bytes(file_size),
-        "renamed": original_name != safe_filename
-    },
-    "storage": summary
-}), 201
+        "error": f"Presigned URLs are not available with the '{storage.name}' storage backend",
+        "hint": "Use POST /api/objects/upload and GET /api/objects/download/<filename>"
+    }), 501
+
+
+# PRESIGNED upload, step 1: get a form
+@objects_bp.route("/api/objects/presign/upload", methods=["POST"])
+@jwt_required()
+def presign_upload():
+    """
+    Body: {"filename": "...", "size": bytes}
+    Returns a short-lived URL and form fields the client POSTs the file
+    to directly (multipart/form-data, fields first, then "file"), so the
+    bytes never pass through this server. MinIO only accepts an object
+    of 1..max_bytes under the given key. The client then calls
+    /api/objects/presign/complete with the returned upload_id.
+
+    The filename is reserved until the upload completes or expires.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    if not storage.supports_presigned:
+        return presign_unavailable()
+
+    data     = request.get_json(silent=True) or {}
+    filename = data.get("filename") or ""
+    size     = data.get("size")
+
+    is_valid, error_msg = validate_filename(filename)
+    if not is_valid:
+        return jsonify({"error": error_msg}), 400
+
+    if not isinstance(size, int) or isinstance(size, bool):
+        return jsonify({"error": "size (in bytes) is required"}), 400
+
+    # The declared size is checked now; the real one on completion
+    is_valid, error_msg = validate_size(size, user.storage_bytes)
+    if not is_valid:
+        return jsonify({"error": error_msg}), 413 if size else 400
+
+    # Per-file limit and remaining quota, enforced by MinIO on the POST
+    max_bytes = upload_byte_limit(user.storage_bytes)
+
+    safe_filename = sanitize_filename(filename)
+    taken   = set()
+    pending = None
+    while pending is None and len(taken) < 3:
+        name    = unique_filename(user.id, safe_filename, taken)
+        pending = reserve_upload(user.id, name, filename, max_bytes)
+        taken.add(name)
+    if pending is None:
+        return jsonify({"error": "Could not reserve a filename, please retry"}), 409
+
+    try:
+        url, fields = storage.presigned_upload_post(pending.upload_key, max_bytes)
+    except Exception as e:
+        print(f"❌ Presign error: {e}")
+        db.session.delete(pending)
+        db.session.commit()
+        return jsonify({
+            "error": "Could not create an upload URL",
+            "hint": "Make sure MinIO is running: docker ps"
+        }), 500
+
+    log_api_call(user.id)
+
+    return jsonify({
+        "upload_url":    url,
+        "method":        "POST",
+        "fields":        fields,
+        "upload_id":     pending.upload_key,
+        "object_name":   pending.filename,
+        "original_name": filename,
+        "max_bytes":     max_bytes,
+        "expires_in":    Config.PRESIGNED_URL_EXPIRY,
+        "complete_url":  "/api/objects/presign/complete"
+    }), 200
+
+
+# PRESIGNED upload, step 2: record it
+@objects_bp.route("/api/objects/presign/complete", methods=["POST"])
+@jwt_required()
+def presign_complete():
+    """
+    Body: {"upload_id": "..."}
+    Checks the object MinIO received (one stat) against the size limit
+    and quota, copies exactly that object into the user's bucket under
+    the reserved name and records it like any other upload. An upload
+    that breaks the limits is deleted and its reservation dropped.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    if not storage.supports_presigned:
+        return presign_unavailable()
+
+    data      = request.get_json(silent=True) or {}
+    upload_id = data.get("upload_id")
+    if not isinstance(upload_id, str) or not upload_id:
+        return jsonify({"error": "upload_id is required"}), 400
+
+    pending = claim_upload(user.id, upload_id)
+    if pending is None:
+        return jsonify({
+            "error": "No pending upload with this upload_id",
+            "hint": "It may already be completed, or it expired"
+        }), 404
+
+    stat = storage.stat_upload(pending.upload_key)
+    if stat is None:
+        release_upload(pending)
+        return jsonify({
+            "error": "Nothing has been uploaded for this upload_id yet",
+            "hint": "POST the file to upload_url before calling complete"
+        }), 404
+
+    is_valid, error_msg = validate_size(stat.size, user.storage_bytes)
+    if not is_valid:
+        drop_upload(pending)
+        return jsonify({"error": error_msg}), 413 if stat.size else 400
+
+    if not storage.claim_upload(pending.upload_key, stat.etag, user.username, pending.filename):
+        release_upload(pending)
+        return jsonify({
+            "error": "Could not move the upload into your bucket",
+            "hint": "Call complete again"
+        }), 500
+
+    original_name, object_name = pending.original_name, pending.filename
+    db.session.delete(pending)   # committed by finish_upload
+    return finish_upload(user, original_name, object_name, stat.size)
+
+
+# PRESIGNED download
+@objects_bp.route("/api/objects/presign/download/<filename>", methods=["GET"])
+@jwt_required()
+def presign_download(filename):
+    """
+    Returns a short-lived URL the client downloads the file from
+    directly (MinIO handles Range requests itself).
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    obj = StorageObject.query.filter_by(
+        user_id=user.id, filename=filename
+    ).first()
+    if not obj:
+        return jsonify({
+            "error": f"File '{filename}' not found",
+            "hint": "Use GET /api/objects/list to see your files"
+        }), 404
+
+    if not storage.supports_presigned:
+        return presign_unavailable()
+
+    log_api_call(user.id)
+
+    return jsonify({
+        "download_url": object_download_url(user.username, obj),
+        "filename":     filename,
+        "file_size":    obj.file_size,
+        "expires_in":   Config.PRESIGNED_URL_EXPIRY
+    }), 200
     
 
 
@@ -163,7 +477,7 @@ def list_user_files():
         file_dict["size_readable"] = format_bytes(f.file_size)
         files_data.append(file_dict)
 
-    summary = get_storage_summary(user.username)
+    summary = get_storage_summary(user.id)
 
     response = {
         "username":    user.username,
@@ -205,8 +519,8 @@ def download(filename):
 
     log_api_call(user.id)
 
-    file_data = download_file(user.username, filename)
-    if file_data is None:
+    stat = object_stat(user.username, obj)
+    if stat is None:
         return jsonify({
             "error": "File exists in database but not in storage",
             "hint": "This file may be corrupted. Try deleting and re-uploading it."
@@ -214,14 +528,90 @@ def download(filename):
 
     import mimetypes
     content_type, _ = mimetypes.guess_type(filename)
-    content_type = content_type or "application/octet-stream"
-
-    return send_file(
-        io.BytesIO(file_data),
-        download_name=filename,
-        as_attachment=True,
-        mimetype=content_type
+    content_type = content_type or stat.content_type or "application/octet-stream"
+
+    # Stored compressed: clients that accept the encoding get the stored
+    # body as-is (Content-Encoding), everyone else gets it decoded
+    encoding = obj.content_encoding
+    decode   = bool(encoding) and not request.accept_encodings.quality(encoding)
+    etag     = f"{stat.etag}-{encoding}-decoded" if decode else stat.etag
+
+    # Local disk: send_file handles Range / conditional requests itself
+    # and passes the open file to wsgi.file_wrapper (sendfile, zero-copy)
+    path = None if decode else object_local_path(user.username, obj)
+    if path:
+        response = send_file(
+            path, mimetype=content_type, as_attachment=True,
+            download_name=filename, conditional=True, etag=stat.etag
+        )
+        response.accept_ranges = "bytes"
+        if encoding:
+            response.content_encoding = encoding
+            response.vary.add("Accept-Encoding")
+        return response
+
+    # Conditional GET: the client's copy is still current
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    size         = obj.file_size if decode else stat.size
+    start, stop  = 0, size
+    status       = 200
+    byte_range   = request.range
+
+    # If-Range: only honour the range if the client's copy is this one
+    if byte_range and request.if_range:
+        if_range = request.if_range
+        if if_range.etag and if_range.etag != etag:
+            byte_range = None
+        elif if_range.date and stat.last_modified and \
+                stat.last_modified.replace(microsecond=0) > if_range.date:
+            byte_range = None
+
+    if byte_range:
+        bounds = byte_range.range_for_length(size)
+        if bounds is None and len(byte_range.ranges) == 1:
+            response = Response(status=416)
+            response.content_range = ContentRange("bytes", None, None, size)
+            return response
+        if bounds is not None:
+            # Multi-range requests fall through and get the whole file
+            start, stop = bounds
+            status      = 206
+
+    length = stop - start
+    body   = []
+    if request.method != "HEAD" and length:
+        if decode:
+            # Decoded offsets are not stored offsets: read from the start
+            body = object_stream(user.username, obj)
+        else:
+            body = object_stream(user.username, obj, offset=start, length=length)
+        if body is None:
+            return jsonify({
+                "error": "File exists in database but not in storage",
+                "hint": "This file may be corrupted. Try deleting and re-uploading it."
+            }), 500
+        if decode:
+            body = decompress_range(body, encoding, start, stop)
+
+    response = Response(
+        body, status=status, mimetype=content_type, direct_passthrough=True
     )
+    response.content_length = length
+    response.accept_ranges  = "bytes"
+    response.set_etag(etag)
+    response.last_modified  = stat.last_modified
+    response.headers.set("Content-Disposition", "attachment", filename=filename)
+    if encoding:
+        response.vary.add("Accept-Encoding")
+        if not decode:
+            response.content_encoding = encoding
+    if status == 206:
+        response.content_range = ContentRange("bytes", start, stop, size)
+    return response
 
 
 # DELETE
@@ -243,21 +633,28 @@ def delete(filename):
         }), 404
 
     deleted_size = obj.file_size
-
-    success = delete_file(user.username, filename)
-    if not success:
-        return jsonify({
-            "error": "Failed to delete from storage",
-            "hint": "Make sure MinIO is still running"
-        }), 500
+    blob_id      = obj.blob_id
+
+    # Deduplicated content is shared: drop this file's reference and let
+    # garbage collection remove the blob once nothing points to it
+    if not blob_id:
+        success = storage.delete_file(user.username, filename)
+        if not success:
+            return jsonify({
+                "error": "Failed to delete from storage",
+                "hint": "Make sure MinIO is still running"
+            }), 500
 
     db.session.delete(obj)
+    adjust_storage_used(user.id, -deleted_size)
+    release_blobs([blob_id])
     db.session.commit()
+    collect_garbage([blob_id] if blob_id else [])
 
     log_api_call(user.id)
-    update_storage_snapshot(user.id, user.username)
+    update_storage_snapshot(user.id)
 
-    summary = get_storage_summary(user.username)
+    summary = get_storage_summary(user.id)
 
     return jsonify({
         "message": f"File '{filename}' deleted successfully!",
@@ -266,6 +663,180 @@ def delete(filename):
     }), 200
 
 
+# BATCH upload
+@objects_bp.route("/api/objects/batch-upload", methods=["POST"])
+@jwt_required()
+def batch_upload():
+    """
+    Several files in one form (key 'files', repeated). Each file is
+    checked and streamed on its own; everything that made it into
+    storage is then recorded in one transaction with one usage update.
+    Deduplication (which writes to the shared blobs table) runs only
+    once every file is streamed, so that transaction stays short.
+    Returns a result per file, in request order.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    files = [f for f in request.files.getlist("files") if f]
+    if not files:
+        return jsonify({
+            "error": "No files found in request",
+            "hint": "In Postman: Body → form-data → key='files' (repeat it), type=File"
+        }), 400
+
+    if len(files) > Config.BATCH_MAX_FILES:
+        return jsonify({"error": f"At most {Config.BATCH_MAX_FILES} files per batch"}), 400
+
+    current_storage = user.storage_bytes
+    results = []
+    streamed = []   # (result index, StoredUpload, saved name, original name)
+    taken   = set()
+
+    for file in files:
+        original_name = file.filename
+
+        is_valid, error_msg = validate_file(file, current_storage)
+        if not is_valid:
+            results.append({"filename": original_name, "status": "rejected", "error": error_msg})
+            continue
+
+        safe_filename = unique_filename(user.id, sanitize_filename(original_name), taken)
+        content_type  = file.content_type or "application/octet-stream"
+
+        stream    = file.stream
+        stream.seek(0, os.SEEK_END)
+        file_size = stream.tell()
+        stream.seek(0)
+
+        upload, error, _ = stream_to_storage(
+            user, stream, safe_filename, content_type, file_size, current_storage
+        )
+        if error:
+            results.append({"filename": original_name, "status": "failed", "error": error["error"]})
+            continue
+
+        taken.add(safe_filename)
+        current_storage += upload.size
+        streamed.append((len(results), upload, safe_filename, original_name))
+        results.append(None)
+
+    stored = [
+        (i, new_storage_object(
+            user, safe_filename, upload.size, upload.sha256,
+            upload.stored_size, upload.content_encoding
+        ), original_name)
+        for i, upload, safe_filename, original_name in streamed
+    ]
+    if stored:
+        db.session.add_all(obj for _, obj, _ in stored)
+        adjust_storage_used(user.id, sum(obj.file_size for _, obj, _ in stored))
+        db.session.commit()
+        drop_bucket_copies(user.username, [obj for _, obj, _ in stored])
+        update_storage_snapshot(user.id)
+
+        for i, obj, original_name in stored:
+            results[i] = {
+                **obj.to_dict(),
+                "status":         "uploaded",
+                "original_name":  original_name,
+                "saved_as":       obj.filename,
+                "size_readable":  format_bytes(obj.file_size),
+                "renamed": original_name != obj.filename
+            }
+
+    log_api_call(user.id)
+    summary = get_storage_summary(user.id)
+
+    response = {
+        "message":  f"{len(stored)} of {len(files)} file(s) uploaded",
+        "uploaded": len(stored),
+        "failed":   len(files) - len(stored),
+        "results":  results,
+        "storage":  summary
+    }
+
+    if summary["is_near_limit"]:
+        response["warning"] = (
+            f"You have used {summary['percent_used']}% of your storage quota. "
+            f"Only {summary['remaining_readable']} remaining."
+        )
+    return jsonify(response), 201 if stored else 400
+
+
+# BATCH delete
+@objects_bp.route("/api/objects/batch-delete", methods=["POST"])
+@jwt_required()
+def batch_delete():
+    """
+    Body: {"filenames": ["a.pdf", "b.png", ...]}
+    One multi-object delete in storage, one transaction, one usage
+    update. Returns a result per file, in request order.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    data      = request.get_json(silent=True) or {}
+    filenames = data.get("filenames")
+
+    if not isinstance(filenames, list) or not filenames \
+            or not all(isinstance(name, str) for name in filenames):
+        return jsonify({"error": "filenames must be a non-empty list of names"}), 400
+
+    filenames = list(dict.fromkeys(filenames))
+    if len(filenames) > Config.BATCH_MAX_FILES:
+        return jsonify({"error": f"At most {Config.BATCH_MAX_FILES} files per batch"}), 400
+
+    objects = StorageObject.query.filter(
+        StorageObject.user_id == user.id,
+        StorageObject.filename.in_(filenames)
+    ).all()
+    found = {obj.filename for obj in objects}
+
+    # Only files with their own object in the user's bucket are removed
+    # from storage; deduplicated ones just give up their blob reference
+    unshared = [obj.filename for obj in objects if not obj.blob_id]
+    errors   = storage.delete_files(user.username, unshared) if unshared else {}
+    deleted  = [obj for obj in objects if obj.filename not in errors]
+    freed   = {}
+    for obj in deleted:
+        freed[obj.filename] = freed.get(obj.filename, 0) + (obj.file_size or 0)
+
+    if deleted:
+        StorageObject.query.filter(
+            StorageObject.id.in_([obj.id for obj in deleted])
+        ).delete(synchronize_session=False)
+        adjust_storage_used(user.id, -sum(freed.values()))
+        released = release_blobs(obj.blob_id for obj in deleted)
+        db.session.commit()
+        collect_garbage(released)
+        update_storage_snapshot(user.id)
+
+    log_api_call(user.id)
+
+    results = []
+    for name in filenames:
+        if name not in found:
+            results.append({"filename": name, "status": "not_found"})
+        elif name in errors:
+            results.append({"filename": name, "status": "failed", "error": errors[name]})
+        else:
+            results.append({
+                "filename": name, "status": "deleted",
+                "freed_space": format_bytes(freed[name])
+            })
+
+    return jsonify({
+        "message":     f"{len(freed)} of {len(filenames)} file(s) deleted",
+        "deleted":     len(freed),
+        "freed_space": format_bytes(sum(freed.values())),
+        "results":     results,
+        "storage":     get_storage_summary(user.id)
+    }), 200
+
+
 # STORAGE SUMMARY 
 @objects_bp.route("/api/objects/storage", methods=["GET"])
 @jwt_required()
@@ -279,7 +850,7 @@ def storage_info():
         return jsonify({"error": "User not found"}), 404
 
     log_api_call(user.id)
-    summary = get_storage_summary(user.username)
+    summary = get_storage_summary(user.id)
 
     return jsonify({
         "username": user.username,
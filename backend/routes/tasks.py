@@ -71,9 +71,54 @@ def task_status(task_id):
 
     from celery_app import celery
     task = celery.AsyncResult(task_id)
+    result = task.result if task.status == "SUCCESS" else None
 
-    return jsonify({
+    response = {
         "task_id": task_id,
         "status":  task.status,
-        "result":  task.result if task.status == "SUCCESS" else None
-    }), 200
\ No newline at end of file
+        "result":  result
+    }
+
+    # Sharded runs (e.g. invoices) return their chord ids — report progress
+    if isinstance(result, dict) and result.get("group_id"):
+        response["progress"] = get_shard_progress(
+            celery, result["group_id"], result.get("callback_id")
+        )
+
+    return jsonify(response), 200
+
+
+def get_shard_progress(celery, group_id, callback_id=None):
+    """
+    Progress of a chord-based task: how many shards finished, running
+    totals from the finished ones, and the merged result once the
+    chord callback has run.
+    """
+    from celery.result import GroupResult
+    from tasks import merge_shard_counts
+
+    shards = GroupResult.restore(group_id, app=celery)
+    if shards is None:
+        return {"error": "Shard results expired or not found"}
+
+    finished = [r for r in shards.results if r.ready()]
+    totals   = merge_shard_counts(
+        r.result for r in finished if r.successful()
+    )
+
+    progress = {
+        "shards_total":  len(shards.results),
+        "shards_done":   len(finished),
+        "shards_failed": sum(1 for r in finished if r.failed()),
+        "percent":       round(len(finished) / len(shards.results) * 100, 1)
+                         if shards.results else 100.0,
+        "totals_so_far": totals
+    }
+
+    if callback_id:
+        callback = celery.AsyncResult(callback_id)
+        progress["merge_status"] = callback.status
+        if callback.successful():
+            progress["final"] = callback.result
+
+    return progress
\ No newline at end of file
@@ -6,7 +6,8 @@ from services.usage_service import (
     get_usage_history,
     get_monthly_summary,
     get_current_month_summary,
-    get_alltime_stats
+    get_alltime_stats,
+    HISTORY_GRANULARITIES
 )
 from datetime import date
 
@@ -30,7 +31,7 @@ def today():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    data = get_today_usage(user.id, user.username)
+    data = get_today_usage(user.id)
     return jsonify({
         "username": user.username,
         "usage":    data
@@ -42,11 +43,15 @@ def today():
 @jwt_required()
 def history():
     """
-    Returns daily usage for the last N days.
+    Returns usage for the last N days.
     ?days=7  → last 7 days
     ?days=30 → last 30 days (default)
     ?days=90 → last 90 days
 
+    ?granularity=day|week|month → one point per day (default),
+    per week or per month. A year-long chart at month granularity
+    is 12–13 points.
+
     Frontend uses this data to draw line/bar charts.
     """
     user = get_current_user()
@@ -62,19 +67,18 @@ def history():
     except ValueError:
         return jsonify({"error": "days must be a number"}), 400
 
-    history_data = get_usage_history(user.id, days)
+    granularity = request.args.get("granularity", "day")
+    if granularity not in HISTORY_GRANULARITIES:
+        return jsonify({
+            "error": "granularity must be one of: " + ", ".join(HISTORY_GRANULARITIES)
+        }), 400
 
-    peak_storage = max((d["storage_used_mb"] for d in history_data), default=0)
-    peak_api     = max((d["api_calls"]        for d in history_data), default=0)
-    total_api    = sum(d["api_calls"]          for d in history_data)
+    data = get_usage_history(user.id, days, granularity)
 
     return jsonify({
         "username":       user.username,
         "days_requested": days,
-        "peak_storage_mb": peak_storage,
-        "peak_api_calls":  peak_api,
-        "total_api_calls": total_api,
-        "history":         history_data
+        **data
     }), 200
 
 
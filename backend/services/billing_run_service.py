@@ -0,0 +1,276 @@
+from models import (
+    db, User, Invoice,
+    BillingRun, BillingRunShard, BillingRunItem
+)
+from services.billing_service import price_invoices_bulk, insert_invoices_bulk
+from services.leaderboard_service import record_invoices
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+
+# Split users into id ranges
+def split_into_shards(user_ids, shard_size):
+    """
+    Turns a sorted list of user ids into [lo, hi) id ranges holding
+    shard_size users each. The last range is open-ended (hi=None) so
+    users created during the run still land in a shard.
+    """
+    bounds = user_ids[::shard_size]
+    return [
+        (lo, bounds[i + 1] if i + 1 < len(bounds) else None)
+        for i, lo in enumerate(bounds)
+    ]
+
+
+# Create (or reopen) the run for a month
+def get_or_create_run(year, month, shard_size):
+    """
+    One billing run per month. Calling this again for the same month
+    reopens the existing run instead of starting over — its shards keep
+    their cursors, so only the remaining work is done.
+    Returns (run, created).
+    """
+    month_label = f"{year}-{str(month).zfill(2)}"
+    user_ids    = [
+        uid for (uid,) in db.session.query(User.id)
+                                    .filter(User.role == "user")
+                                    .order_by(User.id)
+    ]
+
+    run = BillingRun.query.filter_by(month=month_label).first()
+    if run:
+        run.status      = "running"
+        run.finished_at = None
+        run.total_users = len(user_ids)
+        db.session.commit()
+        return run, False
+
+    run = BillingRun(
+        month=month_label,
+        year=year,
+        month_number=month,
+        total_users=len(user_ids)
+    )
+    db.session.add(run)
+
+    try:
+        db.session.flush()
+        for lo, hi in split_into_shards(user_ids, shard_size) or [(None, None)]:
+            db.session.add(BillingRunShard(run_id=run.id, lo=lo, hi=hi))
+        db.session.commit()
+    except IntegrityError:
+        # Another dispatcher created this month's run first
+        db.session.rollback()
+        return BillingRun.query.filter_by(month=month_label).first(), False
+
+    return run, True
+
+
+def shards_to_dispatch(run):
+    """
+    Shards that still have work: anything not completed, plus the
+    open-ended last shard (it may have new users past its cursor).
+    """
+    return [
+        shard for shard in run.shards
+        if shard.status != "completed" or shard.hi is None
+    ]
+
+
+# Process one shard from its checkpoint
+def process_shard(shard_id, notify, batch_size):
+    """
+    Invoices the shard's users in batches of batch_size, in id order.
+
+    Each batch checkpoints three times:
+    1. priced:    a billing_run_items row per user
+    2. persisted: invoices inserted, items linked to them (same commit)
+    3. emailed:   notify(user_row, invoice_dict) succeeded, per user
+    then the shard cursor moves past the batch.
+
+    If the worker dies mid-batch, the retry redoes the batch from the
+    cursor: existing items/invoices are reused, and only users whose
+    items are not yet "emailed" get an email.
+    Returns the shard's {generated, skipped, failed} counts.
+    """
+    shard = db.session.get(BillingRunShard, shard_id)
+    run   = shard.run
+
+    shard.status = "running"
+    shard.error  = None
+    db.session.commit()
+
+    # Emails that failed in earlier batches (cursor already moved past them)
+    leftover = BillingRunItem.query.filter_by(shard_id=shard.id, status="persisted").all()
+    if leftover:
+        users = {
+            u.id: u for u in
+            User.query.filter(User.id.in_([item.user_id for item in leftover]))
+        }
+        _send_emails(leftover, users, notify)
+
+    while True:
+        query = db.session.query(User.id).filter(User.role == "user")
+        if shard.cursor is not None:
+            query = query.filter(User.id > shard.cursor)
+        elif shard.lo is not None:
+            query = query.filter(User.id >= shard.lo)
+        if shard.hi is not None:
+            query = query.filter(User.id < shard.hi)
+
+        user_ids = [uid for (uid,) in query.order_by(User.id).limit(batch_size)]
+        if not user_ids:
+            break
+
+        _process_batch(run, shard, user_ids, notify)
+
+        shard.cursor = user_ids[-1]
+        _refresh_shard_counts(shard)
+        db.session.commit()
+
+    shard.status = "completed"
+    _refresh_shard_counts(shard)
+    db.session.commit()
+
+    return {
+        "generated": shard.generated,
+        "skipped":   shard.skipped,
+        "failed":    shard.failed
+    }
+
+
+def _process_batch(run, shard, user_ids, notify):
+    user_rows, invoice_rows = price_invoices_bulk(
+        run.year, run.month_number, (user_ids[0], user_ids[-1] + 1)
+    )
+    users = {row.id: row for row in user_rows}
+
+    items = {
+        item.user_id: item for item in BillingRunItem.query.filter(
+            BillingRunItem.run_id == run.id,
+            BillingRunItem.user_id.in_(user_ids)
+        )
+    }
+
+    # 1. priced
+    for row in user_rows:
+        item = items.get(row.id)
+        if item is None:
+            items[row.id] = BillingRunItem(
+                run_id=run.id,
+                shard_id=shard.id,
+                user_id=row.id,
+                invoice_id=row.invoice_id,
+                status="skipped" if row.invoice_id is not None else "priced"
+            )
+            db.session.add(items[row.id])
+        elif item.status == "priced" and row.invoice_id is not None:
+            # Invoice was created outside this run (e.g. ad-hoc by an admin)
+            item.status     = "skipped"
+            item.invoice_id = row.invoice_id
+    db.session.commit()
+
+    # 2. persisted
+    to_insert = [r for r in invoice_rows if items[r["user_id"]].status == "priced"]
+    inserted  = insert_invoices_bulk(to_insert)
+    for invoice in inserted:
+        item = items[invoice.user_id]
+        item.status     = "persisted"
+        item.invoice_id = invoice.id
+    for r in to_insert:
+        if items[r["user_id"]].status == "priced":
+            items[r["user_id"]].status = "skipped"   # lost an insert race
+    db.session.commit()
+    record_invoices(inserted)
+
+    # 3. emailed
+    to_email = [item for item in items.values() if item.status == "persisted"]
+    _send_emails(to_email, users, notify)
+
+
+def _send_emails(to_email, users, notify):
+    invoices = {
+        inv.id: inv for inv in Invoice.query.filter(
+            Invoice.id.in_([item.invoice_id for item in to_email])
+        )
+    } if to_email else {}
+
+    for item in to_email:
+        if notify(users[item.user_id], invoices[item.invoice_id].to_dict()):
+            item.status = "emailed"
+            item.error  = None
+        else:
+            item.error  = "Email delivery failed"
+        db.session.commit()
+
+
+def _refresh_shard_counts(shard):
+    counts = dict(
+        db.session.query(BillingRunItem.status, func.count(BillingRunItem.id))
+                  .filter(BillingRunItem.shard_id == shard.id)
+                  .group_by(BillingRunItem.status)
+                  .all()
+    )
+    shard.generated = counts.get("persisted", 0) + counts.get("emailed", 0)
+    shard.skipped   = counts.get("skipped", 0)
+    shard.failed    = BillingRunItem.query.filter(
+        BillingRunItem.shard_id == shard.id,
+        BillingRunItem.error.isnot(None)
+    ).count()
+
+
+def mark_shard_failed(shard_id, error):
+    shard = db.session.get(BillingRunShard, shard_id)
+    if shard:
+        shard.status = "failed"
+        shard.error  = str(error)[:512]
+        db.session.commit()
+
+
+# Close the run once every shard has reported
+def finalize_run(run_id):
+    run = db.session.get(BillingRun, run_id)
+    run.status      = "completed" if all(
+        s.status == "completed" for s in run.shards
+    ) else "failed"
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+
+# Progress and throughput for the admin panel
+def get_run_progress(run):
+    """
+    Per-status user counts, shard cursors, percent done and throughput
+    (users finished per second since the run started).
+    """
+    by_status = dict(
+        db.session.query(BillingRunItem.status, func.count(BillingRunItem.id))
+                  .filter(BillingRunItem.run_id == run.id)
+                  .group_by(BillingRunItem.status)
+                  .all()
+    )
+    email_failures = BillingRunItem.query.filter(
+        BillingRunItem.run_id == run.id,
+        BillingRunItem.error.isnot(None)
+    ).count()
+
+    finished = by_status.get("emailed", 0) + by_status.get("skipped", 0)
+    elapsed  = ((run.finished_at or datetime.utcnow()) - run.started_at).total_seconds()
+
+    return {
+        **run.to_dict(),
+        "users": {
+            "priced":         by_status.get("priced", 0),
+            "persisted":      by_status.get("persisted", 0),
+            "emailed":        by_status.get("emailed", 0),
+            "skipped":        by_status.get("skipped", 0),
+            "email_failures": email_failures
+        },
+        "percent_done":     round(finished / run.total_users * 100, 1)
+                            if run.total_users else 100.0,
+        "elapsed_seconds":  round(elapsed, 1),
+        "users_per_second": round(finished / elapsed, 2) if elapsed > 0 else 0,
+        "shards":           [shard.to_dict() for shard in run.shards]
+    }
@@ -1,8 +1,48 @@
-from models import db, Invoice, User
-from services.usage_service import get_monthly_summary
+from models import db, Invoice, User, UsageLog, UsageMonthly
+from services.usage_service import get_monthly_summary, get_average_storage
+from services.metering_service import usage_meter
+from services.cache_service import response_cache, estimate_cache_key
+from services.leaderboard_service import record_invoices
+from utils.sql import dialect_insert
 from config import Config
-from datetime import date, datetime
+from flask import current_app
+from datetime import date, datetime, timedelta
 from calendar import monthrange
+from sqlalchemy import func, and_
+from sqlalchemy.exc import IntegrityError
+
+# Rows per INSERT statement in the bulk invoice run
+# (keeps SQLite under its bound-parameter limit)
+BULK_INSERT_CHUNK = 500
+
+
+# Apply free tier and rates to one month of usage
+def price_usage(avg_storage_bytes, total_api_calls, days_in_month):
+    """
+    Pure pricing step shared by calculate_bill() and the bulk
+    invoice run, so both produce exactly the same numbers.
+    Returns unrounded costs.
+    """
+    # Storage: subtract free 1 GB from average daily storage
+    billable_storage_bytes = max(0, avg_storage_bytes - Config.FREE_STORAGE_BYTES)
+
+    # API: subtract free 1000 calls
+    billable_api_calls = max(0, total_api_calls - Config.FREE_API_CALLS)
+
+    # Convert bytes → GB, multiply by days, multiply by rate
+    avg_storage_gb = billable_storage_bytes / (1024 ** 3)
+    storage_cost   = avg_storage_gb * days_in_month * Config.PRICE_STORAGE_PER_GB_DAY
+
+    api_cost = billable_api_calls * Config.PRICE_API_PER_CALL
+
+    return {
+        "billable_storage_bytes": billable_storage_bytes,
+        "billable_storage_gb":    avg_storage_gb,
+        "billable_api_calls":     billable_api_calls,
+        "storage_cost":           storage_cost,
+        "api_cost":               api_cost,
+        "total":                  storage_cost + api_cost
+    }
 
 
 # Calculate cost for a user (month)
@@ -26,23 +66,15 @@ def calculate_bill(user_id, year, month):
     days_in_month     = summary["days_in_month"]
     days_active       = summary["days_active"]
 
-    # Free Tier 
-    # Storage: subtract free 1 GB from average daily storage
-    billable_storage_bytes = max(0, avg_storage_bytes - Config.FREE_STORAGE_BYTES)
-
-    # API: subtract free 1000 calls
-    billable_api_calls = max(0, total_api_calls - Config.FREE_API_CALLS)
-
-    # Storage Cost 
-    # Convert bytes → GB, multiply by days, multiply by rate
-    avg_storage_gb  = billable_storage_bytes / (1024 ** 3)
-    storage_cost    = avg_storage_gb * days_in_month * Config.PRICE_STORAGE_PER_GB_DAY
-
-    # API Cost 
-    api_cost = billable_api_calls * Config.PRICE_API_PER_CALL
+    # Free tier, storage cost, API cost
+    priced = price_usage(avg_storage_bytes, total_api_calls, days_in_month)
 
-    # Total 
-    total = storage_cost + api_cost
+    billable_storage_bytes = priced["billable_storage_bytes"]
+    billable_api_calls     = priced["billable_api_calls"]
+    avg_storage_gb         = priced["billable_storage_gb"]
+    storage_cost           = priced["storage_cost"]
+    api_cost               = priced["api_cost"]
+    total                  = priced["total"]
 
     return {
         "year":   year,
@@ -94,6 +126,73 @@ def calculate_bill(user_id, year, month):
     }
 
 
+# Calculate cost for a user (any date range)
+def calculate_bill_for_period(user_id, start_date, end_date):
+    """
+    Prices any inclusive date range (a month, part of a month, a custom
+    range) from the storage ledger instead of the daily snapshots.
+
+    Storage is the time-weighted average over the range — two indexed
+    ledger lookups — and is capped at "now" for ranges that are still
+    running. API calls are one SUM over usage_logs plus buffered calls.
+    Does NOT save anything.
+    """
+    period_start = datetime.combine(start_date, datetime.min.time())
+    period_end   = min(
+        datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+        datetime.utcnow()
+    )
+    days_in_period = (end_date - start_date).days + 1
+
+    avg_storage_bytes = get_average_storage(user_id, period_start, period_end)
+
+    total_api_calls = int(
+        db.session.query(func.coalesce(func.sum(UsageLog.api_calls), 0))
+                  .filter(UsageLog.user_id == user_id,
+                          UsageLog.date.between(start_date, end_date))
+                  .scalar()
+    )
+    total_api_calls += sum(
+        calls for day, calls in usage_meter.pending_by_day(user_id).items()
+        if start_date <= day <= end_date
+    )
+
+    priced = price_usage(avg_storage_bytes, total_api_calls, days_in_period)
+
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date":   end_date.isoformat(),
+
+        "usage": {
+            "avg_storage_bytes":   avg_storage_bytes,
+            "avg_storage_mb":      round(avg_storage_bytes / (1024 * 1024), 4),
+            "avg_storage_gb":      round(avg_storage_bytes / (1024 ** 3), 6),
+            "total_api_calls":     total_api_calls,
+            "days_in_period":      days_in_period,
+            "storage_averaging":   "time_weighted"
+        },
+
+        "billable": {
+            "storage_bytes":  priced["billable_storage_bytes"],
+            "storage_gb":     round(priced["billable_storage_gb"], 6),
+            "api_calls":      priced["billable_api_calls"],
+        },
+
+        "rates": {
+            "storage_per_gb_day": Config.PRICE_STORAGE_PER_GB_DAY,
+            "api_per_call":       Config.PRICE_API_PER_CALL
+        },
+
+        "costs": {
+            "storage_cost":  round(priced["storage_cost"], 4),
+            "api_cost":      round(priced["api_cost"], 4),
+            "total_amount":  round(priced["total"], 4)
+        },
+
+        "note": "Free tier applied once to the whole period: 1 GB storage and 1000 API calls"
+    }
+
+
 # GENERATE: Save invoice to database
 def generate_invoice(user_id, year, month):
     """
@@ -133,7 +232,22 @@ def generate_invoice(user_id, year, month):
     )
 
     db.session.add(invoice)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request created it between our check and insert
+        db.session.rollback()
+        existing = Invoice.query.filter_by(
+            user_id=user_id,
+            month=month_label
+        ).first()
+        return {
+            "message":  "Invoice already exists for this month",
+            "invoice":  existing.to_dict(),
+            "already_existed": True
+        }
+
+    record_invoices([invoice])
 
     return {
         "message":        "Invoice generated successfully!",
@@ -143,6 +257,113 @@ def generate_invoice(user_id, year, month):
     }
 
 
+# BULK step 1+2: aggregate and price every user for a month
+def price_invoices_bulk(year, month, user_id_range=None):
+    """
+    1. One query: every user's usage_monthly row for the month,
+       plus whether they already have an invoice
+    2. Price every row with price_usage()
+
+    user_id_range: optional (lo, hi) — only users with lo <= id < hi,
+    either end may be None. Used by the sharded Celery run.
+
+    Returns (user_rows, invoice_rows):
+    - user_rows:    every matching user (id, username, email, invoice_id)
+    - invoice_rows: Invoice column dicts for users with no invoice yet
+    Numbers match calculate_bill() exactly.
+    """
+    month_label      = f"{year}-{str(month).zfill(2)}"
+    _, days_in_month = monthrange(year, month)
+
+    # Buffered API calls must be in usage_monthly before we read it
+    usage_meter.flush()
+
+    query = db.session.query(
+        User.id,
+        User.username,
+        User.email,
+        func.coalesce(UsageMonthly.total_storage,   0).label("total_storage"),
+        func.coalesce(UsageMonthly.peak_storage,    0).label("peak_storage"),
+        func.coalesce(UsageMonthly.total_api_calls, 0).label("total_api"),
+        func.coalesce(UsageMonthly.days_active,     0).label("days_active"),
+        Invoice.id.label("invoice_id")
+    ).outerjoin(UsageMonthly, and_(
+        UsageMonthly.user_id == User.id,
+        UsageMonthly.month   == month_label
+    )).outerjoin(Invoice, and_(
+        Invoice.user_id == User.id,
+        Invoice.month   == month_label
+    )).filter(User.role == "user")
+
+    if user_id_range:
+        lo, hi = user_id_range
+        if lo is not None:
+            query = query.filter(User.id >= lo)
+        if hi is not None:
+            query = query.filter(User.id < hi)
+
+    user_rows = query.all()
+
+    generated_at = datetime.utcnow()
+    invoice_rows = []
+
+    for row in user_rows:
+        if row.invoice_id is not None:
+            continue
+
+        days_active = int(row.days_active)
+        avg_storage = int(row.total_storage) // days_active if days_active > 0 else 0
+        total_api   = int(row.total_api)
+        priced      = price_usage(avg_storage, total_api, days_in_month)
+
+        invoice_rows.append({
+            "user_id":                 row.id,
+            "month":                   month_label,
+            "year":                    year,
+            "month_number":            month,
+            "avg_storage_bytes":       avg_storage,
+            "total_api_calls":         total_api,
+            "days_active":             days_active,
+            "storage_cost":            round(priced["storage_cost"], 4),
+            "api_cost":                round(priced["api_cost"], 4),
+            "total_amount":            round(priced["total"], 4),
+            "rate_storage_per_gb_day": Config.PRICE_STORAGE_PER_GB_DAY,
+            "rate_api_per_call":       Config.PRICE_API_PER_CALL,
+            "status":                  "generated",
+            "generated_at":            generated_at
+        })
+
+    return user_rows, invoice_rows
+
+
+# BULK step 3: insert priced invoices
+def insert_invoices_bulk(invoice_rows):
+    """
+    One INSERT ... ON CONFLICT DO NOTHING per chunk of invoice rows.
+    The unique (user_id, month) index skips anything inserted meanwhile.
+    Returns the Invoice objects that were actually inserted.
+    Does NOT commit.
+    """
+    invoices = []
+    for i in range(0, len(invoice_rows), BULK_INSERT_CHUNK):
+        chunk = invoice_rows[i:i + BULK_INSERT_CHUNK]
+        stmt  = dialect_insert(Invoice)
+
+        if stmt is None:
+            batch = [Invoice(**r) for r in chunk]
+            db.session.add_all(batch)
+            db.session.flush()
+            invoices.extend(batch)
+            continue
+
+        stmt = stmt.values(chunk).on_conflict_do_nothing(
+            index_elements=[Invoice.user_id, Invoice.month]
+        ).returning(Invoice)
+        invoices.extend(db.session.scalars(stmt).all())
+
+    return invoices
+
+
 # Current month live estimate
 def get_current_estimate(user_id):
     """
@@ -158,6 +379,7 @@ def get_current_estimate(user_id):
     _, days_in_month = monthrange(year, month)
 
     current_bill = calculate_bill(user_id, year, month)
+    month_to_date = calculate_bill_for_period(user_id, today.replace(day=1), today)
 
     days_elapsed = day_of_month
     days_left    = days_in_month - days_elapsed
@@ -187,6 +409,9 @@ def get_current_estimate(user_id):
 
         "current_bill": current_bill,
 
+        # Same month so far, with time-weighted storage from the ledger
+        "month_to_date": month_to_date,
+
         "forecast": {
             "storage_cost":  forecast_storage,
             "api_cost":      forecast_api,
@@ -196,6 +421,25 @@ def get_current_estimate(user_id):
     }
 
 
+def get_current_estimate_json(user_id, username):
+    """
+    The /api/billing/estimate response body, serialized once and cached
+    until the user's usage changes (see invalidate_estimate) or
+    ESTIMATE_CACHE_TTL expires. Returns (body, cache_hit).
+    """
+    key  = estimate_cache_key(user_id)
+    body = response_cache.get(key)
+    if body is not None:
+        return body, True
+
+    body = current_app.json.dumps({
+        "username": username,
+        "estimate": get_current_estimate(user_id)
+    })
+    response_cache.set(key, body, current_app.config["ESTIMATE_CACHE_TTL"])
+    return body, False
+
+
 # All invoices for a user
 def get_user_invoices(user_id):
     """
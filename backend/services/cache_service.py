@@ -0,0 +1,121 @@
+import threading
+import time
+
+
+# In-process cache
+class MemoryCache:
+    """
+    String values with a per-key expiry, guarded by a lock.
+    Only visible to the current process — use the Redis cache when
+    several workers must see the same entries and invalidations.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._entries = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+# Redis cache (shared by all workers)
+class RedisCache:
+    """
+    Same interface as MemoryCache, backed by Redis keys with EX expiry.
+    """
+
+    PREFIX = "cache:"
+
+    def __init__(self, redis_url):
+        import redis
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    def get(self, key):
+        return self._redis.get(self.PREFIX + key)
+
+    def set(self, key, value, ttl):
+        self._redis.set(self.PREFIX + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self._redis.delete(*(self.PREFIX + key for key in keys))
+
+
+# Response cache
+class ResponseCache:
+    """
+    Holds ready-to-send JSON bodies. A cache outage never fails a
+    request: errors are logged and treated as a miss.
+    """
+
+    def __init__(self):
+        self.app     = None
+        self.backend = None
+
+    def init_app(self, app):
+        if self.app is not None:
+            return
+
+        self.app = app
+        if app.config.get("CACHE_BACKEND") == "redis":
+            self.backend = RedisCache(app.config["REDIS_URL"])
+        else:
+            self.backend = MemoryCache()
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print(f"❌ Cache read failed: {e}")
+            return None
+
+    def set(self, key, value, ttl):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as e:
+            print(f"❌ Cache write failed: {e}")
+
+    def delete(self, *keys):
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete(*keys)
+        except Exception as e:
+            print(f"❌ Cache invalidation failed: {e}")
+
+
+response_cache = ResponseCache()
+
+
+# Live bill estimate
+def estimate_cache_key(user_id):
+    return f"estimate:{user_id}"
+
+
+def invalidate_estimate(*user_ids):
+    """
+    Drops cached estimates after a user's usage changed
+    (meter flush, upload, delete, storage reconciliation).
+    """
+    response_cache.delete(*(estimate_cache_key(uid) for uid in user_ids))
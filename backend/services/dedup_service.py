@@ -0,0 +1,307 @@
+import uuid
+import hashlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from models import db, Blob, StorageObject
+from services.storage_service import storage
+from utils.sql import dialect_insert
+from config import Config
+from sqlalchemy import update, delete, func, case
+
+
+# Blob-area objects younger than this may still be waiting for their row
+ORPHAN_BLOB_GRACE = timedelta(hours=1)
+
+
+def blob_key(sha256):
+    """
+    Where a blob lives in the blob area: <2 hex>/<sha256>-<token>.
+    The token gives a blob re-created after garbage collection a new
+    key, so a late GC delete of the old key can never hit it.
+    """
+    return f"{sha256[:2]}/{sha256}-{uuid.uuid4().hex[:12]}"
+
+
+def content_key(sha256, user_id):
+    """
+    What Blob.sha256 holds for an upload. Under the default "user" scope
+    the content hash is keyed by its owner, so an upload can only match
+    that user's own earlier uploads; "global" matches across users.
+    """
+    if Config.DEDUP_SCOPE == "global":
+        return sha256
+    return hashlib.sha256(f"{user_id}:{sha256}".encode()).hexdigest()
+
+
+def _add_reference(sha256):
+    """
+    One atomic UPDATE; returns the blob (id, size, content_encoding), or
+    None if no blob has this content. A blob GC has already deleted is
+    simply not found.
+    """
+    result = db.session.execute(
+        update(Blob)
+        .where(Blob.sha256 == sha256)
+        .values(ref_count=Blob.ref_count + 1)
+    )
+    if not result.rowcount:
+        return None
+    return db.session.query(Blob.id, Blob.size, Blob.content_encoding)\
+                     .filter(Blob.sha256 == sha256).one()
+
+
+# Upload side
+def store_blob(user, filename, size, sha256, content_encoding=None):
+    """
+    Called once an upload is in the user's bucket as `filename` and
+    before its StorageObject row is added:
+    - content already stored (by this user, unless DEDUP_SCOPE is
+      "global"): the blob gains a reference
+    - new content: the object is copied into the blob area (server-side
+      copy on MinIO, hard link on local disk) and a blob row is added
+    Either way the copy in the user's bucket stays until the caller has
+    committed and calls drop_bucket_copies(), so a failed commit loses
+    nothing; blob bytes it leaves without a row are removed by
+    collect_orphan_blobs().
+
+    size is the stored (physical) size, sha256 the hash of the logical
+    content. A reused blob may be stored with another encoding than this
+    copy was; the object takes the blob's.
+
+    Does NOT commit. Returns (blob, deduplicated); blob is a row with
+    id, size and content_encoding, or None when the object stays in the
+    user's bucket (dedup disabled, no checksum, or the move failed).
+    """
+    if not Config.DEDUP_ENABLED or not sha256:
+        return None, False
+    sha256 = content_key(sha256, user.id)
+
+    blob = _add_reference(sha256)
+    if blob:
+        return blob, True
+
+    key = blob_key(sha256)
+    if not storage.copy_to_blob(user.username, filename, key):
+        return None, False
+
+    values = {
+        "sha256":      sha256,
+        "size":        size,
+        "content_encoding": content_encoding,
+        "storage_key": key,
+        "ref_count":   1,
+        "created_at":  datetime.utcnow(),
+    }
+    stmt = dialect_insert(Blob)
+    if stmt is None:
+        blob = Blob.query.filter_by(sha256=sha256).first()
+        if blob is None:
+            db.session.add(Blob(**values))
+        else:
+            blob.ref_count += 1
+        db.session.flush()
+    else:
+        # A concurrent upload of the same content may have won the insert
+        db.session.execute(stmt.values(values).on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            set_={"ref_count": Blob.__table__.c.ref_count + 1}
+        ))
+
+    blob = db.session.query(Blob.id, Blob.size, Blob.content_encoding, Blob.storage_key)\
+                     .filter(Blob.sha256 == sha256).one()
+    if blob.storage_key != key:
+        # Ours lost: the bytes are already stored under the winner's key
+        storage.delete_blobs([key])
+        return blob, True
+    return blob, False
+
+
+def drop_bucket_copies(username, objects):
+    """
+    After the commit that recorded `objects`: deletes the user-bucket
+    copy of each one that is now served from a blob.
+    """
+    filenames = [obj.filename for obj in objects if obj.blob_id]
+    if not filenames:
+        return
+    errors = storage.delete_files(username, filenames)
+    for filename, error in errors.items():
+        print(f"❌ Could not delete {filename} after moving it to a blob: {error}")
+
+
+# Delete side
+def release_blobs(blob_ids):
+    """
+    Drops one reference per entry (ids may repeat, None is skipped).
+    Does NOT commit. Returns the distinct ids, for collect_garbage().
+    """
+    counts = Counter(blob_id for blob_id in blob_ids if blob_id)
+    for blob_id, n in counts.items():
+        db.session.execute(
+            update(Blob)
+            .where(Blob.id == blob_id)
+            .values(ref_count=Blob.ref_count - n)
+        )
+    return list(counts)
+
+
+def collect_garbage(blob_ids=None):
+    """
+    Deletes blobs nothing references any more (all of them, or only
+    blob_ids). Each row goes with a conditional DELETE (ref_count <= 0)
+    that is committed before its bytes are removed, so a blob an upload
+    re-referenced in the meantime is kept.
+    Returns (blobs deleted, bytes freed).
+    """
+    query = db.session.query(Blob.id, Blob.storage_key, Blob.size)\
+                      .filter(Blob.ref_count <= 0)
+    if blob_ids is not None:
+        if not blob_ids:
+            return 0, 0
+        query = query.filter(Blob.id.in_(blob_ids))
+
+    doomed = [
+        blob for blob in query.all()
+        if db.session.execute(
+            delete(Blob).where(Blob.id == blob.id, Blob.ref_count <= 0)
+        ).rowcount
+    ]
+    db.session.commit()
+
+    if doomed:
+        errors = storage.delete_blobs([blob.storage_key for blob in doomed])
+        for key, error in errors.items():
+            print(f"❌ Could not delete blob {key}: {error}")
+
+    return len(doomed), sum(blob.size for blob in doomed)
+
+
+def collect_orphan_blobs(grace=ORPHAN_BLOB_GRACE):
+    """
+    Deletes blob-area objects that no blob row points to, left behind
+    when the commit after store_blob() failed. Only objects older than
+    `grace` are touched, so an upload whose row is about to be
+    committed keeps its blob; rows are read after the listing for the
+    same reason. Returns the number of objects deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - grace
+    candidates = [key for key, modified in storage.list_blobs() if modified < cutoff]
+    if not candidates:
+        return 0
+
+    known = set()
+    for start in range(0, len(candidates), 500):
+        chunk = candidates[start:start + 500]
+        known.update(key for (key,) in db.session.query(Blob.storage_key)
+                                               .filter(Blob.storage_key.in_(chunk)))
+    db.session.commit()
+
+    orphans = [key for key in candidates if key not in known]
+    if orphans:
+        errors = storage.delete_blobs(orphans)
+        for key, error in errors.items():
+            print(f"❌ Could not delete orphaned blob {key}: {error}")
+    return len(orphans)
+
+
+# Reading an object wherever its bytes are
+def object_stat(username, obj):
+    if obj.blob_id:
+        return storage.stat_blob(obj.blob.storage_key)
+    return storage.stat_file(username, obj.filename)
+
+
+def object_stream(username, obj, offset=0, length=0):
+    if obj.blob_id:
+        return storage.stream_blob(obj.blob.storage_key, offset, length)
+    return storage.stream_file(username, obj.filename, offset, length)
+
+
+def object_local_path(username, obj):
+    if obj.blob_id:
+        return storage.blob_local_path(obj.blob.storage_key)
+    return storage.local_path(username, obj.filename)
+
+
+def object_download_url(username, obj):
+    # The signed URL makes MinIO send Content-Encoding, so browsers
+    # decode a compressed object themselves
+    if obj.blob_id:
+        return storage.presigned_blob_url(
+            obj.blob.storage_key, obj.filename, content_encoding=obj.content_encoding
+        )
+    return storage.presigned_download_url(
+        username, obj.filename, content_encoding=obj.content_encoding
+    )
+
+
+def unlisted_logical_bytes(user_id):
+    """
+    Logical bytes of the user's objects that a listing of the user's
+    bucket does not account for: objects living in the blob area, and
+    the bytes saved by compressing the ones that do not.
+    """
+    return db.session.query(func.coalesce(func.sum(case(
+        (StorageObject.blob_id.isnot(None), StorageObject.file_size),
+        else_=StorageObject.file_size - func.coalesce(StorageObject.stored_size,
+                                                      StorageObject.file_size)
+    )), 0)).filter(StorageObject.user_id == user_id).scalar()
+
+
+# Admin report
+def dedup_report(top=10):
+    """
+    Logical bytes (what users uploaded and are billed for) against
+    physical bytes (what is actually stored, after deduplication and
+    compression), plus the blobs that save the most (their sha256 is
+    keyed by owner unless DEDUP_SCOPE is "global").
+    """
+    objects = db.session.query(
+        func.count(StorageObject.id).label("files"),
+        func.coalesce(func.sum(StorageObject.file_size), 0).label("logical"),
+        func.count(StorageObject.blob_id).label("blob_files"),
+        func.coalesce(func.sum(
+            case((StorageObject.blob_id.is_(None),
+                  func.coalesce(StorageObject.stored_size, StorageObject.file_size)), else_=0)
+        ), 0).label("unshared")
+    ).one()
+
+    blobs = db.session.query(
+        func.count(case((Blob.ref_count > 0, 1))).label("live"),
+        func.coalesce(func.sum(case((Blob.ref_count > 0, Blob.size), else_=0)), 0).label("live_bytes"),
+        func.count(case((Blob.ref_count <= 0, 1))).label("garbage"),
+        func.coalesce(func.sum(case((Blob.ref_count <= 0, Blob.size), else_=0)), 0).label("garbage_bytes")
+    ).one()
+
+    logical  = int(objects.logical)
+    physical = int(blobs.live_bytes) + int(objects.unshared)
+    saved    = logical - physical
+
+    saving = ((Blob.ref_count - 1) * Blob.size).label("saved")
+    top_blobs = db.session.query(Blob.sha256, Blob.size, Blob.ref_count, saving)\
+                          .filter(Blob.ref_count > 1)\
+                          .order_by(saving.desc())\
+                          .limit(top).all()
+
+    return {
+        "total_files":       int(objects.files),
+        "deduplicated_files": int(objects.blob_files),
+        "logical_bytes":     logical,
+        "physical_bytes":    physical,
+        "saved_bytes":       saved,
+        "saved_percent":     round(saved / logical * 100, 2) if logical else 0.0,
+        "dedup_ratio":       round(logical / physical, 3) if physical else None,
+        "scope":             Config.DEDUP_SCOPE,
+        "blobs":             int(blobs.live),
+        "garbage_blobs":     int(blobs.garbage),
+        "garbage_bytes":     int(blobs.garbage_bytes),
+        "top_duplicates": [
+            {
+                "sha256":      blob.sha256,
+                "size_bytes":  int(blob.size),
+                "copies":      blob.ref_count,
+                "saved_bytes": int(blob.saved)
+            }
+            for blob in top_blobs
+        ]
+    }
@@ -0,0 +1,254 @@
+from datetime import date
+from collections import defaultdict
+import time
+
+# board name -> description; api_calls boards are kept per month
+BOARDS = {
+    "storage":   "Bytes stored right now",
+    "api_calls": "API calls in a month",
+    "billed":    "Total amount invoiced, all time",
+}
+
+# Monthly boards outlive their month by about a year
+MONTHLY_BOARD_TTL = 400 * 24 * 3600
+
+# After a Redis connection failure, leave Redis alone this long
+RETRY_AFTER = 30   # seconds
+
+
+def board_key(board, month=None):
+    if board == "api_calls":
+        return f"leaderboard:api_calls:{month or date.today().strftime('%Y-%m')}"
+    return f"leaderboard:{board}"
+
+
+# Redis sorted sets
+class Leaderboards:
+    """
+    One Redis sorted set per board, member = user id, score = value.
+    Writers update scores as usage changes; readers get top-K pages
+    with ZREVRANGE in O(log N + K).
+
+    Redis errors are logged and never fail the request that caused the
+    update; the daily rebuild_leaderboards task repairs any drift.
+
+    Only used with CACHE_BACKEND=redis — otherwise the boards are read
+    from the database. A connection failure pauses Redis calls for
+    RETRY_AFTER seconds so requests do not each wait out the timeout.
+    """
+
+    def __init__(self):
+        self.app         = None
+        self.enabled     = False
+        self._redis      = None
+        self._down_until = 0.0
+
+    def init_app(self, app):
+        if self.app is not None:
+            return
+        self.app     = app
+        self.enabled = app.config.get("CACHE_BACKEND") == "redis"
+
+    @property
+    def available(self):
+        return self.enabled and time.monotonic() >= self._down_until
+
+    def backoff(self, error):
+        """
+        Called with any Redis error; connection problems pause Redis use.
+        """
+        import redis
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            self._down_until = time.monotonic() + RETRY_AFTER
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis
+            # Short timeouts: a slow Redis must not stall uploads
+            self._redis = redis.Redis.from_url(
+                self.app.config["REDIS_URL"], decode_responses=True,
+                socket_connect_timeout=1, socket_timeout=1
+            )
+        return self._redis
+
+    def _run(self, action):
+        if not self.available:
+            return None
+        try:
+            return action()
+        except Exception as e:
+            self.backoff(e)
+            print(f"❌ Leaderboard update failed: {e}")
+            return None
+
+    # Writers
+    # A board that does not exist yet is left alone: writing one member
+    # would create a partial board. It is built whole on its first read.
+    def set_score(self, board, user_id, score, month=None):
+        def action():
+            key = board_key(board, month)
+            if self.redis.exists(key):
+                self.redis.zadd(key, {str(user_id): score})
+        self._run(action)
+
+    def incr_scores(self, board, amounts, month=None):
+        """
+        amounts: {user_id: delta}. One pipeline round trip.
+        """
+        if not amounts:
+            return
+
+        def action():
+            key  = board_key(board, month)
+            if not self.redis.exists(key):
+                return
+            pipe = self.redis.pipeline()
+            for user_id, delta in amounts.items():
+                pipe.zincrby(key, delta, str(user_id))
+            if board == "api_calls":
+                pipe.expire(key, MONTHLY_BOARD_TTL)
+            pipe.execute()
+        self._run(action)
+
+    def replace_board(self, board, scores, month=None):
+        """
+        Swaps in a full board ({user_id: score}) atomically via RENAME.
+        """
+        def action():
+            key  = board_key(board, month)
+            tmp  = f"{key}:rebuild"
+            pipe = self.redis.pipeline()
+            pipe.delete(tmp)
+            if scores:
+                pipe.zadd(tmp, {str(uid): score for uid, score in scores.items()})
+                pipe.rename(tmp, key)
+                if board == "api_calls":
+                    pipe.expire(key, MONTHLY_BOARD_TTL)
+            else:
+                pipe.delete(key)
+            pipe.execute()
+            return len(scores)
+        return self._run(action)
+
+    # Readers (exceptions propagate so callers can fall back to SQL)
+    def exists(self, board, month=None):
+        return bool(self.redis.exists(board_key(board, month)))
+
+    def top(self, board, limit, offset=0, month=None):
+        """
+        Returns (total_members, [(user_id, score), ...]) highest first.
+        """
+        key  = board_key(board, month)
+        pipe = self.redis.pipeline()
+        pipe.zcard(key)
+        pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        total, entries = pipe.execute()
+        return total, [(int(uid), score) for uid, score in entries]
+
+
+leaderboards = Leaderboards()
+
+
+# Hooks called where usage changes
+def record_storage(user_id, total_bytes):
+    leaderboards.set_score("storage", user_id, total_bytes)
+
+
+def record_api_calls(counts):
+    """
+    counts: {(user_id, day): calls} as flushed by the usage meter.
+    """
+    by_month = defaultdict(lambda: defaultdict(int))
+    for (user_id, day), calls in counts.items():
+        by_month[day.strftime("%Y-%m")][user_id] += calls
+    for month, amounts in by_month.items():
+        leaderboards.incr_scores("api_calls", amounts, month=month)
+
+
+def record_invoices(invoices):
+    """
+    invoices: newly committed Invoice objects.
+    """
+    amounts = defaultdict(float)
+    for invoice in invoices:
+        amounts[invoice.user_id] += invoice.total_amount or 0
+    leaderboards.incr_scores("billed", amounts)
+
+
+# Full rebuild from the database
+def _board_rows(board, month=None):
+    """
+    Query of (user_id, score) rows for a board; the source of truth the
+    Redis boards are repaired from.
+    """
+    from models import db, User, UsageMonthly, Invoice
+    from sqlalchemy import func
+
+    if board == "storage":
+        return db.session.query(User.id.label("user_id"), User.storage_bytes.label("score"))\
+                         .filter(User.storage_bytes > 0)
+    if board == "api_calls":
+        return db.session.query(UsageMonthly.user_id.label("user_id"),
+                                UsageMonthly.total_api_calls.label("score"))\
+                         .filter(UsageMonthly.month == (month or date.today().strftime("%Y-%m")),
+                                 UsageMonthly.total_api_calls > 0)
+    return db.session.query(Invoice.user_id.label("user_id"),
+                            func.sum(Invoice.total_amount).label("score"))\
+                     .group_by(Invoice.user_id)
+
+
+def compute_board(board, month=None):
+    """
+    {user_id: score} straight from the database.
+    """
+    return {int(uid): float(score) for uid, score in _board_rows(board, month)}
+
+
+def _top_from_db(board, limit, offset=0, month=None):
+    """
+    One page of a board in SQL (ORDER BY score DESC, user_id with
+    LIMIT/OFFSET) plus a COUNT, instead of loading the whole board.
+    """
+    from models import db
+    from sqlalchemy import func
+
+    rows  = _board_rows(board, month).subquery()
+    total = db.session.query(func.count()).select_from(rows).scalar()
+    page  = db.session.query(rows.c.user_id, rows.c.score)\
+                      .order_by(rows.c.score.desc(), rows.c.user_id)\
+                      .limit(limit).offset(offset).all()
+    return total, [(int(uid), float(score)) for uid, score in page]
+
+
+def rebuild_leaderboards(month=None):
+    """
+    Recomputes every board from the database and swaps it in.
+    Returns {board: members}.
+    """
+    return {
+        board: leaderboards.replace_board(board, compute_board(board, month), month)
+        for board in BOARDS
+    }
+
+
+# Top-K page with a database fallback
+def top_users(board, limit, offset=0, month=None):
+    """
+    Returns (total_members, [(user_id, score), ...], source).
+    A missing board (e.g. Redis was flushed) is rebuilt first. Without
+    Redis, or if it is unreachable, the page is computed from the
+    database instead.
+    """
+    if leaderboards.available:
+        try:
+            if not leaderboards.exists(board, month):
+                leaderboards.replace_board(board, compute_board(board, month), month)
+            total, entries = leaderboards.top(board, limit, offset, month)
+            return total, entries, "redis"
+        except Exception as e:
+            leaderboards.backoff(e)
+            print(f"❌ Leaderboard read failed, using the database: {e}")
+
+    total, entries = _top_from_db(board, limit, offset, month)
+    return total, entries, "database"
@@ -0,0 +1,276 @@
+from datetime import date
+from collections import defaultdict
+import atexit
+import threading
+import time
+import uuid
+
+
+# In-process counter store
+class MemoryMeterStore:
+    """
+    Keeps pending API-call counters in a dict guarded by a lock.
+    Good for a single worker process.
+
+    drain() moves the pending counters aside ("in flight") under a new
+    token while they are written to the database, so reads still see
+    them until commit(token).
+    """
+
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self._pending  = defaultdict(int)
+        self._inflight = {}    # token -> {(user_id, day): calls}
+
+    def incr(self, user_id, day, amount=1):
+        with self._lock:
+            self._pending[(user_id, day)] += amount
+            return len(self._pending)
+
+    def pending_by_day(self, user_id):
+        with self._lock:
+            counts = defaultdict(int)
+            for source in (self._pending, *self._inflight.values()):
+                for (uid, day), calls in source.items():
+                    if uid == user_id:
+                        counts[day] += calls
+            return dict(counts)
+
+    def drain(self):
+        with self._lock:
+            if not self._pending:
+                return []
+            token = uuid.uuid4().hex
+            self._inflight[token] = dict(self._pending)
+            self._pending.clear()
+            return [(token, dict(self._inflight[token]))]
+
+    def commit(self, token):
+        with self._lock:
+            self._inflight.pop(token, None)
+
+    def restore(self, token):
+        with self._lock:
+            for key, calls in self._inflight.pop(token, {}).items():
+                self._pending[key] += calls
+
+
+# Redis counter store (shared by all workers)
+class RedisMeterStore:
+    """
+    Keeps pending counters in one Redis hash so every worker process
+    increments the same numbers. Field format: "<user_id>:<YYYY-MM-DD>".
+
+    drain() renames the hash to a private key (its token), so increments
+    that arrive during a flush land in a fresh hash and are never lost.
+    The tokens of flushes in progress sit in a sorted set scored by
+    start time. One older than stale_after seconds belongs to a worker
+    that died or stalled mid-flush; the next drain hands it out again
+    under the same token, and the database skips tokens it has already
+    applied, so a flush is never counted twice.
+    """
+
+    PENDING_KEY  = "meter:pending"
+    FLUSHING_SET = "meter:flushing_since"
+
+    def __init__(self, redis_url, stale_after=300):
+        import redis
+        self._redis      = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.stale_after = stale_after
+
+    @staticmethod
+    def _field(user_id, day):
+        return f"{user_id}:{day.isoformat()}"
+
+    @staticmethod
+    def _parse(field):
+        user_id, day = field.split(":", 1)
+        return int(user_id), date.fromisoformat(day)
+
+    def incr(self, user_id, day, amount=1):
+        pipe = self._redis.pipeline()
+        pipe.hincrby(self.PENDING_KEY, self._field(user_id, day), amount)
+        pipe.hlen(self.PENDING_KEY)
+        _, size = pipe.execute()
+        return size
+
+    def pending_by_day(self, user_id):
+        prefix = f"{user_id}:"
+        keys   = [self.PENDING_KEY, *self._redis.zrange(self.FLUSHING_SET, 0, -1)]
+        counts = defaultdict(int)
+        for key in keys:
+            for field, calls in self._redis.hgetall(key).items():
+                if field.startswith(prefix):
+                    counts[self._parse(field)[1]] += int(calls)
+        return dict(counts)
+
+    def _counts(self, token):
+        return {
+            self._parse(field): int(calls)
+            for field, calls in self._redis.hgetall(token).items()
+        }
+
+    def _claim_stale(self):
+        """
+        Takes over abandoned flushes by moving their start time to now.
+        WATCH makes the check and the move atomic, so one worker claims
+        each token; a lost race just leaves it for the next drain.
+        """
+        import redis
+
+        claimed = []
+        cutoff  = time.time() - self.stale_after
+        for token in self._redis.zrangebyscore(self.FLUSHING_SET, "-inf", cutoff):
+            with self._redis.pipeline() as pipe:
+                try:
+                    pipe.watch(self.FLUSHING_SET)
+                    score = pipe.zscore(self.FLUSHING_SET, token)
+                    if score is None or score > cutoff:
+                        continue
+                    pipe.multi()
+                    pipe.zadd(self.FLUSHING_SET, {token: time.time()})
+                    pipe.execute()
+                except redis.WatchError:
+                    continue
+            claimed.append(token)
+            print(f"⚠️ Retrying usage counters of an abandoned flush ({token})")
+        return claimed
+
+    def drain(self):
+        batches = [(token, self._counts(token)) for token in self._claim_stale()]
+
+        token = f"meter:flushing:{uuid.uuid4().hex}"
+        pipe  = self._redis.pipeline()
+        pipe.zadd(self.FLUSHING_SET, {token: time.time()})
+        pipe.rename(self.PENDING_KEY, token)
+        try:
+            pipe.execute()
+        except Exception:
+            # Nothing pending — RENAME fails when the source key is missing
+            self._redis.zrem(self.FLUSHING_SET, token)
+        else:
+            batches.append((token, self._counts(token)))
+
+        return batches
+
+    def commit(self, token):
+        pipe = self._redis.pipeline()
+        pipe.delete(token)
+        pipe.zrem(self.FLUSHING_SET, token)
+        pipe.execute()
+
+    def restore(self, token):
+        # Due for a retry at the next drain, still under its own token:
+        # a commit that went through despite the error must be detectable
+        self._redis.zadd(self.FLUSHING_SET, {token: 0}, xx=True)
+
+
+# Metering buffer
+class UsageMeter:
+    """
+    Buffers API-call counts per (user, day) and writes them to usage_logs
+    in bulk, instead of one SELECT + UPDATE + COMMIT per request.
+
+    Flushes happen:
+    - every METER_FLUSH_INTERVAL seconds (background thread)
+    - as soon as METER_FLUSH_THRESHOLD distinct (user, day) counters pile up
+    - when the process exits
+    """
+
+    def __init__(self):
+        self.app         = None
+        self.store       = None
+        self._flush_lock = threading.Lock()
+        self._wake       = threading.Event()
+        self._thread     = None
+
+    def init_app(self, app):
+        """
+        Wires the meter to a Flask app. Only the first app is kept, so
+        calling create_app() again (e.g. inside Celery tasks) is harmless.
+        """
+        if self.app is not None:
+            return
+
+        self.app = app
+        if app.config.get("METER_BACKEND") == "redis":
+            self.store = RedisMeterStore(
+                app.config["REDIS_URL"], app.config["METER_FLUSH_STALE_AFTER"]
+            )
+        else:
+            self.store = MemoryMeterStore()
+
+        self._thread = threading.Thread(
+            target=self._run, name="usage-meter-flush", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def record(self, user_id, day=None, calls=1):
+        """
+        Adds API calls to the buffer. Never touches the database.
+        """
+        size = self.store.incr(user_id, day or date.today(), calls)
+        if size >= self.app.config["METER_FLUSH_THRESHOLD"]:
+            self._wake.set()
+
+    def pending_by_day(self, user_id):
+        """
+        Returns {date: api_calls} that are counted but not yet flushed.
+        """
+        if self.store is None:
+            return {}
+        return self.store.pending_by_day(user_id)
+
+    def pending_calls(self, user_id, day=None):
+        return self.pending_by_day(user_id).get(day or date.today(), 0)
+
+    def flush(self):
+        """
+        Writes all buffered counters to usage_logs, one transaction per
+        drain token. The token is recorded in the same transaction, and a
+        token already recorded is dropped instead of counted again.
+        On failure the counters stay buffered for the next try.
+        Returns the number of (user, day) rows written.
+        """
+        if self.store is None:
+            return 0
+
+        from models import db
+        from services.usage_service import add_api_calls_bulk, claim_meter_flush
+        from services.cache_service import invalidate_estimate
+        from services.leaderboard_service import record_api_calls
+
+        written = 0
+        with self._flush_lock, self.app.app_context():
+            for token, counts in self.store.drain():
+                try:
+                    applied = claim_meter_flush(token)
+                    if applied and counts:
+                        add_api_calls_bulk(counts)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self.store.restore(token)
+                    print(f"❌ Usage meter flush failed: {e}")
+                    continue
+
+                self.store.commit(token)
+                if not applied:
+                    print(f"⚠️ Usage counters of flush {token} were already written, dropped")
+                    continue
+
+                invalidate_estimate(*{user_id for user_id, _ in counts})
+                record_api_calls(counts)
+                written += len(counts)
+        return written
+
+    def _run(self):
+        interval = self.app.config["METER_FLUSH_INTERVAL"]
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.flush()
+
+
+usage_meter = UsageMeter()
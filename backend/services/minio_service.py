@@ -1,8 +1,13 @@
 from minio import Minio
 from minio.error import S3Error
+from minio.deleteobjects import DeleteObject
+from minio.commonconfig import CopySource, Filter, ENABLED
+from minio.datatypes import PostPolicy
+from minio.lifecycleconfig import LifecycleConfig, Rule, Expiration
 from config import Config
+from services.cache_service import response_cache
+from datetime import datetime, timedelta, timezone
 import io
-from utils.validators import format_bytes
 
 
 minio_client = Minio(
@@ -12,6 +17,16 @@ minio_client = Minio(
     secure=Config.MINIO_SECURE
 )
 
+# Signs URLs for the public host. Presigning is local (no request is
+# made) as long as the region is given.
+presign_client = Minio(
+    Config.MINIO_PUBLIC_ENDPOINT,
+    access_key=Config.MINIO_ACCESS_KEY,
+    secret_key=Config.MINIO_SECRET_KEY,
+    secure=Config.MINIO_PUBLIC_SECURE,
+    region=Config.MINIO_REGION
+)
+
 
 def get_bucket_name(username):
     """
@@ -23,18 +38,66 @@ def get_bucket_name(username):
     return f"user-{clean}"
 
 
+# Bucket-existence cache
+# Buckets are practically never deleted, so once a bucket is known to
+# exist that is remembered: in a per-process set (no network at all)
+# and in the shared response cache (Redis when CACHE_BACKEND=redis), so
+# a bucket one worker has seen is known to all of them. Entries are only
+# dropped when MinIO answers NoSuchBucket.
+_known_buckets = set()
+
+
+def _bucket_cache_key(bucket_name):
+    return f"bucket:{bucket_name}"
+
+
+def bucket_known(bucket_name):
+    if bucket_name in _known_buckets:
+        return True
+    if response_cache.get(_bucket_cache_key(bucket_name)):
+        _known_buckets.add(bucket_name)
+        return True
+    return False
+
+
+def remember_bucket(bucket_name):
+    _known_buckets.add(bucket_name)
+    response_cache.set(_bucket_cache_key(bucket_name), "1", Config.BUCKET_CACHE_TTL)
+
+
+def forget_bucket(bucket_name):
+    _known_buckets.discard(bucket_name)
+    response_cache.delete(_bucket_cache_key(bucket_name))
+
+
+def _forget_if_missing(bucket_name, error):
+    """
+    Called from every S3Error handler: a NoSuchBucket answer means the
+    cache was wrong, so the next ensure_bucket_exists() asks MinIO again.
+    """
+    if getattr(error, "code", None) == "NoSuchBucket":
+        forget_bucket(bucket_name)
+        print(f"⚠️  Bucket {bucket_name} is missing — dropped from the bucket cache")
+
+
 def ensure_bucket_exists(username):
     """
     Creates the user's bucket if it doesn't exist yet.
     Safe to call multiple times — does nothing if bucket already exists.
     Call this before any read operation so accounts created outside
     the normal register flow (e.g. via create_admin.py) never crash.
+
+    Buckets already seen are answered from the bucket cache, so MinIO is
+    only asked once per bucket rather than on every request.
     """
     bucket_name = get_bucket_name(username)
+    if bucket_known(bucket_name):
+        return
     try:
         if not minio_client.bucket_exists(bucket_name):
             minio_client.make_bucket(bucket_name)
             print(f"✅ Auto-created missing bucket: {bucket_name}")
+        remember_bucket(bucket_name)
     except S3Error as e:
         print(f"⚠️  Could not ensure bucket for {username}: {e}")
 
@@ -51,6 +114,7 @@ def create_user_bucket(username):
             print(f"✅ Bucket created: {bucket_name}")
         else:
             print(f"ℹ️  Bucket already exists: {bucket_name}")
+        remember_bucket(bucket_name)
         return True
     except S3Error as e:
         print(f"❌ Error creating bucket: {e}")
@@ -67,18 +131,37 @@ def upload_file(username, file_data, filename, content_type, file_size):
     content_type - e.g. "image/png", "application/pdf"
     file_size    - size in bytes
     """
+    return upload_stream(
+        username, io.BytesIO(file_data), filename, content_type, file_size
+    )
+
+
+def upload_stream(username, stream, filename, content_type, length=-1):
+    """
+    Pipes a file-like object into the user's bucket without loading it.
+
+    length - size in bytes, or -1 when unknown (e.g. a chunked request
+             body); MinIO then receives a multipart upload in
+             UPLOAD_PART_SIZE parts and only one part is held in memory.
+
+    Exceptions raised by stream.read() (e.g. an upload limit) propagate
+    after any multipart upload has been aborted.
+    """
+    ensure_bucket_exists(username)
     bucket_name = get_bucket_name(username)
     try:
         minio_client.put_object(
             bucket_name,
             filename,
-            io.BytesIO(file_data),
-            length=file_size,
+            stream,
+            length=length,
+            part_size=Config.UPLOAD_PART_SIZE if length < 0 else 0,
             content_type=content_type
         )
         print(f"✅ File uploaded: {filename} to bucket {bucket_name}")
         return True
     except S3Error as e:
+        _forget_if_missing(bucket_name, e)
         print(f"❌ Upload error: {e}")
         return False
 
@@ -96,9 +179,80 @@ def download_file(username, filename):
         response.release_conn()
         return file_data
     except S3Error as e:
+        _forget_if_missing(bucket_name, e)
+        print(f"❌ Download error: {e}")
+        return None
+
+
+def stat_file(username, filename):
+    """
+    Object metadata (size, etag, last_modified, content_type) without
+    reading the body. Returns None if not found.
+    """
+    return _stat_object(get_bucket_name(username), filename)
+
+
+def _stat_object(bucket_name, object_name):
+    try:
+        return minio_client.stat_object(bucket_name, object_name)
+    except S3Error as e:
+        _forget_if_missing(bucket_name, e)
+        print(f"❌ Stat error: {e}")
+        return None
+
+
+def stream_file(username, filename, offset=0, length=0):
+    """
+    Opens the object (or the byte range offset..offset+length, length=0
+    meaning "to the end") and returns a generator of DOWNLOAD_CHUNK_SIZE
+    chunks, or None if not found. Only one chunk is in memory at a time;
+    the MinIO connection is released when the generator finishes or is
+    closed by the server.
+    """
+    return _stream_object(get_bucket_name(username), filename, offset, length)
+
+
+def _stream_object(bucket_name, object_name, offset=0, length=0):
+    try:
+        response = minio_client.get_object(
+            bucket_name, object_name, offset=offset, length=length
+        )
+    except S3Error as e:
+        _forget_if_missing(bucket_name, e)
         print(f"❌ Download error: {e}")
         return None
 
+    def chunks():
+        try:
+            yield from response.stream(Config.DOWNLOAD_CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
+    return chunks()
+
+
+def presigned_download_url(username, filename, expires=None, content_encoding=None):
+    """
+    URL the client can GET the file from directly, served as an attachment.
+    """
+    return _presigned_get(get_bucket_name(username), filename, filename, expires,
+                          content_encoding)
+
+
+def _presigned_get(bucket_name, object_name, download_name, expires=None,
+                   content_encoding=None):
+    response_headers = {
+        "response-content-disposition": f'attachment; filename="{download_name}"'
+    }
+    if content_encoding:
+        response_headers["response-content-encoding"] = content_encoding
+    return presign_client.presigned_get_object(
+        bucket_name, object_name,
+        expires=timedelta(seconds=expires or Config.PRESIGNED_URL_EXPIRY),
+        response_headers=response_headers
+    )
+
 
 def delete_file(username, filename):
     """
@@ -110,10 +264,173 @@ def delete_file(username, filename):
         print(f"✅ File deleted: {filename} from {bucket_name}")
         return True
     except S3Error as e:
+        _forget_if_missing(bucket_name, e)
         print(f"❌ Delete error: {e}")
         return False
 
 
+def delete_files(username, filenames):
+    """
+    Deletes many objects with MinIO's multi-object delete (up to 1000
+    keys per request). Returns {filename: error message} for the ones
+    that failed; an empty dict means everything was deleted.
+    """
+    return _remove_objects(get_bucket_name(username), filenames)
+
+
+def _remove_objects(bucket_name, object_names):
+    object_names = list(object_names)
+    try:
+        # remove_objects is lazy: the requests go out while iterating
+        errors = {
+            err.name: f"{err.code}: {err.message}"
+            for err in minio_client.remove_objects(
+                bucket_name, (DeleteObject(name) for name in object_names)
+            )
+        }
+    except S3Error as e:
+        _forget_if_missing(bucket_name, e)
+        print(f"❌ Batch delete error: {e}")
+        return {name: str(e) for name in object_names}
+
+    print(f"✅ {len(object_names) - len(errors)} object(s) deleted from {bucket_name}")
+    return errors
+
+
+# Presigned uploads
+# Clients POST straight into UPLOAD_BUCKET under a one-off key; the
+# completion step copies the object into the user's bucket, so objects
+# in user buckets are only ever written by this server.
+def ensure_upload_bucket():
+    if bucket_known(Config.UPLOAD_BUCKET):
+        return
+    try:
+        if not minio_client.bucket_exists(Config.UPLOAD_BUCKET):
+            minio_client.make_bucket(Config.UPLOAD_BUCKET)
+            # Leftovers (abandoned or re-sent uploads) go after a day
+            minio_client.set_bucket_lifecycle(Config.UPLOAD_BUCKET, LifecycleConfig([
+                Rule(ENABLED, rule_filter=Filter(prefix=""),
+                     rule_id="expire-pending-uploads", expiration=Expiration(days=1))
+            ]))
+            print(f"✅ Upload bucket created: {Config.UPLOAD_BUCKET}")
+        remember_bucket(Config.UPLOAD_BUCKET)
+    except S3Error as e:
+        print(f"⚠️  Could not ensure upload bucket: {e}")
+
+
+def presigned_upload_post(upload_key, max_bytes, expires=None):
+    """
+    (url, form fields) for a POST upload of exactly upload_key, between
+    1 and max_bytes long. MinIO enforces both, however often the form
+    is re-sent before it expires.
+    """
+    ensure_upload_bucket()
+    policy = PostPolicy(
+        Config.UPLOAD_BUCKET,
+        datetime.now(timezone.utc) + timedelta(seconds=expires or Config.PRESIGNED_URL_EXPIRY)
+    )
+    policy.add_equals_condition("key", upload_key)
+    policy.add_content_length_range_condition(1, max_bytes)
+
+    fields = presign_client.presigned_post_policy(policy)
+    fields["key"] = upload_key
+    scheme = "https" if Config.MINIO_PUBLIC_SECURE else "http"
+    return f"{scheme}://{Config.MINIO_PUBLIC_ENDPOINT}/{Config.UPLOAD_BUCKET}", fields
+
+
+def stat_upload(upload_key):
+    return _stat_object(Config.UPLOAD_BUCKET, upload_key)
+
+
+def claim_upload(upload_key, etag, username, filename):
+    """
+    Server-side copy of a presigned upload into the user's bucket, only
+    if it is still the object that was checked (etag); then removes the
+    upload. Returns True on success.
+    """
+    ensure_bucket_exists(username)
+    bucket_name = get_bucket_name(username)
+    try:
+        minio_client.copy_object(
+            bucket_name, filename,
+            CopySource(Config.UPLOAD_BUCKET, upload_key, match_etag=etag)
+        )
+    except S3Error as e:
+        _forget_if_missing(bucket_name, e)
+        print(f"❌ Upload copy error: {e}")
+        return False
+    delete_uploads([upload_key])
+    return True
+
+
+def delete_uploads(upload_keys):
+    return _remove_objects(Config.UPLOAD_BUCKET, upload_keys)
+
+
+# Shared content-addressed blob area
+# One bucket (BLOB_BUCKET) holds every deduplicated blob; keys are
+# chosen by services.dedup_service.
+def ensure_blob_bucket():
+    if bucket_known(Config.BLOB_BUCKET):
+        return
+    try:
+        if not minio_client.bucket_exists(Config.BLOB_BUCKET):
+            minio_client.make_bucket(Config.BLOB_BUCKET)
+            print(f"✅ Blob bucket created: {Config.BLOB_BUCKET}")
+        remember_bucket(Config.BLOB_BUCKET)
+    except S3Error as e:
+        print(f"⚠️  Could not ensure blob bucket: {e}")
+
+
+def copy_to_blob(username, filename, blob_key):
+    """
+    Copies a freshly uploaded object from the user's bucket into the
+    blob area (server-side, no bytes pass through here). The original
+    stays until the upload's row is committed. Returns True on success.
+    """
+    ensure_blob_bucket()
+    bucket_name = get_bucket_name(username)
+    try:
+        minio_client.copy_object(
+            Config.BLOB_BUCKET, blob_key, CopySource(bucket_name, filename)
+        )
+    except S3Error as e:
+        _forget_if_missing(bucket_name, e)
+        print(f"❌ Blob copy error: {e}")
+        return False
+    return True
+
+
+def list_blobs():
+    """
+    Yields (blob_key, last_modified) for every object in the blob area.
+    Raises S3Error if the bucket cannot be listed.
+    """
+    ensure_blob_bucket()
+    for obj in minio_client.list_objects(Config.BLOB_BUCKET, recursive=True):
+        yield obj.object_name, obj.last_modified
+
+
+def stat_blob(blob_key):
+    return _stat_object(Config.BLOB_BUCKET, blob_key)
+
+
+def stream_blob(blob_key, offset=0, length=0):
+    return _stream_object(Config.BLOB_BUCKET, blob_key, offset, length)
+
+
+def presigned_blob_url(blob_key, download_name, expires=None, content_encoding=None):
+    return _presigned_get(Config.BLOB_BUCKET, blob_key, download_name, expires,
+                          content_encoding)
+
+
+def delete_blobs(blob_keys):
+    """
+    {blob_key: error message} for the blobs that could not be deleted.
+    """
+    return _remove_objects(Config.BLOB_BUCKET, blob_keys)
+
+
 def list_files(username):
     """
     Lists all files in the user's bucket.
@@ -133,6 +450,7 @@ def list_files(username):
             })
         return files
     except S3Error as e:
+        _forget_if_missing(bucket_name, e)
         print(f"❌ List error: {e}")
         return []
 
@@ -145,40 +463,21 @@ def get_file_size(username, filename):
     try:
         stat = minio_client.stat_object(bucket_name, filename)
         return stat.size
-    except S3Error:
+    except S3Error as e:
+        _forget_if_missing(bucket_name, e)
         return 0
 
 
 def get_total_storage_used(username):
     """
-    Calculates total storage used by a user across all their files.
-    Returns size in bytes.
-    NOTE: list_files already calls ensure_bucket_exists so no
-    duplicate call needed here.
-    """
-    files = list_files(username)            # ensure_bucket_exists runs inside here
-    return sum(f["size_bytes"] for f in files)
+    Calculates total storage used by a user by listing every object
+    in their bucket. Returns size in bytes.
 
-
-def get_storage_summary(username):
-    """
-    Returns a full storage summary for a user.
+    This walks the whole bucket — request paths read the running
+    total (User.storage_bytes) instead. Only used for reconciliation.
+    Unlike list_files, a failed listing raises (S3Error) instead of
+    looking like an empty bucket.
     """
-    ensure_bucket_exists(username)          # ← guard added
-
-    total_used = get_total_storage_used(username)
-    quota      = Config.STORAGE_QUOTA_BYTES
-    remaining  = max(0, quota - total_used)
-    percent    = round((total_used / quota) * 100, 1) if quota > 0 else 0
-
-    return {
-        "used_bytes":        total_used,
-        "used_readable":     format_bytes(total_used),
-        "quota_bytes":       quota,
-        "quota_readable":    format_bytes(quota),
-        "remaining_bytes":   remaining,
-        "remaining_readable": format_bytes(remaining),
-        "percent_used":      percent,
-        "is_near_limit":     percent >= 80,
-        "is_full":           percent >= 100
-    }
\ No newline at end of file
+    ensure_bucket_exists(username)
+    bucket_name = get_bucket_name(username)
+    return sum(obj.size for obj in minio_client.list_objects(bucket_name))
@@ -0,0 +1,268 @@
+from models import db, User, StorageObject, UsageLog, Invoice, PlatformSnapshot
+from utils.sql import dialect_insert
+from config import Config
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, case, true
+
+# Columns every snapshot carries (besides resolution / bucket_start)
+SNAPSHOT_FIELDS = (
+    "total_users", "admin_users", "new_this_month", "active_users",
+    "total_files", "total_bytes", "api_calls",
+    "total_invoices", "pending_invoices", "paid_revenue", "total_billed",
+)
+
+
+# Live platform totals
+def compute_platform_totals(now=None):
+    """
+    Every platform-wide number in one statement: one conditional-aggregate
+    subquery per table, each returning a single row, cross-joined.
+    "Today" is the local day, the one usage_logs rows are written under.
+    """
+    now              = now or datetime.now()
+    today            = now.date()
+    this_month_start = today.replace(day=1)
+
+    users = db.session.query(
+        func.count(case((User.role == "user",  1))).label("total_users"),
+        func.count(case((User.role == "admin", 1))).label("admin_users"),
+        func.count(case((User.created_at >= this_month_start, 1))).label("new_this_month")
+    ).subquery()
+
+    objects = db.session.query(
+        func.count(StorageObject.id).label("total_files"),
+        func.coalesce(func.sum(StorageObject.file_size), 0).label("total_bytes")
+    ).subquery()
+
+    usage_today = db.session.query(
+        func.count(func.distinct(UsageLog.user_id)).label("active_users"),
+        func.coalesce(func.sum(UsageLog.api_calls), 0).label("api_calls")
+    ).filter(UsageLog.date == today).subquery()
+
+    invoices = db.session.query(
+        func.count(Invoice.id).label("total_invoices"),
+        func.count(case((Invoice.status == "generated", 1))).label("pending_invoices"),
+        func.coalesce(func.sum(
+            case((Invoice.status == "paid", Invoice.total_amount), else_=0)
+        ), 0).label("paid_revenue"),
+        func.coalesce(func.sum(Invoice.total_amount), 0).label("total_billed")
+    ).subquery()
+
+    row = db.session.query(users, objects, usage_today, invoices)\
+                    .select_from(users)\
+                    .join(objects,     true())\
+                    .join(usage_today, true())\
+                    .join(invoices,    true())\
+                    .one()
+
+    return {
+        "total_users":      int(row.total_users),
+        "admin_users":      int(row.admin_users),
+        "new_this_month":   int(row.new_this_month),
+        "active_users":     int(row.active_users),
+        "total_files":      int(row.total_files),
+        "total_bytes":      int(row.total_bytes),
+        "api_calls":        int(row.api_calls),
+        "total_invoices":   int(row.total_invoices),
+        "pending_invoices": int(row.pending_invoices),
+        "paid_revenue":     round(float(row.paid_revenue), 4),
+        "total_billed":     round(float(row.total_billed), 4),
+    }
+
+
+def _upsert_snapshot(resolution, bucket_start, values):
+    row = {
+        "resolution":   resolution,
+        "bucket_start": bucket_start,
+        "taken_at":     datetime.utcnow(),
+        **{field: values[field] for field in SNAPSHOT_FIELDS}
+    }
+
+    stmt = dialect_insert(PlatformSnapshot)
+    if stmt is None:
+        snap = PlatformSnapshot.query.filter_by(
+            resolution=resolution, bucket_start=bucket_start
+        ).first()
+        if snap is None:
+            db.session.add(PlatformSnapshot(**row))
+        else:
+            for key, value in row.items():
+                setattr(snap, key, value)
+        db.session.flush()
+        return
+
+    stmt = stmt.values(row)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[PlatformSnapshot.resolution, PlatformSnapshot.bucket_start],
+        set_={key: stmt.excluded[key] for key in row if key not in ("resolution", "bucket_start")}
+    ))
+
+
+# Month point from the month's daily points
+def rollup_month(month_start):
+    """
+    Gauges (users, files, bytes, invoices) come from the latest day;
+    api_calls is the sum of the days and active_users the busiest day.
+    """
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+    days = PlatformSnapshot.query.filter(
+        PlatformSnapshot.resolution   == "day",
+        PlatformSnapshot.bucket_start >= month_start,
+        PlatformSnapshot.bucket_start <  next_month
+    ).order_by(PlatformSnapshot.bucket_start).all()
+
+    if not days:
+        return
+
+    latest = days[-1]
+    values = {field: getattr(latest, field) for field in SNAPSHOT_FIELDS}
+    values["api_calls"]    = sum(day.api_calls    or 0 for day in days)
+    values["active_users"] = max(day.active_users or 0 for day in days)
+
+    _upsert_snapshot("month", month_start, values)
+
+
+def prune_snapshots(now=None):
+    """
+    Drops hourly and daily points past their retention window.
+    Monthly points are kept forever.
+    Returns the number of rows deleted.
+    """
+    now = now or datetime.now()
+    deleted = 0
+    for resolution, keep_days in (
+        ("hour", Config.SNAPSHOT_HOURLY_RETENTION_DAYS),
+        ("day",  Config.SNAPSHOT_DAILY_RETENTION_DAYS),
+    ):
+        deleted += PlatformSnapshot.query.filter(
+            PlatformSnapshot.resolution   == resolution,
+            PlatformSnapshot.bucket_start <  now - timedelta(days=keep_days)
+        ).delete(synchronize_session=False)
+    return deleted
+
+
+# Hourly task body
+def take_platform_snapshot(now=None):
+    """
+    Writes this hour's point, refreshes today's and this month's
+    rolled-up points, applies retention, and commits. Buckets start on
+    local hours and days, like usage_logs and the admin charts.
+    Returns the computed totals.
+    """
+    now    = now or datetime.now()
+    values = compute_platform_totals(now)
+
+    hour_start  = now.replace(minute=0, second=0, microsecond=0)
+    day_start   = hour_start.replace(hour=0)
+    month_start = day_start.replace(day=1)
+
+    # Today's running totals: the latest hour is the day so far
+    _upsert_snapshot("hour", hour_start, values)
+    _upsert_snapshot("day",  day_start,  values)
+    rollup_month(month_start)
+
+    pruned = prune_snapshots(now)
+    db.session.commit()
+
+    return {"bucket_start": hour_start.isoformat(), "pruned": pruned, **values}
+
+
+# Backfill daily points from history
+def _uploads_by_day():
+    """
+    [(day, files, bytes)] uploaded per day, oldest first, from the
+    objects table — the source of the live total_files / total_bytes.
+    """
+    day  = func.date(StorageObject.uploaded_at)
+    rows = db.session.query(
+        day,
+        func.count(StorageObject.id),
+        func.coalesce(func.sum(StorageObject.file_size), 0)
+    ).filter(StorageObject.uploaded_at.isnot(None)).group_by(day).all()
+
+    # date() comes back as a string on SQLite
+    return sorted((date.fromisoformat(str(d)), int(n), int(b)) for d, n, b in rows)
+
+
+def backfill_daily_snapshots():
+    """
+    One grouped query over usage_logs gives api_calls and active users
+    for every past day; total_files / total_bytes are the objects
+    uploaded by the end of that day, like the live points (files
+    deleted since are not known). Other fields stay 0.
+
+    Days that already have a live point are kept. A point with no users
+    counted is one an earlier backfill wrote, and is rewritten.
+    Returns the number of days written.
+    """
+    existing = {
+        snap.date() for (snap,) in db.session.query(PlatformSnapshot.bucket_start)
+                                             .filter(PlatformSnapshot.resolution == "day",
+                                                     PlatformSnapshot.total_users > 0)
+    }
+
+    rows = db.session.query(
+        UsageLog.date,
+        func.sum(UsageLog.api_calls).label("api_calls"),
+        func.count(func.distinct(UsageLog.user_id)).label("active_users")
+    ).group_by(UsageLog.date).order_by(UsageLog.date).all()
+
+    uploads = _uploads_by_day()
+    files = stored = i = 0
+
+    months = set()
+    written = 0
+    for row in rows:
+        while i < len(uploads) and uploads[i][0] <= row.date:
+            files  += uploads[i][1]
+            stored += uploads[i][2]
+            i      += 1
+
+        if row.date in existing:
+            continue
+        day_start = datetime.combine(row.date, datetime.min.time())
+        values    = {field: 0 for field in SNAPSHOT_FIELDS}
+        values.update({
+            "api_calls":    int(row.api_calls or 0),
+            "total_files":  files,
+            "total_bytes":  stored,
+            "active_users": int(row.active_users or 0),
+        })
+        _upsert_snapshot("day", day_start, values)
+        months.add(day_start.replace(day=1))
+        written += 1
+
+    db.session.flush()
+    for month_start in sorted(months):
+        rollup_month(month_start)
+
+    return written
+
+
+# Reads for the admin panel
+def get_latest_snapshot():
+    """
+    The newest hourly point. Takes one now if the table is empty.
+    """
+    snap = PlatformSnapshot.query.filter_by(resolution="hour")\
+                                 .order_by(PlatformSnapshot.bucket_start.desc())\
+                                 .first()
+    if snap is None:
+        take_platform_snapshot()
+        snap = PlatformSnapshot.query.filter_by(resolution="hour")\
+                                     .order_by(PlatformSnapshot.bucket_start.desc())\
+                                     .first()
+    return snap
+
+
+def get_snapshot_series(resolution, start, end):
+    """
+    {bucket_start: PlatformSnapshot} for start <= bucket_start <= end.
+    """
+    snaps = PlatformSnapshot.query.filter(
+        PlatformSnapshot.resolution   == resolution,
+        PlatformSnapshot.bucket_start >= start,
+        PlatformSnapshot.bucket_start <= end
+    ).all()
+    return {snap.bucket_start: snap for snap in snaps}
@@ -0,0 +1,110 @@
+import uuid
+from datetime import datetime, timedelta
+from models import db, PendingUpload
+from services.storage_service import storage
+from config import Config
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+
+def _complete_deadline(now=None):
+    """
+    Reservations whose upload window closed before this are stale: the
+    client had PRESIGNED_URL_EXPIRY seconds more to call complete.
+    """
+    return (now or datetime.utcnow()) - timedelta(seconds=Config.PRESIGNED_URL_EXPIRY)
+
+
+# Step 1: reserve the name
+def reserve_upload(user_id, filename, original_name, max_bytes):
+    """
+    Records a presigned upload and reserves `filename` in the user's
+    bucket until it completes or expires. Commits.
+    Returns the PendingUpload, or None if the name was reserved
+    concurrently (the caller picks another one).
+    """
+    pending = PendingUpload(
+        user_id=user_id,
+        upload_key=uuid.uuid4().hex,
+        filename=filename,
+        original_name=original_name,
+        max_bytes=max_bytes,
+        expires_at=datetime.utcnow() + timedelta(seconds=Config.PRESIGNED_URL_EXPIRY)
+    )
+    db.session.add(pending)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return pending
+
+
+def is_reserved(user_id, filename):
+    return db.session.query(PendingUpload.id).filter_by(
+        user_id=user_id, filename=filename
+    ).first() is not None
+
+
+# Step 2: complete it
+def claim_upload(user_id, upload_key):
+    """
+    Moves the reservation from pending to completing with one
+    conditional UPDATE, so only one /presign/complete call works on it.
+    Commits. Returns the PendingUpload, or None if there is no such
+    pending upload (unknown, already completing/completed, or stale).
+    """
+    result = db.session.execute(
+        update(PendingUpload)
+        .where(PendingUpload.user_id    == user_id,
+               PendingUpload.upload_key == upload_key,
+               PendingUpload.status     == "pending",
+               PendingUpload.expires_at >= _complete_deadline())
+        .values(status="completing")
+    )
+    db.session.commit()
+    if not result.rowcount:
+        return None
+    return PendingUpload.query.filter_by(upload_key=upload_key).first()
+
+
+def release_upload(pending):
+    """
+    Puts a claimed reservation back so complete can be retried. Commits.
+    """
+    pending.status = "pending"
+    db.session.commit()
+
+
+def drop_upload(pending):
+    """
+    Deletes the uploaded object and the reservation. Commits.
+    """
+    storage.delete_uploads([pending.upload_key])
+    db.session.delete(pending)
+    db.session.commit()
+
+
+# Sweep
+def expire_uploads():
+    """
+    Deletes stale reservations and whatever was uploaded for them.
+    Returns the number of reservations removed.
+    """
+    if not storage.supports_presigned:
+        return 0
+
+    stale = PendingUpload.query.filter(
+        PendingUpload.expires_at < _complete_deadline()
+    ).all()
+    if not stale:
+        return 0
+
+    errors = storage.delete_uploads([pending.upload_key for pending in stale])
+    for key, error in errors.items():
+        print(f"❌ Could not delete pending upload {key}: {error}")
+
+    for pending in stale:
+        db.session.delete(pending)
+    db.session.commit()
+    return len(stale)
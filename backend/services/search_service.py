@@ -0,0 +1,120 @@
+from models import db, User
+from sqlalchemy import text, case, or_, func
+
+# SQLite trigram tokenizer needs at least 3 characters to use the index
+MIN_INDEXED_QUERY = 3
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _has_fts():
+    return _dialect() == "sqlite" and db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+    )).first() is not None
+
+
+# Build / rebuild the index
+def init_search_index(rebuild=False):
+    """
+    SQLite: an FTS5 table (trigram tokenizer) over username and email,
+    keyed by users.id. Filled from users when first created (or when
+    rebuild=True); afterwards index_user() keeps it in step.
+
+    PostgreSQL: pg_trgm GIN indexes on lower(username) and lower(email),
+    which the database maintains by itself.
+
+    Does nothing on other databases (search falls back to ILIKE).
+    """
+    dialect = _dialect()
+
+    if dialect == "sqlite":
+        created = not _has_fts()
+        try:
+            db.session.execute(text("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS users_fts
+                USING fts5(username, email, role UNINDEXED, tokenize = 'trigram')
+            """))
+        except Exception as e:
+            # SQLite built without FTS5 / older than 3.34
+            db.session.rollback()
+            print(f"❌ User search index unavailable: {e}")
+            return False
+
+        if created or rebuild:
+            db.session.execute(text("DELETE FROM users_fts"))
+            db.session.execute(text("""
+                INSERT INTO users_fts (rowid, username, email, role)
+                SELECT id, username, email, role FROM users
+            """))
+        db.session.commit()
+        return True
+
+    if dialect == "postgresql":
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_users_username_trgm
+            ON users USING gin (lower(username) gin_trgm_ops)
+        """))
+        db.session.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_users_email_trgm
+            ON users USING gin (lower(email) gin_trgm_ops)
+        """))
+        db.session.commit()
+        return True
+
+    return False
+
+
+def index_user(user):
+    """
+    Writes the user's row into the search index after register or a
+    role change. Does NOT commit, so it lands in the caller's transaction.
+    """
+    if not _has_fts():
+        return
+    db.session.flush()
+    db.session.execute(text("DELETE FROM users_fts WHERE rowid = :id"), {"id": user.id})
+    db.session.execute(text("""
+        INSERT INTO users_fts (rowid, username, email, role)
+        VALUES (:id, :username, :email, :role)
+    """), {"id": user.id, "username": user.username, "email": user.email, "role": user.role})
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Ranked match
+def user_search_filter(search):
+    """
+    Returns (filter, rank) for a lower-cased search string:
+    - filter: SQL condition selecting matching users, index-backed
+    - rank:   0 username prefix, 1 email prefix, 2 substring match
+    Callers order by (rank, username, id).
+    """
+    pattern = _escape_like(search)
+    prefix  = f"{pattern}%"
+
+    rank = case(
+        (func.lower(User.username).like(prefix, escape="\\"), 0),
+        (func.lower(User.email).like(prefix, escape="\\"),    1),
+        else_=2
+    )
+
+    # Queries too short for trigrams fall through to the substring scan
+    if len(search) >= MIN_INDEXED_QUERY and _has_fts():
+        quoted  = '"' + search.replace('"', '""') + '"'
+        matches = text(
+            "SELECT rowid FROM users_fts WHERE users_fts MATCH :query"
+        ).bindparams(query=quoted)
+        return User.id.in_(matches), rank
+
+    # PostgreSQL: served by the pg_trgm indexes (3+ characters);
+    # otherwise a plain scan, same matches as the indexed path
+    contains = f"%{pattern}%"
+    return or_(
+        func.lower(User.username).like(contains, escape="\\"),
+        func.lower(User.email).like(contains, escape="\\")
+    ), rank
@@ -0,0 +1,199 @@
+from models import db, User, UsageMonthly
+from services.metering_service import usage_meter
+from config import Config
+from calendar import monthrange
+from sqlalchemy import func, and_
+import numpy as np
+
+# Rate keys a scenario may override (missing keys use the live Config value)
+SCENARIO_KEYS = (
+    "PRICE_STORAGE_PER_GB_DAY",
+    "PRICE_API_PER_CALL",
+    "FREE_STORAGE_BYTES",
+    "FREE_API_CALLS",
+)
+
+MAX_SCENARIOS = 500
+
+# Upper bound on scenario x user cells evaluated at once (~40 MB of float64)
+CELLS_PER_CHUNK = 5_000_000
+
+DISTRIBUTION_PERCENTILES = (50, 90, 99)
+
+# Most user ids listed per scenario as over the free tier (one page)
+MAX_CROSSING_IDS = 10_000
+
+
+# Load one month of usage into arrays
+def load_month_usage(year, month):
+    """
+    One query: every user's usage_monthly row for the month.
+    Returns (user_ids, avg_storage_bytes, total_api_calls) as NumPy arrays,
+    with avg storage computed exactly like the invoice run.
+    """
+    month_label = f"{year}-{str(month).zfill(2)}"
+
+    # Buffered API calls must be in usage_monthly before we read it
+    usage_meter.flush()
+
+    rows = db.session.query(
+        User.id,
+        func.coalesce(UsageMonthly.total_storage,   0),
+        func.coalesce(UsageMonthly.total_api_calls, 0),
+        func.coalesce(UsageMonthly.days_active,     0)
+    ).outerjoin(UsageMonthly, and_(
+        UsageMonthly.user_id == User.id,
+        UsageMonthly.month   == month_label
+    )).filter(User.role == "user").order_by(User.id).all()
+
+    data = np.array(rows, dtype=np.int64).reshape(-1, 4)
+    user_ids, total_storage, total_api, days_active = data.T
+
+    avg_storage = np.where(
+        days_active > 0, total_storage // np.maximum(days_active, 1), 0
+    )
+    return user_ids, avg_storage, total_api
+
+
+def build_scenarios(raw_scenarios):
+    """
+    Fills each scenario dict with the live Config value for any key it
+    leaves out. Unnamed scenarios are called scenario_<position>. Returns (names, rates) where rates maps key -> array.
+    Raises ValueError on unknown keys or non-numeric / negative values.
+    """
+    names = []
+    rates = {key: [] for key in SCENARIO_KEYS}
+
+    for i, scenario in enumerate(raw_scenarios):
+        scenario = dict(scenario)
+        names.append(str(scenario.pop("name", f"scenario_{i}")))
+
+        unknown = set(scenario) - set(SCENARIO_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown rate key(s): {', '.join(sorted(unknown))}")
+
+        for key in SCENARIO_KEYS:
+            value = float(scenario.get(key, getattr(Config, key)))
+            if value < 0:
+                raise ValueError(f"{key} must not be negative")
+            rates[key].append(value)
+
+    return names, {key: np.array(values) for key, values in rates.items()}
+
+
+# Evaluate every scenario against every user
+def simulate_pricing(year, month, raw_scenarios, top_n=20,
+                     crossing_limit=1000, crossing_after=None):
+    """
+    Prices the month for all users under many rate sets in one batched
+    computation: usage is (users,), rates are (scenarios, 1), so each
+    cost is a (scenarios, users) matrix. Same formula as price_usage().
+
+    Per scenario returns total revenue, the per-user bill distribution
+    and the users who go over the free tier: counts, plus their ids in
+    id order, crossing_limit at a time after user id crossing_after
+    (next_after continues the list).
+    """
+    _, days_in_month = monthrange(year, month)
+    user_ids, avg_storage, total_api = load_month_usage(year, month)
+
+    names, rates = build_scenarios(
+        [{"name": "current"}] + list(raw_scenarios)
+    )
+
+    count  = len(names)
+    chunk  = max(1, CELLS_PER_CHUNK // max(len(user_ids), 1))
+    totals = np.zeros(count)
+    over_storage = np.zeros(count, dtype=np.int64)
+    over_api     = np.zeros(count, dtype=np.int64)
+    over_either  = np.zeros(count, dtype=np.int64)
+    percentiles  = np.zeros((count, len(DISTRIBUTION_PERCENTILES)))
+    means        = np.zeros(count)
+    maxima       = np.zeros(count)
+    paying       = np.zeros(count, dtype=np.int64)
+    top_users    = [[] for _ in range(count)]
+    crossing     = [[] for _ in range(count)]
+    more         = np.zeros(count, dtype=bool)
+
+    # user_ids are sorted, so a page is a slice from this position
+    first = int(np.searchsorted(user_ids, crossing_after, side="right")) \
+            if crossing_after is not None else 0
+
+    for lo in range(0, count, chunk):
+        hi = min(lo + chunk, count)
+        free_storage = rates["FREE_STORAGE_BYTES"][lo:hi, None]
+        free_api     = rates["FREE_API_CALLS"][lo:hi, None]
+
+        billable_storage = np.maximum(0, avg_storage[None, :] - free_storage)
+        billable_api     = np.maximum(0, total_api[None, :]   - free_api)
+
+        storage_cost = (billable_storage / (1024 ** 3) * days_in_month
+                        * rates["PRICE_STORAGE_PER_GB_DAY"][lo:hi, None])
+        api_cost     = billable_api * rates["PRICE_API_PER_CALL"][lo:hi, None]
+
+        # Same rounding as Invoice.total_amount
+        bills = np.round(storage_cost + api_cost, 4)
+
+        totals[lo:hi]       = bills.sum(axis=1)
+        over_storage[lo:hi] = (billable_storage > 0).sum(axis=1)
+        over_api[lo:hi]     = (billable_api > 0).sum(axis=1)
+        over_mask           = (billable_storage > 0) | (billable_api > 0)
+        over_either[lo:hi]  = over_mask.sum(axis=1)
+        paying[lo:hi]       = (bills > 0).sum(axis=1)
+
+        for row, mask in enumerate(over_mask[:, first:]):
+            ids = user_ids[first:][mask]
+            crossing[lo + row] = ids[:crossing_limit].tolist()
+            more[lo + row]     = len(ids) > crossing_limit
+
+        if len(user_ids):
+            percentiles[lo:hi] = np.percentile(bills, DISTRIBUTION_PERCENTILES, axis=1).T
+            means[lo:hi]       = bills.mean(axis=1)
+            maxima[lo:hi]      = bills.max(axis=1)
+
+            # Largest bills first, only among users over the free tier
+            k = min(top_n, len(user_ids))
+            if k:
+                top   = np.argpartition(-bills, k - 1, axis=1)[:, :k]
+                order = np.take_along_axis(
+                    top, np.argsort(-np.take_along_axis(bills, top, axis=1), axis=1), axis=1
+                )
+                for row, idx in enumerate(order):
+                    top_users[lo + row] = [
+                        {"user_id": int(user_ids[j]), "amount": round(float(bills[row, j]), 4)}
+                        for j in idx if bills[row, j] > 0
+                    ]
+
+    baseline = totals[0]
+    results  = []
+    for i, name in enumerate(names):
+        results.append({
+            "name":  name,
+            "rates": {key: float(rates[key][i]) for key in SCENARIO_KEYS},
+            "total_revenue":     round(float(totals[i]), 4),
+            "change_vs_current": round(float(totals[i] - baseline), 4),
+            "distribution": {
+                "mean": round(float(means[i]), 4),
+                **{
+                    f"p{p}": round(float(percentiles[i, j]), 4)
+                    for j, p in enumerate(DISTRIBUTION_PERCENTILES)
+                },
+                "max":           round(float(maxima[i]), 4),
+                "paying_users":  int(paying[i])
+            },
+            "over_free_tier": {
+                "storage": int(over_storage[i]),
+                "api":     int(over_api[i]),
+                "either":  int(over_either[i]),
+                "user_ids":   crossing[i],
+                "next_after": crossing[i][-1] if more[i] else None
+            },
+            "top_users": top_users[i]
+        })
+
+    return {
+        "month":         f"{year}-{str(month).zfill(2)}",
+        "days_in_month": days_in_month,
+        "total_users":   int(len(user_ids)),
+        "scenarios":     results
+    }
@@ -0,0 +1,363 @@
+import os
+import shutil
+import tempfile
+import mimetypes
+from collections import namedtuple
+from datetime import datetime, timezone
+from config import Config
+import services.minio_service as minio_service
+
+# What stat_file() returns for every backend (MinIO's stat has the same fields)
+ObjectStat = namedtuple("ObjectStat", "size etag last_modified content_type")
+
+
+# MinIO (default)
+class MinioStorage:
+    """
+    The existing MinIO functions behind the storage interface.
+    Supports presigned URLs; downloads are streamed over HTTP.
+    """
+
+    name               = "minio"
+    supports_presigned = True
+
+    def get_bucket_name(self, username):
+        return minio_service.get_bucket_name(username)
+
+    def ensure_bucket_exists(self, username):
+        minio_service.ensure_bucket_exists(username)
+
+    def create_user_bucket(self, username):
+        return minio_service.create_user_bucket(username)
+
+    def upload_file(self, username, file_data, filename, content_type, file_size):
+        return minio_service.upload_file(username, file_data, filename, content_type, file_size)
+
+    def upload_stream(self, username, stream, filename, content_type, length=-1):
+        return minio_service.upload_stream(username, stream, filename, content_type, length)
+
+    def stat_file(self, username, filename):
+        return minio_service.stat_file(username, filename)
+
+    def stream_file(self, username, filename, offset=0, length=0):
+        return minio_service.stream_file(username, filename, offset, length)
+
+    def download_file(self, username, filename):
+        return minio_service.download_file(username, filename)
+
+    def delete_file(self, username, filename):
+        return minio_service.delete_file(username, filename)
+
+    def delete_files(self, username, filenames):
+        return minio_service.delete_files(username, filenames)
+
+    def list_files(self, username):
+        return minio_service.list_files(username)
+
+    def get_file_size(self, username, filename):
+        return minio_service.get_file_size(username, filename)
+
+    def get_total_storage_used(self, username):
+        return minio_service.get_total_storage_used(username)
+
+    def presigned_upload_post(self, upload_key, max_bytes, expires=None):
+        return minio_service.presigned_upload_post(upload_key, max_bytes, expires)
+
+    def stat_upload(self, upload_key):
+        return minio_service.stat_upload(upload_key)
+
+    def claim_upload(self, upload_key, etag, username, filename):
+        return minio_service.claim_upload(upload_key, etag, username, filename)
+
+    def delete_uploads(self, upload_keys):
+        return minio_service.delete_uploads(upload_keys)
+
+    def presigned_download_url(self, username, filename, expires=None, content_encoding=None):
+        return minio_service.presigned_download_url(username, filename, expires, content_encoding)
+
+    def local_path(self, username, filename):
+        return None
+
+    def copy_to_blob(self, username, filename, blob_key):
+        return minio_service.copy_to_blob(username, filename, blob_key)
+
+    def list_blobs(self):
+        return minio_service.list_blobs()
+
+    def stat_blob(self, blob_key):
+        return minio_service.stat_blob(blob_key)
+
+    def stream_blob(self, blob_key, offset=0, length=0):
+        return minio_service.stream_blob(blob_key, offset, length)
+
+    def blob_local_path(self, blob_key):
+        return None
+
+    def presigned_blob_url(self, blob_key, download_name, expires=None, content_encoding=None):
+        return minio_service.presigned_blob_url(blob_key, download_name, expires, content_encoding)
+
+    def delete_blobs(self, blob_keys):
+        return minio_service.delete_blobs(blob_keys)
+
+
+# Local filesystem
+class LocalStorage:
+    """
+    One directory per bucket under LOCAL_STORAGE_ROOT, one file per object.
+
+    - Uploads are written to a temp file in the bucket directory and
+      renamed over the target (os.replace), so readers never see a
+      half-written file and a failed upload leaves nothing behind.
+    - local_path() lets the download route hand the file to send_file(),
+      which serves it with sendfile() where the WSGI server supports
+      wsgi.file_wrapper (zero-copy) and handles Range / conditional GETs.
+
+    Presigned URLs are not available (there is no server to sign for).
+    """
+
+    name               = "local"
+    supports_presigned = False
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def get_bucket_name(self, username):
+        return minio_service.get_bucket_name(username)
+
+    def _bucket_dir(self, username):
+        return os.path.join(self.root, self.get_bucket_name(username))
+
+    def _path(self, username, filename):
+        # Names are validated before they get here; this is a last guard
+        if not filename or filename != os.path.basename(filename) or filename.startswith("."):
+            raise ValueError(f"Invalid object name: {filename!r}")
+        return os.path.join(self._bucket_dir(username), filename)
+
+    def ensure_bucket_exists(self, username):
+        os.makedirs(self._bucket_dir(username), exist_ok=True)
+
+    def create_user_bucket(self, username):
+        try:
+            self.ensure_bucket_exists(username)
+            print(f"✅ Bucket created: {self._bucket_dir(username)}")
+            return True
+        except OSError as e:
+            print(f"❌ Error creating bucket: {e}")
+            return False
+
+    def upload_file(self, username, file_data, filename, content_type, file_size):
+        import io
+        return self.upload_stream(username, io.BytesIO(file_data), filename, content_type, file_size)
+
+    def upload_stream(self, username, stream, filename, content_type, length=-1):
+        """
+        Same contract as minio_service.upload_stream: exceptions raised by
+        stream.read() propagate (after the temp file is removed).
+        """
+        try:
+            target = self._path(username, filename)
+        except ValueError as e:
+            print(f"❌ Upload error: {e}")
+            return False
+        self.ensure_bucket_exists(username)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                shutil.copyfileobj(stream, tmp, Config.UPLOAD_PART_SIZE)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, target)
+        except OSError as e:
+            os.unlink(tmp_path)
+            print(f"❌ Upload error: {e}")
+            return False
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        print(f"✅ File uploaded: {filename} to {os.path.dirname(target)}")
+        return True
+
+    def stat_file(self, username, filename):
+        try:
+            return self._stat_path(self._path(username, filename))
+        except ValueError:
+            return None
+
+    def _stat_path(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        content_type, _ = mimetypes.guess_type(path)
+        return ObjectStat(
+            size=st.st_size,
+            # Same idea as nginx: changes whenever the file is replaced
+            etag=f"{st.st_mtime_ns:x}-{st.st_size:x}",
+            last_modified=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+            content_type=content_type or "application/octet-stream"
+        )
+
+    def stream_file(self, username, filename, offset=0, length=0):
+        try:
+            return self._stream_path(self._path(username, filename), offset, length)
+        except ValueError as e:
+            print(f"❌ Download error: {e}")
+            return None
+
+    def _stream_path(self, path, offset=0, length=0):
+        try:
+            f = open(path, "rb")
+        except OSError as e:
+            print(f"❌ Download error: {e}")
+            return None
+
+        def chunks():
+            with f:
+                f.seek(offset)
+                remaining = length or None
+                while remaining is None or remaining > 0:
+                    size  = Config.DOWNLOAD_CHUNK_SIZE if remaining is None \
+                            else min(Config.DOWNLOAD_CHUNK_SIZE, remaining)
+                    chunk = f.read(size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+
+        return chunks()
+
+    def download_file(self, username, filename):
+        try:
+            with open(self._path(username, filename), "rb") as f:
+                return f.read()
+        except (OSError, ValueError) as e:
+            print(f"❌ Download error: {e}")
+            return None
+
+    def delete_file(self, username, filename):
+        try:
+            os.unlink(self._path(username, filename))
+            print(f"✅ File deleted: {filename} from {self._bucket_dir(username)}")
+            return True
+        except FileNotFoundError:
+            # Same as S3: deleting a missing object succeeds
+            return True
+        except (OSError, ValueError) as e:
+            print(f"❌ Delete error: {e}")
+            return False
+
+    def delete_files(self, username, filenames):
+        """
+        {filename: error message} for the files that could not be deleted.
+        """
+        errors = {}
+        for filename in filenames:
+            try:
+                os.unlink(self._path(username, filename))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                errors[filename] = str(e)
+        return errors
+
+    def list_files(self, username):
+        self.ensure_bucket_exists(username)
+        files = []
+        with os.scandir(self._bucket_dir(username)) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                files.append({
+                    "filename": entry.name,
+                    "size_bytes": st.st_size,
+                    "size_kb": round(st.st_size / 1024, 2),
+                    "last_modified": datetime.fromtimestamp(st.st_mtime, tz=timezone.utc).isoformat()
+                })
+        return files
+
+    def get_file_size(self, username, filename):
+        stat = self.stat_file(username, filename)
+        return stat.size if stat else 0
+
+    def get_total_storage_used(self, username):
+        # Raises OSError if the directory cannot be read, like MinIO's
+        return sum(f["size_bytes"] for f in self.list_files(username))
+
+    def local_path(self, username, filename):
+        path = self._path(username, filename)
+        return path if os.path.isfile(path) else None
+
+    # Shared content-addressed blob area: LOCAL_STORAGE_ROOT/BLOB_BUCKET/<key>
+    def _blob_path(self, blob_key):
+        parts = blob_key.split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid blob key: {blob_key!r}")
+        return os.path.join(self.root, Config.BLOB_BUCKET, *parts)
+
+    def copy_to_blob(self, username, filename, blob_key):
+        """
+        Hard-links an uploaded file into the blob area — same filesystem,
+        so no data is copied (falls back to a copy where links are not
+        supported). The original stays until the upload is committed.
+        """
+        target = self._blob_path(blob_key)
+        try:
+            source = self._path(username, filename)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"❌ Blob copy error: {e}")
+            return False
+
+    def list_blobs(self):
+        blob_root = os.path.join(self.root, Config.BLOB_BUCKET)
+        for dirpath, _, filenames in os.walk(blob_root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                modified = datetime.fromtimestamp(os.stat(path).st_mtime, tz=timezone.utc)
+                yield os.path.relpath(path, blob_root).replace(os.sep, "/"), modified
+
+    def stat_blob(self, blob_key):
+        return self._stat_path(self._blob_path(blob_key))
+
+    def stream_blob(self, blob_key, offset=0, length=0):
+        return self._stream_path(self._blob_path(blob_key), offset, length)
+
+    def blob_local_path(self, blob_key):
+        path = self._blob_path(blob_key)
+        return path if os.path.isfile(path) else None
+
+    def delete_blobs(self, blob_keys):
+        errors = {}
+        for blob_key in blob_keys:
+            try:
+                os.unlink(self._blob_path(blob_key))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                errors[blob_key] = str(e)
+        return errors
+
+
+def create_storage(backend=None):
+    """
+    STORAGE_BACKEND: "minio" (default) or "local".
+    """
+    backend = backend or Config.STORAGE_BACKEND
+    if backend == "local":
+        return LocalStorage(Config.LOCAL_STORAGE_ROOT)
+    if backend == "minio":
+        return MinioStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r}")
+
+
+storage = create_storage()
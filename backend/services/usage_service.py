@@ -1,65 +1,451 @@
-from models import db, UsageLog, StorageObject
-from services.minio_service import get_total_storage_used
+from models import db, User, UsageLog, UsageMonthly, StorageObject, StorageLedger, MeterFlush
+from services.storage_service import storage
+from services.metering_service import usage_meter
+from services.cache_service import invalidate_estimate
+from services.leaderboard_service import record_storage
+from utils.sql import dialect_insert
+from utils.validators import format_bytes
+from config import Config
 from datetime import date, datetime, timedelta
-from sqlalchemy import func
+from calendar import monthrange
+from collections import defaultdict
+from sqlalchemy import func, update, delete, literal
 
 
 # Log an API call for today
 def log_api_call(user_id):
     """
     Called after every API request.
-    Finds today's log row and increments api_calls by 1.
-    If no row exists for today, creates one.
+    Only bumps the in-memory (or Redis) metering buffer — the counts
+    reach usage_logs in bulk when the buffer flushes.
     """
-    today = date.today()
-    log   = UsageLog.query.filter_by(user_id=user_id, date=today).first()
+    usage_meter.record(user_id)
 
-    if log:
-        log.api_calls += 1
+
+# Single-statement upsert into usage_logs
+def upsert_usage(rows, set_storage=False):
+    """
+    Inserts usage_logs rows, or merges them into the existing
+    (user_id, date) row in the same statement:
+    - api_calls are always added to the stored value
+    - storage_used replaces the stored value when set_storage=True
+
+    rows: list of dicts with user_id, date, api_calls, storage_used
+    Returns False if the database has no ON CONFLICT support.
+    Does NOT commit.
+    """
+    stmt = dialect_insert(UsageLog)
+    if stmt is None:
+        return False
+
+    stmt    = stmt.values(rows)
+    updates = {"api_calls": UsageLog.api_calls + stmt.excluded.api_calls}
+    if set_storage:
+        updates["storage_used"] = stmt.excluded.storage_used
+
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[UsageLog.user_id, UsageLog.date],
+        set_=updates
+    ))
+    return True
+
+
+# Applied metering flushes are remembered this long; a drain token can
+# only come back (retry or stale recovery) within minutes
+METER_FLUSH_KEEP = timedelta(days=1)
+
+
+def claim_meter_flush(token):
+    """
+    Records the metering flush `token` in the caller's transaction, so
+    its counts and the record commit together. Returns False if the
+    token was already written: a flush retried after its commit went
+    through, or recovered from a worker that died right after it.
+    Two workers writing one token at once cannot both commit: the
+    unique token fails the second, which then finds it written.
+    Does NOT commit.
+    """
+    if db.session.query(MeterFlush.id).filter_by(token=token).first():
+        return False
+    db.session.add(MeterFlush(token=token))
+
+    db.session.execute(
+        delete(MeterFlush)
+        .where(MeterFlush.applied_at < datetime.utcnow() - METER_FLUSH_KEEP)
+    )
+    return True
+
+
+# Write buffered API-call counts
+def add_api_calls_bulk(counts):
+    """
+    Adds buffered API calls to usage_logs.
+    counts: {(user_id, date): api_calls}
+
+    One multi-row upsert on SQLite/PostgreSQL. Other databases load
+    every affected row with one query, then update or insert.
+    Does NOT commit — the metering buffer commits the whole batch.
+    """
+    rows = [
+        {"user_id": user_id, "date": day, "api_calls": calls, "storage_used": 0}
+        for (user_id, day), calls in counts.items()
+    ]
+    if upsert_usage(rows):
+        refresh_monthly_usage(counts.keys())
+        return
+
+    user_ids = {user_id for user_id, _ in counts}
+    days     = {day for _, day in counts}
+
+    existing = UsageLog.query.filter(
+        UsageLog.user_id.in_(user_ids),
+        UsageLog.date.in_(days)
+    ).all()
+    log_map = {(log.user_id, log.date): log for log in existing}
+
+    for (user_id, day), calls in counts.items():
+        log = log_map.get((user_id, day))
+        if log:
+            log.api_calls += calls
+        else:
+            log = UsageLog(
+                user_id=user_id,
+                date=day,
+                api_calls=calls,
+                storage_used=0
+            )
+            db.session.add(log)
+            log_map[(user_id, day)] = log
+
+    db.session.flush()
+    refresh_monthly_usage(counts.keys())
+
+
+# Monthly aggregates (usage_monthly)
+def refresh_monthly_usage(user_days):
+    """
+    Recomputes the usage_monthly rows behind the (user_id, date) pairs
+    that were just written to usage_logs.
+    One INSERT ... SELECT ... GROUP BY ... ON CONFLICT DO UPDATE per month
+    touched (normally just the current one), reading at most 31 rows per
+    user through the (user_id, date) index.
+    Does NOT commit — runs in the same transaction as the usage_logs write.
+    """
+    by_month = defaultdict(set)
+    for user_id, day in user_days:
+        by_month[(day.year, day.month)].add(user_id)
+
+    for (year, month), user_ids in by_month.items():
+        _refresh_month(year, month, user_ids)
+
+
+def rebuild_monthly_usage(year=None, month=None):
+    """
+    Backfill: rebuilds usage_monthly for every user from usage_logs.
+    Pass year/month to rebuild a single month, or nothing for all months.
+    Returns the list of month labels rebuilt. Commits.
+    """
+    if year and month:
+        months = [(year, month)]
     else:
-        log = UsageLog(
-            user_id=user_id,
-            date=today,
-            api_calls=1,
-            storage_used=0
+        first, last = db.session.query(
+            func.min(UsageLog.date), func.max(UsageLog.date)
+        ).one()
+        months = []
+        if first and last:
+            y, m = first.year, first.month
+            while (y, m) <= (last.year, last.month):
+                months.append((y, m))
+                y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+    for y, m in months:
+        _refresh_month(y, m)
+    db.session.commit()
+
+    return [f"{y}-{str(m).zfill(2)}" for y, m in months]
+
+
+def _lock_month_rows(month_label, year, month, user_ids=None):
+    """
+    Makes sure the usage_monthly rows exist and locks them
+    (SELECT ... FOR UPDATE, in user_id order) before they are recomputed.
+    Without it two concurrent refreshes for the same user and month on
+    PostgreSQL each aggregate only their own uncommitted usage_logs row
+    and the last upsert wins. The waiting one re-reads usage_logs once
+    it holds the lock, so it sees the other's committed day. SQLite
+    serializes writers anyway and ignores FOR UPDATE.
+    """
+    if user_ids:
+        db.session.execute(
+            dialect_insert(UsageMonthly).values([
+                {"user_id": user_id, "month": month_label, "year": year, "month_number": month}
+                for user_id in sorted(user_ids)
+            ]).on_conflict_do_nothing(
+                index_elements=[UsageMonthly.user_id, UsageMonthly.month]
+            )
         )
-        db.session.add(log)
 
+    locked = db.select(UsageMonthly.id).where(UsageMonthly.month == month_label)
+    if user_ids is not None:
+        locked = locked.where(UsageMonthly.user_id.in_(user_ids))
+    db.session.execute(locked.order_by(UsageMonthly.user_id).with_for_update()).all()
+
+
+def _refresh_month(year, month, user_ids=None):
+    month_label = f"{year}-{str(month).zfill(2)}"
+    _, last_day = monthrange(year, month)
+
+    aggregates = db.select(
+        UsageLog.user_id,
+        literal(month_label),
+        literal(year),
+        literal(month),
+        func.sum(UsageLog.storage_used),
+        func.max(UsageLog.storage_used),
+        func.sum(UsageLog.api_calls),
+        func.count(UsageLog.id),
+        literal(datetime.utcnow(), type_=db.DateTime)
+    ).where(
+        UsageLog.date >= date(year, month, 1),
+        UsageLog.date <= date(year, month, last_day)
+    )
+    if user_ids is not None:
+        aggregates = aggregates.where(UsageLog.user_id.in_(user_ids))
+    aggregates = aggregates.group_by(UsageLog.user_id)
+
+    columns = [
+        "user_id", "month", "year", "month_number",
+        "total_storage", "peak_storage", "total_api_calls", "days_active",
+        "updated_at"
+    ]
+
+    stmt = dialect_insert(UsageMonthly)
+    if stmt is None:
+        existing = {
+            row.user_id: row for row in UsageMonthly.query.filter_by(month=month_label)
+        }
+        for values in db.session.execute(aggregates):
+            data = dict(zip(columns, values))
+            row  = existing.get(data["user_id"])
+            if row is None:
+                db.session.add(UsageMonthly(**data))
+            else:
+                for key in columns[4:]:
+                    setattr(row, key, data[key])
+        return
+
+    _lock_month_rows(month_label, year, month, user_ids)
+
+    stmt = stmt.from_select(columns, aggregates)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[UsageMonthly.user_id, UsageMonthly.month],
+        set_={key: stmt.excluded[key] for key in columns[4:]}
+    ))
+
+
+# Running storage total
+def adjust_storage_used(user_id, delta_bytes):
+    """
+    Adds delta_bytes (negative on delete) to the user's storage total
+    and appends the change to the storage ledger.
+    Runs as one atomic UPDATE and does NOT commit, so the caller commits
+    it together with the StorageObject insert/delete.
+    """
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(storage_bytes=User.storage_bytes + delta_bytes)
+    )
+    # The UPDATE above holds the user's row lock until commit, so ledger
+    # appends for one user never interleave
+    record_storage_change(user_id, delta_bytes)
+
+
+def get_storage_used(user_id):
+    """
+    Returns the user's total stored bytes from the running total.
+    """
+    return db.session.query(User.storage_bytes)\
+                     .filter(User.id == user_id)\
+                     .scalar() or 0
+
+
+def reconcile_storage_used(user):
+    """
+    Compares the running total with a full MinIO bucket listing and
+    corrects the total if they drifted apart (e.g. a crash between the
+    MinIO write and the DB commit). Deduplicated files live in the
+    shared blob area and compressed files list smaller than they are,
+    so those logical bytes are added from the DB.
+
+    The correction is applied as a delta, and only if the total is still
+    the one the listing was compared with; an upload or delete that
+    commits between the two reads makes it skip this user. An upload
+    already in the bucket whose row is not committed yet is counted by
+    the listing all the same, and counted again when it commits; the
+    next run corrects that.
+
+    A listing that fails raises (it is never taken for an empty bucket),
+    so the caller skips the user and the total stays as it is.
+    Returns (recorded_bytes, actual_bytes); equal when nothing changed.
+    """
+    from services.dedup_service import unlisted_logical_bytes
+
+    recorded = get_storage_used(user.id)
+    actual   = storage.get_total_storage_used(user.username) + unlisted_logical_bytes(user.id)
+    db.session.commit()   # end the read transaction before writing
+
+    if recorded == actual:
+        return recorded, actual
+
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user.id, User.storage_bytes == recorded)
+        .values(storage_bytes=User.storage_bytes + (actual - recorded))
+    )
+    if not result.rowcount:
+        db.session.rollback()
+        print(f"⚠️ Storage total of {user.username} changed during reconcile, skipped")
+        return recorded, recorded
+
+    record_storage_change(user.id, actual - recorded)
     db.session.commit()
-    return log
+    invalidate_estimate(user.id)
+    record_storage(user.id, actual)
+
+    return recorded, actual
+
+
+# Storage ledger (prefix sums of byte-seconds)
+def _ledger_entry_at(user_id, at):
+    """
+    Latest ledger event at or before `at` — one index seek.
+    """
+    return StorageLedger.query.filter(
+        StorageLedger.user_id     == user_id,
+        StorageLedger.occurred_at <= at
+    ).order_by(
+        StorageLedger.occurred_at.desc(),
+        StorageLedger.id.desc()
+    ).first()
+
+
+def record_storage_change(user_id, delta_bytes, at=None):
+    """
+    Appends a size-change event (+n upload, -n delete) to the ledger.
+    cum_byte_seconds carries the running integral of stored bytes, so
+    later range averages never have to look at the events in between.
+    Does NOT commit.
+    """
+    at   = at or datetime.utcnow()
+    last = _ledger_entry_at(user_id, at)
+
+    if last:
+        elapsed = int((at - last.occurred_at).total_seconds())
+        balance = last.balance_bytes
+        cum     = last.cum_byte_seconds + balance * elapsed
+    else:
+        balance = 0
+        cum     = 0
+
+    entry = StorageLedger(
+        user_id=user_id,
+        occurred_at=at,
+        delta_bytes=delta_bytes,
+        balance_bytes=balance + delta_bytes,
+        cum_byte_seconds=cum
+    )
+    db.session.add(entry)
+    return entry
+
+
+def storage_byte_seconds(user_id, at):
+    """
+    Integral of the user's stored bytes from the first ledger event up
+    to `at`: the prefix sum at the last event, plus the balance held
+    since then.
+    """
+    last = _ledger_entry_at(user_id, at)
+    if not last:
+        return 0
+    elapsed = int((at - last.occurred_at).total_seconds())
+    return last.cum_byte_seconds + last.balance_bytes * elapsed
+
+
+def get_average_storage(user_id, start, end):
+    """
+    Time-weighted average bytes stored over [start, end) (datetimes).
+    Two indexed lookups, however many uploads happened in between.
+    """
+    seconds = int((end - start).total_seconds())
+    if seconds <= 0:
+        return 0
+    total = storage_byte_seconds(user_id, end) - storage_byte_seconds(user_id, start)
+    return total // seconds
+
+
+# Storage summary for a user
+def get_storage_summary(user_id):
+    """
+    Returns a full storage summary for a user.
+    Reads the running total — no bucket listing.
+    """
+    total_used = get_storage_used(user_id)
+    quota      = Config.STORAGE_QUOTA_BYTES
+    remaining  = max(0, quota - total_used)
+    percent    = round((total_used / quota) * 100, 1) if quota > 0 else 0
+
+    return {
+        "used_bytes":        total_used,
+        "used_readable":     format_bytes(total_used),
+        "quota_bytes":       quota,
+        "quota_readable":    format_bytes(quota),
+        "remaining_bytes":   remaining,
+        "remaining_readable": format_bytes(remaining),
+        "percent_used":      percent,
+        "is_near_limit":     percent >= 80,
+        "is_full":           percent >= 100
+    }
 
 
 # Update storage snapshot for today
-def update_storage_snapshot(user_id, username):
+def update_storage_snapshot(user_id):
     """
     Called after every upload or delete.
-    Recalculates total storage used and saves it for today.
+    Saves the user's current storage total for today.
     """
     today        = date.today()
-    total_bytes  = get_total_storage_used(username)
+    total_bytes  = get_storage_used(user_id)
 
-    log = UsageLog.query.filter_by(user_id=user_id, date=today).first()
+    row = {
+        "user_id":      user_id,
+        "date":         today,
+        "storage_used": total_bytes,
+        "api_calls":    0
+    }
 
-    if log:
-        log.storage_used = total_bytes
-    else:
-        log = UsageLog(
-            user_id=user_id,
-            date=today,
-            storage_used=total_bytes,
-            api_calls=0
-        )
-        db.session.add(log)
+    if not upsert_usage([row], set_storage=True):
+        log = UsageLog.query.filter_by(user_id=user_id, date=today).first()
+
+        if log:
+            log.storage_used = total_bytes
+        else:
+            db.session.add(UsageLog(**row))
+        db.session.flush()
 
+    refresh_monthly_usage([(user_id, today)])
     db.session.commit()
-    return log
+    invalidate_estimate(user_id)
+    record_storage(user_id, total_bytes)
+    return total_bytes
 
 
 # Today's usage for a user
-def get_today_usage(user_id, username):
+def get_today_usage(user_id):
     """
     Returns today's usage snapshot.
-    If no log exists yet today, returns live data from MinIO.
+    If no log exists yet today, returns the live storage total.
+    API calls still sitting in the metering buffer are included.
     """
     today = date.today()
     log   = UsageLog.query.filter_by(user_id=user_id, date=today).first()
@@ -68,9 +454,11 @@ def get_today_usage(user_id, username):
         storage_bytes = log.storage_used
         api_calls     = log.api_calls
     else:
-        storage_bytes = get_total_storage_used(username)
+        storage_bytes = get_storage_used(user_id)
         api_calls     = 0
 
+    api_calls += usage_meter.pending_calls(user_id, today)
+
     total_files = StorageObject.query.filter_by(user_id=user_id).count()
 
     return {
@@ -84,37 +472,95 @@ def get_today_usage(user_id, username):
 
 
 # GET: Last N days of usage history
-def get_usage_history(user_id, days=30):
+HISTORY_GRANULARITIES = ("day", "week", "month")
+
+
+def _history_buckets(start_date, end_date, granularity):
     """
-    Returns daily usage for the last N days.
-    Fills in 0 for days with no activity (so charts have no gaps).
+    Splits [start_date, end_date] into consecutive (start, end) buckets:
+    single days, Monday–Sunday weeks or calendar months.
+    The first and last bucket are clipped to the range.
+    """
+    buckets = []
+    current = start_date
+    while current <= end_date:
+        if granularity == "week":
+            bucket_end = current + timedelta(days=6 - current.weekday())
+        elif granularity == "month":
+            bucket_end = date(current.year, current.month,
+                              monthrange(current.year, current.month)[1])
+        else:
+            bucket_end = current
+
+        bucket_end = min(bucket_end, end_date)
+        buckets.append((current, bucket_end))
+        current = bucket_end + timedelta(days=1)
+    return buckets
+
+
+def get_usage_history(user_id, days=30, granularity="day"):
+    """
+    Returns usage for the last N days, grouped by day, week or month.
+    Fills in 0 for buckets with no activity (so charts have no gaps).
+
+    One query for the raw (date, storage, calls) columns, then a single
+    pass that drops every row into its bucket and tracks the peak and
+    total values at the same time.
+
+    Per bucket: storage_used_* is the highest daily storage in the
+    bucket, api_calls is the sum.
     """
     end_date   = date.today()
     start_date = end_date - timedelta(days=days - 1)
 
-    logs = UsageLog.query.filter(
+    buckets   = _history_buckets(start_date, end_date, granularity)
+    bucket_of = []
+    for i, (bucket_start, bucket_end) in enumerate(buckets):
+        bucket_of.extend([i] * ((bucket_end - bucket_start).days + 1))
+
+    storage = [0] * len(buckets)
+    calls   = [0] * len(buckets)
+
+    rows = db.session.query(
+        UsageLog.date, UsageLog.storage_used, UsageLog.api_calls
+    ).filter(
         UsageLog.user_id == user_id,
         UsageLog.date    >= start_date,
         UsageLog.date    <= end_date
-    ).order_by(UsageLog.date.asc()).all()
+    )
 
-    log_map = {str(log.date): log for log in logs}
+    for day, storage_used, api_calls in rows:
+        i = bucket_of[(day - start_date).days]
+        storage[i] = max(storage[i], storage_used or 0)
+        calls[i]  += api_calls or 0
+
+    for day, pending_calls in usage_meter.pending_by_day(user_id).items():
+        if start_date <= day <= end_date:
+            calls[bucket_of[(day - start_date).days]] += pending_calls
 
     history = []
-    current = start_date
-    while current <= end_date:
-        date_str = current.isoformat()
-        log      = log_map.get(date_str)
+    for (bucket_start, bucket_end), storage_bytes, api_calls in zip(buckets, storage, calls):
+        entry = {
+            "date":               bucket_start.isoformat(),
+            "storage_used_bytes": storage_bytes,
+            "storage_used_mb":    round(storage_bytes / (1024 * 1024), 4),
+            "api_calls":          api_calls,
+        }
+        if granularity != "day":
+            entry["end_date"] = bucket_end.isoformat()
+        history.append(entry)
 
-        history.append({
-            "date":              date_str,
-            "storage_used_bytes": log.storage_used if log else 0,
-            "storage_used_mb":   round(log.storage_used / (1024 * 1024), 4) if log else 0,
-            "api_calls":         log.api_calls if log else 0,
-        })
-        current += timedelta(days=1)
+    peak_storage = max(storage, default=0)
 
-    return history
+    return {
+        "granularity":     granularity,
+        "start_date":      start_date.isoformat(),
+        "end_date":        end_date.isoformat(),
+        "peak_storage_mb": round(peak_storage / (1024 * 1024), 4),
+        "peak_api_calls":  max(calls, default=0),
+        "total_api_calls": sum(calls),
+        "history":         history
+    }
 
 
 # Monthly summary 
@@ -128,20 +574,25 @@ def get_monthly_summary(user_id, year, month):
     - total_api_calls:   total API calls that month
     - days_active:       how many days the user was active
     - peak_storage:      highest storage recorded in that month
-    """
-    from calendar import monthrange
 
+    Reads the single usage_monthly row for the month.
+    API calls still sitting in the metering buffer are included, so the
+    live estimate matches what usage_logs will hold after the next flush.
+    """
+    month_label  = f"{year}-{str(month).zfill(2)}"
     _, last_day  = monthrange(year, month)
     start_date   = date(year, month, 1)
     end_date     = date(year, month, last_day)
 
-    logs = UsageLog.query.filter(
-        UsageLog.user_id == user_id,
-        UsageLog.date    >= start_date,
-        UsageLog.date    <= end_date
-    ).all()
+    agg = UsageMonthly.query.filter_by(user_id=user_id, month=month_label).first()
+
+    pending = {
+        day: calls
+        for day, calls in usage_meter.pending_by_day(user_id).items()
+        if start_date <= day <= end_date
+    }
 
-    if not logs:
+    if not agg and not pending:
         return {
             "year":               year,
             "month":              month,
@@ -155,10 +606,22 @@ def get_monthly_summary(user_id, year, month):
             "days_in_month":      last_day
         }
 
-    total_storage  = sum(log.storage_used for log in logs)
-    peak_storage   = max(log.storage_used for log in logs)
-    total_api      = sum(log.api_calls    for log in logs)
-    days_active    = len(logs)
+    total_storage  = agg.total_storage   if agg else 0
+    peak_storage   = agg.peak_storage    if agg else 0
+    total_api      = agg.total_api_calls if agg else 0
+    days_active    = agg.days_active     if agg else 0
+
+    # Pending days without a row yet will be inserted with storage_used=0
+    if pending:
+        logged_days = {
+            day for (day,) in db.session.query(UsageLog.date).filter(
+                UsageLog.user_id == user_id,
+                UsageLog.date.in_(pending.keys())
+            )
+        }
+        total_api   += sum(pending.values())
+        days_active += len(set(pending) - logged_days)
+
     avg_storage    = total_storage // days_active if days_active > 0 else 0
 
     return {
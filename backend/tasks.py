@@ -1,5 +1,5 @@
 from celery_app import celery
-from datetime import date, datetime
+from datetime import date
 import os
 import smtplib
 from email.mime.text import MIMEText
@@ -57,52 +57,180 @@ def send_email(to_email, subject, html_body):
 
 
 # Monthly Invoice Generation
+def previous_month(today):
+    if today.month == 1:
+        return today.year - 1, 12
+    return today.year, today.month - 1
+
+
+def dispatch_billing_run(run):
+    """
+    Runs every shard of a billing run that still has work, in parallel,
+    as a Celery chord. merge_invoice_shards closes the run at the end;
+    if a shard fails for good, the chord skips it and
+    merge_failed_invoice_shards runs instead.
+    Returns the ids /api/tasks/status/<task_id> uses to report progress.
+    """
+    from celery import chord
+    from services.billing_run_service import shards_to_dispatch
+
+    shards = shards_to_dispatch(run)
+    header = [generate_invoice_shard.s(shard.id) for shard in shards]
+    body   = merge_invoice_shards.s(run.id).on_error(merge_failed_invoice_shards.s(run.id))
+
+    callback = chord(header)(body)
+    callback.parent.save()
+
+    return {
+        "run_id":      run.id,
+        "month":       run.month,
+        "shards":      len(shards),
+        "users":       run.total_users,
+        "group_id":    callback.parent.id,
+        "callback_id": callback.id
+    }
+
+
 @celery.task(name="tasks.generate_all_invoices", bind=True, max_retries=3)
 def generate_all_invoices(self):
+    """
+    Starts (or resumes) last month's billing run.
+
+    The run is split into user-id-range shards that run in parallel.
+    Every shard checkpoints per-user progress in billing_run_items and
+    a cursor in billing_run_shards, so a retry or a second trigger for
+    the same month only does the remaining work.
+    """
     app = get_app()
 
     with app.app_context():
-        from models import User
-        from services.billing_service import generate_invoice
+        from services.billing_run_service import get_or_create_run
 
-        today = date.today()
+        bill_year, bill_month = previous_month(date.today())
 
-        if today.month == 1:
-            bill_year = today.year - 1
-            bill_month = 12
-        else:
-            bill_year = today.year
-            bill_month = today.month - 1
+        run, created = get_or_create_run(
+            bill_year, bill_month, app.config["INVOICE_SHARD_SIZE"]
+        )
 
-        print(f"🧾 Generating invoices for {bill_year}-{str(bill_month).zfill(2)}")
+        action = "Starting" if created else "Resuming"
+        print(f"🧾 {action} billing run #{run.id} for {run.month}")
 
-        users = User.query.filter_by(role="user").all()
-        results = {"generated": 0, "skipped": 0, "failed": 0}
+        return dispatch_billing_run(run)
 
-        for user in users:
-            try:
-                result = generate_invoice(user.id, bill_year, bill_month)
-
-                if result["already_existed"]:
-                    results["skipped"] += 1
-                else:
-                    results["generated"] += 1
-                    send_invoice_email(
-                        user.email,
-                        user.username,
-                        result["invoice"],
-                        bill_year,
-                        bill_month
-                    )
 
-            except Exception as e:
-                print(f"❌ Invoice failed for {user.username}: {e}")
-                results["failed"] += 1
+@celery.task(name="tasks.resume_billing_run", bind=True, max_retries=3)
+def resume_billing_run(self, run_id):
+    """
+    Manually resumes a billing run (e.g. after a deploy killed it).
+    """
+    app = get_app()
+
+    with app.app_context():
+        from models import BillingRun, db
+
+        run = db.session.get(BillingRun, run_id)
+        if not run:
+            return {"error": f"Billing run #{run_id} not found"}
+
+        run.status      = "running"
+        run.finished_at = None
+        db.session.commit()
+
+        print(f"🧾 Resuming billing run #{run.id} for {run.month}")
+        return dispatch_billing_run(run)
+
+
+@celery.task(name="tasks.generate_invoice_shard", bind=True, max_retries=3)
+def generate_invoice_shard(self, shard_id):
+    """
+    Invoices one shard of a billing run, continuing from its checkpoint.
+    On error the shard is marked failed and retried; the retry resumes
+    from the last checkpoint instead of starting over.
+    """
+    app = get_app()
+
+    with app.app_context():
+        from models import db
+        from services.billing_run_service import process_shard, mark_shard_failed
+
+        def notify(user, invoice):
+            return send_invoice_email(
+                user.email,
+                user.username,
+                invoice,
+                invoice["year"],
+                invoice["month_number"]
+            )
+
+        try:
+            results = process_shard(
+                shard_id, notify, app.config["BILLING_BATCH_SIZE"]
+            )
+        except Exception as e:
+            db.session.rollback()
+            mark_shard_failed(shard_id, e)
+            print(f"❌ Invoice shard #{shard_id} failed: {e}")
+            raise self.retry(exc=e, countdown=30)
+
+        print(f"✅ Invoice shard #{shard_id} complete: {results}")
+        return results
+
+
+def merge_shard_counts(shard_results):
+    totals = {"generated": 0, "skipped": 0, "failed": 0}
+    for result in shard_results:
+        for key in totals:
+            totals[key] += result.get(key, 0)
+    return totals
+
+
+@celery.task(name="tasks.merge_invoice_shards")
+def merge_invoice_shards(shard_results, run_id):
+    """
+    Chord callback: adds up every shard's {generated, skipped, failed}
+    and closes the billing run.
+    """
+    app = get_app()
+
+    with app.app_context():
+        from services.billing_run_service import finalize_run
+
+        run = finalize_run(run_id)
+
+        results = merge_shard_counts(shard_results)
+        results["shards"] = len(shard_results)
+        results["month"]  = run.month
+        results["run_id"] = run.id
 
         print(f"✅ Invoice generation complete: {results}")
         return results
 
 
+@celery.task(name="tasks.merge_failed_invoice_shards")
+def merge_failed_invoice_shards(request, exc, traceback, run_id):
+    """
+    Chord errback: a shard used up its retries, so merge_invoice_shards
+    never runs. Closes the run as failed (resume_billing_run picks it up
+    from its checkpoints). The shard results are lost with the chord, so
+    the totals come from the counts every shard checkpointed.
+    """
+    app = get_app()
+
+    with app.app_context():
+        from services.billing_run_service import finalize_run
+
+        run     = finalize_run(run_id)
+        results = merge_shard_counts(shard.to_dict() for shard in run.shards)
+        results["shards"]        = len(run.shards)
+        results["failed_shards"] = sum(shard.status == "failed" for shard in run.shards)
+        results["month"]         = run.month
+        results["run_id"]        = run.id
+        results["status"]        = run.status
+
+        print(f"❌ Invoice generation failed: {exc} — {results}")
+        return results
+
+
 # Storage Alerts
 @celery.task(name="tasks.send_storage_alerts", bind=True, max_retries=3)
 def send_storage_alerts(self):
@@ -110,14 +238,14 @@ def send_storage_alerts(self):
 
     with app.app_context():
         from models import User
-        from services.minio_service import get_storage_summary
+        from services.usage_service import get_storage_summary
 
         users = User.query.filter_by(role="user").all()
         alerted = 0
 
         for user in users:
             try:
-                summary = get_storage_summary(user.username)
+                summary = get_storage_summary(user.id)
                 pct = summary["percent_used"]
 
                 if pct < 80:
@@ -166,7 +294,7 @@ def send_daily_digest(self):
 
         for user in users:
             try:
-                usage = get_today_usage(user.id, user.username)
+                usage = get_today_usage(user.id)
                 monthly = get_current_month_summary(user.id)
                 bill = calculate_bill(user.id, today.year, today.month)
 
@@ -198,26 +326,108 @@ def take_usage_snapshot():
     app = get_app()
 
     with app.app_context():
-        from models import User, StorageObject, db
-        from sqlalchemy import func
+        from services.platform_service import take_platform_snapshot
 
-        total_users = User.query.filter_by(role="user").count()
-        total_files = StorageObject.query.count()
-        total_bytes = db.session.query(
-            func.sum(StorageObject.file_size)
-        ).scalar() or 0
+        values = take_platform_snapshot()
 
         snapshot = {
-            "timestamp": datetime.now().isoformat(),
-            "total_users": total_users,
-            "total_files": total_files,
-            "total_mb": round(total_bytes / (1024 * 1024), 2),
+            "timestamp":   values["bucket_start"],
+            "total_users": values["total_users"],
+            "total_files": values["total_files"],
+            "total_mb":    round(values["total_bytes"] / (1024 * 1024), 2),
+            "pruned":      values["pruned"],
         }
 
         print(f"📊 Snapshot: {snapshot}")
         return snapshot
 
 
+# Storage Total Reconciliation
+@celery.task(name="tasks.reconcile_storage_totals", bind=True, max_retries=3)
+def reconcile_storage_totals(self):
+    """
+    Upload/delete keep User.storage_bytes in step incrementally.
+    Once a day, compare it with a real MinIO bucket listing and fix drift.
+    """
+    app = get_app()
+
+    with app.app_context():
+        from models import User, db
+        from services.usage_service import reconcile_storage_used
+
+        users = User.query.all()
+        corrected = 0
+
+        for user in users:
+            try:
+                recorded, actual = reconcile_storage_used(user)
+                if recorded != actual:
+                    corrected += 1
+                    print(f"🔧 {user.username}: {recorded} → {actual} bytes")
+
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Storage reconcile failed for {user.username}, total left as is: {e}")
+
+        print(f"✅ Storage totals reconciled: {corrected} corrected")
+        return {"checked": len(users), "corrected": corrected}
+
+
+# Blob Garbage Collection
+@celery.task(name="tasks.collect_blob_garbage")
+def collect_blob_garbage():
+    """
+    Deletes deduplicated blobs no file references any more.
+    Deletes collect their own blobs right away; this catches the rest
+    (e.g. a storage error during that cleanup), plus blob-area objects
+    an upload copied in but never committed a row for.
+    """
+    app = get_app()
+
+    with app.app_context():
+        from services.dedup_service import collect_garbage, collect_orphan_blobs
+
+        blobs, freed = collect_garbage()
+        orphans = collect_orphan_blobs()
+        print(f"✅ Blob GC: {blobs} blob(s), {freed} bytes freed, {orphans} orphaned object(s)")
+        return {"blobs": blobs, "freed_bytes": freed, "orphans": orphans}
+
+
+# Pending Upload Sweep
+@celery.task(name="tasks.expire_pending_uploads")
+def expire_pending_uploads():
+    """
+    Drops presigned uploads that were never completed, freeing their
+    reserved filenames and deleting anything uploaded for them.
+    """
+    app = get_app()
+
+    with app.app_context():
+        from services.presign_service import expire_uploads
+
+        expired = expire_uploads()
+        print(f"✅ Pending uploads expired: {expired}")
+        return {"expired": expired}
+
+
+# Leaderboard Rebuild
+@celery.task(name="tasks.rebuild_leaderboards")
+def rebuild_leaderboards():
+    """
+    Leaderboards are updated incrementally as usage changes.
+    Once a day, recompute them from the database to repair any drift
+    (e.g. Redis was down during an update).
+    """
+    app = get_app()
+
+    with app.app_context():
+        from services.leaderboard_service import rebuild_leaderboards as rebuild
+
+        members = rebuild()
+        print(f"🏆 Leaderboards rebuilt: {members}")
+        return members
+
+
 # Invoice Email Template
 def send_invoice_email(email, username, invoice, year, month):
     from calendar import month_name
@@ -230,4 +440,4 @@ def send_invoice_email(email, username, invoice, year, month):
     <p>Total Due: ₹{invoice['costs']['total_amount']}</p>
     """
 
-    send_email(email, f"BillFlow Invoice — {month_label}", html)
\ No newline at end of file
+    return send_email(email, f"BillFlow Invoice — {month_label}", html)
\ No newline at end of file
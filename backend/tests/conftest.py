@@ -0,0 +1,98 @@
+import io
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Config reads the environment when it is imported, so this comes first
+TEST_ROOT = tempfile.mkdtemp(prefix="billing-engine-tests-")
+os.environ.update({
+    "JWT_SECRET_KEY":       "test-secret-key-that-is-long-enough-for-hs256",
+    "DATABASE_URL":         f"sqlite:///{os.path.join(TEST_ROOT, 'test.db')}",
+    "STORAGE_BACKEND":      "local",
+    "LOCAL_STORAGE_ROOT":   os.path.join(TEST_ROOT, "storage"),
+    "METER_BACKEND":        "memory",
+    "CACHE_BACKEND":        "memory",
+    "METER_FLUSH_INTERVAL": "3600",   # tests flush by hand
+    "COMPRESSION_ENABLED":  "false",
+    "DEDUP_ENABLED":        "true",
+})
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from config import Config
+from models import db, User
+from services.metering_service import usage_meter, MemoryMeterStore
+from services.cache_service import response_cache, MemoryCache
+
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app
+    # Nothing left for the meter's exit-time flush to write
+    usage_meter.store = MemoryMeterStore()
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(app):
+    """
+    Every test starts with empty tables, an empty storage root, and
+    fresh meter and cache stores.
+    """
+    usage_meter.store      = MemoryMeterStore()
+    response_cache.backend = MemoryCache()
+    os.makedirs(Config.LOCAL_STORAGE_ROOT, exist_ok=True)
+
+    with app.app_context():
+        yield
+
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+
+    shutil.rmtree(Config.LOCAL_STORAGE_ROOT, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user():
+    def make_user(username="alice", role="user"):
+        user = User(
+            username=username,
+            email=f"{username}@example.com",
+            password="not-a-real-hash",
+            role=role
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def auth_headers():
+    def auth_headers(user):
+        return {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+    return auth_headers
+
+
+@pytest.fixture
+def upload(client, auth_headers):
+    def upload(user, filename, content):
+        return client.post(
+            "/api/objects/upload",
+            headers=auth_headers(user),
+            data={"file": (io.BytesIO(content), filename)},
+            content_type="multipart/form-data"
+        )
+    return upload
@@ -0,0 +1,113 @@
+import io
+from datetime import timedelta
+
+from models import db, User, Blob, StorageObject
+from services.storage_service import storage
+from services.dedup_service import collect_garbage, collect_orphan_blobs
+
+
+def batch_delete(client, headers, filenames):
+    return client.post("/api/objects/batch-delete", headers=headers, json={"filenames": filenames})
+
+
+def bucket_files(user):
+    return sorted(f["filename"] for f in storage.list_files(user.username))
+
+
+# Batch delete
+class TestBatchDelete:
+    def test_deletes_files_and_frees_storage(self, client, make_user, auth_headers, upload):
+        user = make_user("alice")
+        upload(user, "a.txt", b"first file")
+        upload(user, "b.txt", b"second file!")
+        upload(user, "c.txt", b"kept")
+
+        response = batch_delete(client, auth_headers(user), ["a.txt", "b.txt", "nope.txt"])
+
+        assert response.status_code == 200
+        assert response.json["deleted"] == 2
+        assert [r["status"] for r in response.json["results"]] == ["deleted", "deleted", "not_found"]
+        assert [obj.filename for obj in StorageObject.query.all()] == ["c.txt"]
+        assert db.session.get(User, user.id).storage_bytes == len(b"kept")
+
+    def test_only_touches_the_callers_files(self, client, make_user, auth_headers, upload):
+        alice, bob = make_user("alice"), make_user("bob")
+        upload(bob, "a.txt", b"bob's file")
+
+        response = batch_delete(client, auth_headers(alice), ["a.txt"])
+
+        assert response.json["results"] == [{"filename": "a.txt", "status": "not_found"}]
+        assert StorageObject.query.filter_by(user_id=bob.id).count() == 1
+
+    def test_rejects_a_bad_body(self, client, make_user, auth_headers):
+        headers = auth_headers(make_user("alice"))
+        assert batch_delete(client, headers, []).status_code == 400
+        assert batch_delete(client, headers, "a.txt").status_code == 400
+        assert batch_delete(client, headers, ["a.txt", 3]).status_code == 400
+
+
+# Blob reference counts and garbage collection
+class TestBlobRefcount:
+    def test_identical_uploads_share_one_blob(self, make_user, upload):
+        user = make_user("alice")
+        upload(user, "a.txt", b"same bytes")
+        upload(user, "b.txt", b"same bytes")
+
+        blob = Blob.query.one()
+        assert blob.ref_count == 2
+        assert {obj.blob_id for obj in StorageObject.query.all()} == {blob.id}
+        # Only the blob holds the bytes; the bucket copies are gone
+        assert bucket_files(user) == []
+
+    def test_users_do_not_share_blobs_by_default(self, make_user, upload):
+        upload(make_user("alice"), "a.txt", b"same bytes")
+        upload(make_user("bob"),   "a.txt", b"same bytes")
+
+        assert [blob.ref_count for blob in Blob.query.all()] == [1, 1]
+
+    def test_blob_is_collected_with_its_last_reference(
+            self, client, make_user, auth_headers, upload):
+        user    = make_user("alice")
+        headers = auth_headers(user)
+        upload(user, "a.txt", b"same bytes")
+        upload(user, "b.txt", b"same bytes")
+        key = Blob.query.one().storage_key
+
+        batch_delete(client, headers, ["a.txt"])
+        assert Blob.query.one().ref_count == 1
+        assert storage.stat_blob(key) is not None
+
+        batch_delete(client, headers, ["b.txt"])
+        assert Blob.query.count() == 0
+        assert storage.stat_blob(key) is None
+
+    def test_collect_garbage_removes_unreferenced_blobs(self, make_user, upload):
+        user = make_user("alice")
+        upload(user, "a.txt", b"some content")
+        blob = Blob.query.one()
+        key, size = blob.storage_key, blob.size
+
+        # e.g. the delete committed but its own cleanup did not run
+        StorageObject.query.delete()
+        blob.ref_count = 0
+        db.session.commit()
+
+        assert collect_garbage() == (1, size)
+        assert Blob.query.count() == 0
+        assert storage.stat_blob(key) is None
+
+
+class TestOrphanBlobs:
+    def test_blob_without_a_row_is_removed_after_the_grace_period(self, make_user, upload):
+        user = make_user("alice")
+        upload(user, "a.txt", b"kept content")
+        kept = Blob.query.one().storage_key
+
+        # A blob whose upload never committed its row
+        storage.upload_stream(user.username, io.BytesIO(b"never recorded"), "tmp.txt", "text/plain")
+        assert storage.copy_to_blob(user.username, "tmp.txt", "ab/orphan-key")
+
+        assert collect_orphan_blobs() == 0
+        assert collect_orphan_blobs(grace=timedelta(0)) == 1
+        assert storage.stat_blob("ab/orphan-key") is None
+        assert storage.stat_blob(kept) is not None
@@ -0,0 +1,83 @@
+import pytest
+
+import routes.objects as objects_routes
+
+
+CONTENT = b"0123456789abcdefghij"
+
+
+@pytest.fixture(params=["send_file", "streamed"])
+def download(request, client, auth_headers, make_user, upload, monkeypatch):
+    """
+    GET /api/objects/download/notes.txt through both code paths: the
+    local file handed to send_file(), and the streamed response used
+    for MinIO (and for decoded files).
+    """
+    if request.param == "streamed":
+        monkeypatch.setattr(objects_routes, "object_local_path", lambda username, obj: None)
+
+    user = make_user("alice")
+    assert upload(user, "notes.txt", CONTENT).status_code == 201
+
+    def download(**headers):
+        return client.get(
+            "/api/objects/download/notes.txt",
+            headers={**auth_headers(user), **headers}
+        )
+    return download
+
+
+class TestDownloadRanges:
+    def test_full_download_has_etag_and_accepts_ranges(self, download):
+        response = download()
+        assert response.status_code == 200
+        assert response.data == CONTENT
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert response.get_etag()[0]
+
+    def test_range_request_returns_partial_content(self, download):
+        response = download(Range="bytes=2-5")
+        assert response.status_code == 206
+        assert response.data == CONTENT[2:6]
+        assert response.headers["Content-Range"] == f"bytes 2-5/{len(CONTENT)}"
+        assert response.content_length == 4
+
+    def test_suffix_range(self, download):
+        response = download(Range="bytes=-3")
+        assert response.status_code == 206
+        assert response.data == CONTENT[-3:]
+
+    def test_unsatisfiable_range(self, download):
+        response = download(Range=f"bytes={len(CONTENT) + 10}-")
+        assert response.status_code == 416
+        assert response.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+
+class TestConditionalDownloads:
+    def test_if_none_match_with_current_etag_is_not_modified(self, download):
+        etag = download().get_etag()[0]
+        response = download(**{"If-None-Match": f'"{etag}"'})
+        assert response.status_code == 304
+        assert response.data == b""
+
+    def test_if_none_match_with_other_etag_sends_the_file(self, download):
+        response = download(**{"If-None-Match": '"something-else"'})
+        assert response.status_code == 200
+        assert response.data == CONTENT
+
+    def test_if_range_with_current_etag_honours_the_range(self, download):
+        etag = download().get_etag()[0]
+        response = download(Range="bytes=0-3", **{"If-Range": f'"{etag}"'})
+        assert response.status_code == 206
+        assert response.data == CONTENT[:4]
+
+    def test_if_range_with_stale_etag_sends_the_whole_file(self, download):
+        response = download(Range="bytes=0-3", **{"If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert response.data == CONTENT
+
+
+def test_download_of_unknown_file_is_404(client, auth_headers, make_user):
+    user = make_user("alice")
+    response = client.get("/api/objects/download/missing.txt", headers=auth_headers(user))
+    assert response.status_code == 404
@@ -0,0 +1,145 @@
+from datetime import date
+
+import pytest
+
+from models import db, UsageLog, UsageMonthly, MeterFlush
+from services.metering_service import usage_meter, RedisMeterStore
+from services.usage_service import add_api_calls_bulk, claim_meter_flush
+import services.usage_service as usage_service
+
+
+DAY   = date(2026, 3, 10)
+DAY_2 = date(2026, 3, 11)
+
+
+def calls_on(user_id, day):
+    log = UsageLog.query.filter_by(user_id=user_id, date=day).first()
+    return log.api_calls if log else 0
+
+
+# Batched upsert
+class TestAddApiCallsBulk:
+    def test_inserts_and_increments_in_one_batch(self, make_user):
+        alice, bob = make_user("alice"), make_user("bob")
+
+        add_api_calls_bulk({(alice.id, DAY): 3, (bob.id, DAY): 1})
+        db.session.commit()
+        add_api_calls_bulk({(alice.id, DAY): 2, (alice.id, DAY_2): 4})
+        db.session.commit()
+
+        assert calls_on(alice.id, DAY) == 5
+        assert calls_on(alice.id, DAY_2) == 4
+        assert calls_on(bob.id, DAY) == 1
+        assert UsageLog.query.filter_by(user_id=alice.id, date=DAY).count() == 1
+
+    def test_refreshes_the_monthly_aggregate(self, make_user):
+        alice = make_user("alice")
+
+        add_api_calls_bulk({(alice.id, DAY): 3})
+        add_api_calls_bulk({(alice.id, DAY_2): 4})
+        db.session.commit()
+
+        monthly = UsageMonthly.query.filter_by(user_id=alice.id, month="2026-03").one()
+        assert monthly.total_api_calls == 7
+        assert monthly.days_active == 2
+
+
+# Memory meter
+class TestUsageMeterFlush:
+    def test_flush_writes_buffered_calls(self, make_user):
+        alice = make_user("alice")
+        usage_meter.record(alice.id, DAY, 2)
+        usage_meter.record(alice.id, DAY, 3)
+
+        assert usage_meter.pending_calls(alice.id, DAY) == 5
+        assert usage_meter.flush() == 1
+        assert calls_on(alice.id, DAY) == 5
+        assert usage_meter.pending_calls(alice.id, DAY) == 0
+        assert usage_meter.flush() == 0
+
+    def test_failed_flush_keeps_the_counters(self, make_user, monkeypatch):
+        alice = make_user("alice")
+        usage_meter.record(alice.id, DAY, 4)
+
+        def fail(counts):
+            raise RuntimeError("database down")
+        monkeypatch.setattr(usage_service, "add_api_calls_bulk", fail)
+        assert usage_meter.flush() == 0
+        assert usage_meter.pending_calls(alice.id, DAY) == 4
+
+        monkeypatch.undo()
+        assert usage_meter.flush() == 1
+        assert calls_on(alice.id, DAY) == 4
+
+
+class TestClaimMeterFlush:
+    def test_a_token_is_applied_once(self, make_user):
+        assert claim_meter_flush("token-1") is True
+        db.session.commit()
+        assert claim_meter_flush("token-1") is False
+        assert MeterFlush.query.count() == 1
+
+
+# Redis meter: recovery of abandoned flushes
+@pytest.fixture
+def redis_meter(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeRedis(decode_responses=True)
+
+    import redis
+    monkeypatch.setattr(redis.Redis, "from_url", staticmethod(lambda *a, **k: server))
+    store = RedisMeterStore("redis://unused", stale_after=0)
+    monkeypatch.setattr(usage_meter, "store", store)
+    return store, server
+
+
+class TestRedisMeterRecovery:
+    def test_abandoned_flush_is_applied_by_the_next_one(self, make_user, redis_meter):
+        store, server = redis_meter
+        alice = make_user("alice")
+        usage_meter.record(alice.id, DAY, 2)
+
+        # A worker drained the counters and died before writing them
+        store.drain()
+        assert calls_on(alice.id, DAY) == 0
+
+        usage_meter.record(alice.id, DAY, 1)
+        usage_meter.flush()
+
+        assert calls_on(alice.id, DAY) == 3
+        assert server.zcard(store.FLUSHING_SET) == 0
+
+    def test_flush_written_before_a_crash_is_not_counted_twice(
+            self, make_user, redis_meter, monkeypatch):
+        store, server = redis_meter
+        alice = make_user("alice")
+        usage_meter.record(alice.id, DAY, 5)
+
+        # The worker dies after the database commit, before Redis cleanup
+        with monkeypatch.context() as patch:
+            patch.setattr(store, "commit", lambda token: None)
+            usage_meter.flush()
+        assert calls_on(alice.id, DAY) == 5
+        assert server.zcard(store.FLUSHING_SET) == 1
+
+        usage_meter.flush()
+
+        assert calls_on(alice.id, DAY) == 5
+        assert server.zcard(store.FLUSHING_SET) == 0
+
+    def test_failed_flush_is_retried_under_its_token(
+            self, make_user, redis_meter, monkeypatch):
+        store, server = redis_meter
+        alice = make_user("alice")
+        usage_meter.record(alice.id, DAY, 4)
+
+        def fail(counts):
+            raise RuntimeError("database down")
+        with monkeypatch.context() as patch:
+            patch.setattr(usage_service, "add_api_calls_bulk", fail)
+            usage_meter.flush()
+        assert calls_on(alice.id, DAY) == 0
+        assert usage_meter.pending_calls(alice.id, DAY) == 4
+
+        usage_meter.flush()
+        assert calls_on(alice.id, DAY) == 4
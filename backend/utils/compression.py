@@ -0,0 +1,130 @@
+import os
+import zlib
+import tempfile
+from config import Config
+
+try:
+    import zstandard
+except ImportError:          # optional: zstd types fall back to gzip
+    zstandard = None
+
+
+def available_codecs():
+    codecs = {"gzip"}
+    if zstandard is not None:
+        codecs.add("zstd")
+    return codecs
+
+
+def codec_for(filename):
+    """
+    Codec configured for the file's extension, or None if the type is
+    not compressed (or compression is switched off).
+    """
+    if not Config.COMPRESSION_ENABLED:
+        return None
+    _, ext = os.path.splitext(filename.lower())
+    codec = Config.COMPRESSION_CODECS.get(ext)
+    if codec == "zstd" and zstandard is None:
+        codec = "gzip"
+    return codec
+
+
+# Streaming compressors / decompressors
+# Both expose the zlib-style interface: compress(data) / flush() and
+# decompress(data) / flush().
+def compressor(codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=Config.COMPRESSION_LEVEL_ZSTD).compressobj()
+    if codec == "gzip":
+        # wbits=31: gzip container, so the body is a valid .gz / Content-Encoding: gzip
+        return zlib.compressobj(Config.COMPRESSION_LEVEL_GZIP, zlib.DEFLATED, 31)
+    raise ValueError(f"Unknown codec: {codec!r}")
+
+
+class _ZstdDecompressor:
+    def __init__(self):
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return b""
+
+
+def decompressor(codec):
+    if codec == "zstd":
+        return _ZstdDecompressor()
+    if codec == "gzip":
+        return zlib.decompressobj(31)
+    raise ValueError(f"Unknown codec: {codec!r}")
+
+
+def spool_compressed(stream, codec):
+    """
+    Reads an upload to the end, keeping a raw and a compressed copy in
+    spooled temp files (in memory up to COMPRESSION_SPOOL_BYTES, then on
+    disk). The compressed copy is kept only if it reaches
+    COMPRESSION_MIN_RATIO; the other one is closed.
+
+    Returns (file, length, encoding), rewound; encoding is None when the
+    raw copy won. Exceptions from stream.read() propagate.
+    """
+    raw    = tempfile.SpooledTemporaryFile(max_size=Config.COMPRESSION_SPOOL_BYTES)
+    packed = tempfile.SpooledTemporaryFile(max_size=Config.COMPRESSION_SPOOL_BYTES)
+    try:
+        encoder = compressor(codec)
+        while True:
+            chunk = stream.read(Config.UPLOAD_PART_SIZE)
+            if not chunk:
+                break
+            raw.write(chunk)
+            packed.write(encoder.compress(chunk))
+        packed.write(encoder.flush())
+    except BaseException:
+        raw.close()
+        packed.close()
+        raise
+
+    raw_size, packed_size = raw.tell(), packed.tell()
+    if raw_size and raw_size >= packed_size * Config.COMPRESSION_MIN_RATIO:
+        keep, drop, length, encoding = packed, raw, packed_size, codec
+    else:
+        keep, drop, length, encoding = raw, packed, raw_size, None
+
+    drop.close()
+    keep.seek(0)
+    return keep, length, encoding
+
+
+def decompress_range(chunks, codec, start=0, stop=None):
+    """
+    Decompresses a stream of stored chunks and yields only the decoded
+    bytes in [start, stop). Memory use stays at about one chunk.
+    """
+    decoder  = decompressor(codec)
+    position = 0
+
+    def window(data):
+        nonlocal position
+        begin, end = position, position + len(data)
+        position   = end
+        lo = max(start - begin, 0)
+        hi = len(data) if stop is None else min(stop - begin, len(data))
+        return data[lo:hi] if hi > lo else b""
+
+    try:
+        for chunk in chunks:
+            piece = window(decoder.decompress(chunk))
+            if piece:
+                yield piece
+            if stop is not None and position >= stop:
+                return
+        piece = window(decoder.flush())
+        if piece:
+            yield piece
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE     = 200
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    """
+    Page size from a query-string value, clamped to 1..MAX_PAGE_SIZE.
+    Raises ValueError if it is not a number.
+    """
+    if value in (None, ""):
+        return default
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def encode_cursor(*values):
+    """
+    Opaque keyset cursor: the sort key(s) and id of the last row on a page.
+    Datetimes are kept as ISO strings.
+    """
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw    = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, types):
+    """
+    Reverses encode_cursor(). types gives the expected type of every
+    value, e.g. (datetime, int) — datetimes are parsed back from their
+    ISO strings. Raises ValueError on a malformed cursor, including one
+    of the wrong length or with values of the wrong type.
+    """
+    try:
+        raw    = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+
+    decoded = []
+    for value, kind in zip(values, types):
+        if kind is datetime:
+            if not isinstance(value, str):
+                raise ValueError("Invalid cursor")
+            value = datetime.fromisoformat(value)
+        elif isinstance(value, bool) or not isinstance(value, kind):
+            raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
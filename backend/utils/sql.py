@@ -0,0 +1,22 @@
+from models import db
+
+
+def dialect_insert(model):
+    """
+    Returns an INSERT for the model's table that supports
+    ON CONFLICT DO UPDATE / DO NOTHING on the current database.
+
+    SQLite and PostgreSQL share the same upsert API in SQLAlchemy.
+    Returns None for any other database, so callers can fall back
+    to a plain read-then-write.
+    """
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+
+    return insert(model)
@@ -0,0 +1,41 @@
+import hashlib
+
+
+class UploadLimitExceeded(Exception):
+    """
+    Raised from MeteredReader.read() once more than max_bytes arrived.
+    bytes_read is how far the upload got before it was cut off.
+    """
+
+    def __init__(self, bytes_read, max_bytes):
+        super().__init__(f"Upload exceeded {max_bytes} bytes")
+        self.bytes_read = bytes_read
+        self.max_bytes  = max_bytes
+
+
+class MeteredReader:
+    """
+    File-like wrapper around an upload stream. While the storage client
+    reads from it, it counts bytes, updates a SHA-256 digest and stops
+    the upload as soon as the count passes max_bytes — nothing is
+    buffered here beyond the chunk being passed through.
+    """
+
+    def __init__(self, stream, max_bytes):
+        self._stream    = stream
+        self.max_bytes  = max_bytes
+        self.bytes_read = 0
+        self._sha256    = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self._stream.read(size)
+        if chunk:
+            self.bytes_read += len(chunk)
+            if self.bytes_read > self.max_bytes:
+                raise UploadLimitExceeded(self.bytes_read, self.max_bytes)
+            self._sha256.update(chunk)
+        return chunk
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
@@ -13,17 +13,42 @@ def validate_file(file, current_storage_used_bytes):
     3. File type is allowed
     4. File size is within limit
     5. User has enough storage quota left
+
+    The size is measured by seeking, so the file is never read into memory.
     """
 
     # File has content
     if not file or file.filename == "":
         return False, "No file provided or file has no name"
 
+    is_valid, error_msg = validate_filename(file.filename)
+    if not is_valid:
+        return False, error_msg
+
+    # Individual file size 
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    file_size = stream.tell()
+    stream.seek(0)  # Reset 
+
+    return validate_size(file_size, current_storage_used_bytes)
+
+
+def validate_filename(filename):
+    """
+    Name checks shared by every upload path.
+    Returns (is_valid, error_message)
+    """
+    if not filename:
+        return False, "No file provided or file has no name"
+
     # Safe filename 
-    filename = file.filename
     if ".." in filename or "/" in filename or "\\" in filename:
         return False, "Invalid filename — directory traversal not allowed"
 
+    if filename.startswith("."):
+        return False, "Invalid filename — names starting with '.' are not allowed"
+
     # File extension is allowed 
     _, ext = os.path.splitext(filename.lower())
 
@@ -34,15 +59,22 @@ def validate_file(file, current_storage_used_bytes):
         allowed = ", ".join(sorted(Config.ALLOWED_EXTENSIONS))
         return False, f"File type '{ext}' is not supported. Allowed types: {allowed}"
 
-    # Individual file size 
-    file_data = file.read()
-    file.seek(0)  # Reset 
-    file_size = len(file_data)
+    return True, None
+
+
+def validate_size(file_size, current_storage_used_bytes, at_least=False):
+    """
+    Size limit and quota checks.
+    at_least=True when the size is only known to be *at least* file_size
+    (a streamed upload that was cut off once it crossed a limit).
+    Returns (is_valid, error_message)
+    """
+    prefix = "at least " if at_least else ""
 
     max_mb = Config.MAX_FILE_SIZE_BYTES / (1024 * 1024)
     if file_size > Config.MAX_FILE_SIZE_BYTES:
         actual_mb = round(file_size / (1024 * 1024), 2)
-        return False, f"File too large ({actual_mb} MB). Maximum allowed is {max_mb} MB"
+        return False, f"File too large ({prefix}{actual_mb} MB). Maximum allowed is {max_mb} MB"
 
     if file_size == 0:
         return False, "File is empty — cannot upload a 0 byte file"
@@ -57,13 +89,22 @@ def validate_file(file, current_storage_used_bytes):
         quota_mb = round(quota / (1024 * 1024), 2)
         return False, (
             f"Not enough storage. "
-            f"File is {file_mb} MB but you only have {remaining_mb} MB remaining "
+            f"File is {prefix}{file_mb} MB but you only have {remaining_mb} MB remaining "
             f"(quota: {quota_mb} MB)"
         )
 
     return True, None
 
 
+def upload_byte_limit(current_storage_used_bytes):
+    """
+    Most bytes one upload may write: the per-file limit or whatever is
+    left of the quota, whichever is smaller.
+    """
+    remaining = Config.STORAGE_QUOTA_BYTES - current_storage_used_bytes
+    return max(0, min(Config.MAX_FILE_SIZE_BYTES, remaining))
+
+
 def sanitize_filename(filename):
     """
     Makes a filename safe to store.
@@ -74,7 +115,7 @@ def sanitize_filename(filename):
     name, ext = os.path.splitext(filename)
     safe_name = re.sub(r"[^\w\-.]", "_", name)
     safe_name = re.sub(r"_+", "_", safe_name)
-    safe_name = safe_name.strip("_")
+    safe_name = safe_name.strip("_").lstrip(".") or "file"
     return f"{safe_name}{ext.lower()}"
 
 
@@ -19,6 +19,8 @@ export default function AdminInvoices() {
   const [statusFilter, setStatusFilter] = useState("all");
   const [paying,      setPaying]      = useState(null);
   const [refreshKey,  setRefreshKey]  = useState(0);
+  const [nextCursor,  setNextCursor]  = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (!isAdmin) navigate("/dashboard");
@@ -31,7 +33,9 @@ export default function AdminInvoices() {
       if (statusFilter !== "all") params.status = statusFilter;
       const res = await adminAPI.allInvoices(params);
       setInvoices(res.data.invoices || []);
+      setNextCursor(res.data.next_cursor || null);
       setSummary({
+        count:   res.data.total_invoices,
         total:   res.data.total_revenue,
         paid:    res.data.paid_revenue,
         pending: res.data.pending_amount
@@ -43,6 +47,21 @@ export default function AdminInvoices() {
     }
   }, [statusFilter, refreshKey]);
 
+  async function loadMore() {
+    setLoadingMore(true);
+    try {
+      const params = { after: nextCursor };
+      if (statusFilter !== "all") params.status = statusFilter;
+      const res = await adminAPI.allInvoices(params);
+      setInvoices(prev => [...prev, ...(res.data.invoices || [])]);
+      setNextCursor(res.data.next_cursor || null);
+    } catch (e) {
+      console.error(e);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   useEffect(() => { if (isAdmin) load(); }, [load, isAdmin]);
 
   async function handlePay(invoiceId) {
@@ -256,16 +275,25 @@ export default function AdminInvoices() {
                 })}
               </div>
 
+              {nextCursor && (
+                <div className="p-4 text-center border-t border-gray-50">
+                  <button onClick={loadMore} disabled={loadingMore}
+                    className="px-4 py-2 rounded-xl border-2 border-gray-200
+                               text-gray-500 hover:border-brand-300 hover:text-brand-600
+                               text-sm font-semibold transition-all disabled:opacity-50">
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </button>
+                </div>
+              )}
+
               {/* Footer */}
               <div className="bg-gray-50 px-5 py-4 border-t border-gray-100">
                 <div className="flex flex-col sm:flex-row sm:justify-between gap-1">
                   <span className="text-xs text-gray-400">
-                    {invoices.length} invoice{invoices.length !== 1 ? "s" : ""} shown
+                    {invoices.length} of {summary?.count ?? invoices.length} invoice{invoices.length !== 1 ? "s" : ""} shown
                   </span>
                   <span className="text-sm font-extrabold text-gray-800">
-                    Total: ₹{invoices
-                      .reduce((s, i) => s + i.costs.total_amount, 0)
-                      .toFixed(4)}
+                    Total: ₹{(summary?.total ?? 0).toFixed(4)}
                   </span>
                 </div>
               </div>
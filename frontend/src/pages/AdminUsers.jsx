@@ -130,6 +130,8 @@ export default function AdminUsers() {
   const [roleFilter, setRoleFilter] = useState("all");
   const [sortBy,     setSortBy]     = useState("created_at");
   const [toggling,   setToggling]   = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [refreshKey, setRefreshKey] = useState(0);
 
   useEffect(() => {
@@ -143,6 +145,7 @@ export default function AdminUsers() {
         search, role: roleFilter, sort: sortBy
       });
       setUsers(res.data.users || []);
+      setNextCursor(res.data.next_cursor || null);
     } catch (e) {
       console.error(e);
     } finally {
@@ -150,6 +153,21 @@ export default function AdminUsers() {
     }
   }, [search, roleFilter, sortBy, refreshKey]);
 
+  async function loadMore() {
+    setLoadingMore(true);
+    try {
+      const res = await adminAPI.listUsers({
+        search, role: roleFilter, sort: sortBy, after: nextCursor
+      });
+      setUsers(prev => [...prev, ...(res.data.users || [])]);
+      setNextCursor(res.data.next_cursor || null);
+    } catch (e) {
+      console.error(e);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   useEffect(() => {
     if (isAdmin) loadUsers();
   }, [loadUsers, isAdmin]);
@@ -194,7 +212,7 @@ export default function AdminUsers() {
                 All Users
               </h1>
               <p className="text-gray-400 text-sm mt-0.5">
-                {users.length} users
+                {users.length}{nextCursor ? "+" : ""} users
               </p>
             </div>
           </div>
@@ -286,6 +304,16 @@ export default function AdminUsers() {
                   toggling={toggling}
                 />
               ))}
+              {nextCursor && (
+                <div className="p-4 text-center border-t border-gray-50">
+                  <button onClick={loadMore} disabled={loadingMore}
+                    className="px-4 py-2 rounded-xl border-2 border-gray-200
+                               text-gray-500 hover:border-brand-300 hover:text-brand-600
+                               text-sm font-semibold transition-all disabled:opacity-50">
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
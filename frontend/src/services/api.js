@@ -55,13 +55,22 @@ export const objectsAPI = {
 
   delete: (filename) => api.delete(`/api/objects/${filename}`),
 
+  batchUpload: (formData) =>
+    api.post("/api/objects/batch-upload", formData, {
+      headers: { "Content-Type": "multipart/form-data" },
+    }),
+
+  batchDelete: (filenames) =>
+    api.post("/api/objects/batch-delete", { filenames }),
+
   storageInfo: () => api.get("/api/objects/storage"),
 };
 
 // USAGE
 export const usageAPI = {
   today: () => api.get("/api/usage/today"),
-  history: (days = 30) => api.get(`/api/usage/history?days=${days}`),
+  history: (days = 30, granularity = "day") =>
+    api.get(`/api/usage/history?days=${days}&granularity=${granularity}`),
   currentMonth: () => api.get("/api/usage/current-month"),
   monthly: (year, month) =>
     api.get(`/api/usage/monthly?year=${year}&month=${month}`),